@@ -0,0 +1,299 @@
+'''
+    Local analysis server - HTTP/JSON front end to a pool of engine worker processes, for tools that send many
+    positions at once (game review, bulk blunder checks). Every worker process has its own ChessAI search state and
+    transposition table, so positions are searched in parallel.
+
+    POST /analyse takes a batch of positions
+        {"positions": [{"fen": "...", "depth": 8}, {"fen": "...", "movetime": 0.5}], "depth": 6, "movetime": 1}
+    (a single {"fen": ...} object works too; "depth" and "movetime" at the top are the defaults of the batch) and
+    streams back one JSON line per position as its search finishes, in completion order:
+        {"index": 1, "fen": "...", "bestmove": "e2e4", "score": {"cp": 25}, "depth": 8, "pv": [...], "nodes": ...,
+         "time": 0.8, "cached": false}
+    Results are cached by position and search limits, and a position already being searched for another request is
+    waited on rather than searched again. A batch that would take the number of queued positions past the limit is
+    turned away with 503 and Retry-After. GET /status reports the queue, the cache and the worker count.
+
+    Usage:
+        python AnalysisServer.py --port 8765 --workers 4
+        curl -N -d '{"fen": "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3", "depth": 6}' \
+            localhost:8765/analyse
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ChessAI
+import ChessEngine
+from Constants import DIMS
+
+DEFAULT_PORT = 8765
+MAX_BATCH_SIZE = 1000  # positions per request
+MAX_PENDING_PER_WORKER = 64  # positions queued or being searched per worker before requests are turned away
+CACHE_SIZE = 100000  # results kept
+MAX_MOVE_TIME = 60.0
+
+
+# runs in a worker process - searches one position and returns its result as a JSON object
+def analyse_position(fen, maxDepth, moveTime):
+    currState = ChessEngine.GameState(fen)
+    validMoves = currState.get_all_valid_moves()
+    result = {"bestmove": None, "score": None, "depth": 0, "pv": [], "nodes": 0, "time": 0.0}
+    if len(validMoves) == 0:
+        result["score"] = {"mate": 0} if currState.checkmate else {"cp": 0}
+        return result
+    lastIteration = [0, 0.0]
+
+    def record_iteration(depth, score, bestMove):
+        lastIteration[:] = [depth, score]
+
+    move, stats = ChessAI.find_best_move_iterative_deepening(currState, validMoves, moveTime, maxDepth,
+                                                             onIteration=record_iteration)
+    depth, score = lastIteration
+    principalVariation = ChessAI.get_principal_variation(currState, max(depth, 1))
+    if len(principalVariation) == 0 or principalVariation[0] != move:
+        principalVariation = [move]
+    movesToMate = ChessAI.moves_to_mate(score)
+    if movesToMate is not None:
+        result["score"] = {"mate": movesToMate}
+    else:
+        result["score"] = {"cp": int(round(score * 100))}
+    result["bestmove"] = move.get_chess_notation()
+    result["depth"] = depth
+    result["pv"] = [pvMove.get_chess_notation() for pvMove in principalVariation]
+    result["nodes"] = stats.nodes
+    result["time"] = round(stats.elapsed, 3)
+    return result
+
+
+# the FEN of a position, normalised (without the full move number, which does not change the search), or
+# ValueError if it does not describe a legal looking position
+def normalise_fen(fen):
+    if not isinstance(fen, str):
+        raise ValueError("fen must be a string")
+    fields = fen.split()
+    rows = fields[0].split("/") if len(fields) > 0 else []
+    if len(rows) != DIMS or any(sum(int(char) if char.isdigit() else 1 for char in row) != DIMS for row in rows) or \
+            any(not (char.isdigit() or char in "pnbrqkPNBRQK") for row in rows for char in row) or \
+            fields[0].count("K") != 1 or fields[0].count("k") != 1 or any(char in "pP" for char in rows[0] + rows[-1]):
+        raise ValueError("invalid fen: " + fen)
+    try:
+        return " ".join(ChessEngine.GameState(fen).get_fen().split()[:5])
+    except (IndexError, KeyError, ValueError):
+        raise ValueError("invalid fen: " + fen)
+
+
+# the positions of a request body as (fen as given, (normalised fen, maxDepth, moveTime)) - ValueError on a
+# malformed request
+def parse_request(request):
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    positions = request.get("positions", [request] if "fen" in request else None)
+    if not isinstance(positions, list) or len(positions) == 0:
+        raise ValueError("no positions given")
+    if len(positions) > MAX_BATCH_SIZE:
+        raise ValueError("at most %d positions per request" % MAX_BATCH_SIZE)
+    jobs = []
+    for position in positions:
+        if not isinstance(position, dict):
+            raise ValueError("every position must be a JSON object")
+        depth = position.get("depth", request.get("depth"))
+        moveTime = position.get("movetime", request.get("movetime"))
+        if depth is None and moveTime is None:
+            moveTime = ChessAI.MOVE_TIME
+        # bool is an int subclass, but true is no depth
+        if depth is not None and (not isinstance(depth, int) or isinstance(depth, bool) or depth < 1):
+            raise ValueError("depth must be a positive integer")
+        if moveTime is not None and (not isinstance(moveTime, (int, float)) or isinstance(moveTime, bool) or
+                                     moveTime <= 0):
+            raise ValueError("movetime must be a positive number of seconds")
+        jobs.append((position.get("fen"), (normalise_fen(position.get("fen")),
+                                           min(depth or ChessAI.MAX_SEARCH_DEPTH, ChessAI.MAX_SEARCH_DEPTH),
+                                           min(moveTime, MAX_MOVE_TIME) if moveTime is not None else None)))
+    return jobs
+
+
+'''
+    The worker pool, the queue limit and the result cache - shared by the threads serving requests
+'''
+
+
+class AnalysisService:
+    def __init__(self, workers, maxPending, cacheSize=CACHE_SIZE):
+        # spawned rather than forked - the server forks from request threads otherwise
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.workers = workers
+        self.maxPending = maxPending
+        self.cacheSize = cacheSize
+        self.lock = threading.Lock()
+        self.pending = 0  # positions accepted whose result was not sent yet
+        self.cache = OrderedDict()  # (fen, maxDepth, moveTime) -> result, least recently used first
+        self.running = {}  # (fen, maxDepth, moveTime) -> Future of the search in progress
+        self.searches = 0
+        self.cacheHits = 0
+
+    # takes count slots of the queue - False when the queue is full
+    def reserve(self, count):
+        with self.lock:
+            if self.pending + count > self.maxPending:
+                return False
+            self.pending += count
+            return True
+
+    def release(self, count=1):
+        with self.lock:
+            self.pending -= count
+
+    # Future of the result of a job, and whether it came from the cache or a search already running
+    def submit(self, job):
+        with self.lock:
+            if job in self.cache:
+                self.cache.move_to_end(job)
+                self.cacheHits += 1
+                future = Future()
+                future.set_result(self.cache[job])
+                return future, True
+            if job in self.running:
+                self.cacheHits += 1
+                return self.running[job], True
+            future = self.executor.submit(analyse_position, *job)
+            self.running[job] = future
+            self.searches += 1
+        future.add_done_callback(lambda done: self.search_finished(job, done))
+        return future, False
+
+    def search_finished(self, job, future):
+        with self.lock:
+            self.running.pop(job, None)
+            if not future.cancelled() and future.exception() is None:
+                self.cache[job] = future.result()
+                if len(self.cache) > self.cacheSize:
+                    self.cache.popitem(last=False)
+
+    def status(self):
+        with self.lock:
+            return {"workers": self.workers, "pending": self.pending, "maxPending": self.maxPending,
+                    "searching": len(self.running), "cached": len(self.cache), "searches": self.searches,
+                    "cacheHits": self.cacheHits}
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # for chunked streaming of results
+    service = None  # the AnalysisService - create_server binds one to a subclass
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.send_json(200, self.service.status())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/analyse":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+            jobs = parse_request(request)
+        except ValueError as error:  # json.JSONDecodeError included
+            self.send_json(400, {"error": str(error)})
+            return
+        if not self.service.reserve(len(jobs)):
+            self.send_json(503, {"error": "too many positions queued"}, {"Retry-After": "1"})
+            return
+        unsent = len(jobs)
+        try:
+            # the same position twice in a batch is searched once - indices of every future's positions
+            futureIndices = {}
+            cachedIndices = set()
+            for index, (_, job) in enumerate(jobs):
+                future, cached = self.service.submit(job)
+                futureIndices.setdefault(future, []).append(index)
+                if cached:
+                    cachedIndices.add(index)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for future in as_completed(futureIndices):
+                for index in futureIndices[future]:
+                    if future.exception() is not None:
+                        line = {"error": "search failed: " + str(future.exception())}
+                    else:
+                        line = dict(future.result(), cached=index in cachedIndices)
+                    line["index"] = index
+                    line["fen"] = jobs[index][0]
+                    self.write_chunk((json.dumps(line) + "\n").encode())
+                    self.service.release()
+                    unsent -= 1
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client went away - its searches still finish and fill the cache
+        finally:
+            self.service.release(unsent)
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # no line per request on stderr
+
+
+def stop_serving(signum, frame):
+    raise KeyboardInterrupt
+
+
+# HTTP server answering requests from service - port 0 picks a free port
+def create_server(service, host="127.0.0.1", port=DEFAULT_PORT):
+    handler = type("BoundAnalysisHandler", (AnalysisHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=1, maxPending=None):
+    service = AnalysisService(workers, maxPending or workers * MAX_PENDING_PER_WORKER)
+    server = create_server(service, host, port)
+    signal.signal(signal.SIGTERM, stop_serving)  # shut the worker pool down on kill as on Ctrl+C
+    print("analysis server on http://%s:%d with %d workers" % (host, server.server_address[1], workers), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON analysis server backed by a pool of engine processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="positions queued before requests are turned away (default %d per worker)"
+                             % MAX_PENDING_PER_WORKER)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_pending)
+
+
+if __name__ == "__main__":
+    main()
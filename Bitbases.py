@@ -0,0 +1,257 @@
+'''
+    Endgame bitbases - one bit per position telling whether king and piece beat a lone king (KQK, KRK, KPK).
+    They are built by retrograde analysis: every position is classified from the classification of the positions
+    one move later, over and over until nothing changes - positions still undecided then are draws.
+    Every pass is split across a pool of worker processes sharing the table.
+
+    Tables are stored with the strong side as white (row 0 the 8th rank, pawns moving towards row 0) and indexed
+        ((weakSideToMove * 64 + strongKing) * 64 + weakKing) * 64 + piece
+    with squares numbered row * 8 + col. A file holds POSITION_COUNT bits (64KB) and is memory-mapped on first probe.
+
+    Usage:
+        python Bitbases.py --workers 4
+'''
+import argparse
+import mmap
+import os
+import time
+
+from Constants import DIMS, BITBASE_DIRECTORY
+
+SQUARES = DIMS * DIMS
+POSITION_COUNT = 2 * SQUARES ** 3
+MATERIALS = ["KQK", "KRK", "KPK"]  # in generation order - KPK looks up its promotions in KQK and KRK
+UNKNOWN, WIN, DRAW, INVALID = range(4)
+
+KING_NEIGHBORS = [[(r + dr) * DIMS + c + dc for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                   if (dr or dc) and 0 <= r + dr < DIMS and 0 <= c + dc < DIMS]
+                  for r in range(DIMS) for c in range(DIMS)]
+KING_NEIGHBOR_SETS = [set(neighbors) for neighbors in KING_NEIGHBORS]
+ROOK_DIRECTIONS = [(-1, 0), (0, 1), (1, 0), (0, -1)]
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + [(-1, -1), (-1, 1), (1, 1), (1, -1)]
+
+# material -> Bitbase, filled by load_bitbases on the first probe
+bitbases = None
+
+
+def position_index(weakToMove, strongKing, weakKing, piece):
+    return ((weakToMove * SQUARES + strongKing) * SQUARES + weakKing) * SQUARES + piece
+
+
+class Bitbase:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def is_win(self, index):
+        return self.data[index >> 3] >> (index & 7) & 1
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def load_bitbases(directory=BITBASE_DIRECTORY):
+    global bitbases
+    bitbases = {}
+    for material in MATERIALS:
+        path = os.path.join(directory, material + ".bb")
+        if os.path.isfile(path):
+            bitbases[material] = Bitbase(path)
+    return bitbases
+
+
+'''
+    Result of a position with a king and one piece against a lone king - 1 if white wins, -1 if black wins,
+    0 for a draw, None if the position is not covered (other material, or the bitbase file is missing).
+'''
+
+
+def probe(currState):
+    if currState.pieceCount != 3:
+        return None
+    if bitbases is None:
+        load_bitbases()
+    board = currState.board
+    for square in range(SQUARES):
+        piece = board[square // DIMS][square % DIMS]
+        if piece != "--" and piece[1] != 'K':
+            break
+    if piece[1] == 'B' or piece[1] == 'N':
+        return 0  # a lone minor piece can not mate
+    table = bitbases.get("K" + piece[1].upper() + "K")
+    if table is None:
+        return None
+    strongIsWhite = piece[0] == 'w'
+    if strongIsWhite:
+        strongKing = currState.whiteKingLoc[0] * DIMS + currState.whiteKingLoc[1]
+        weakKing = currState.blackKingLoc[0] * DIMS + currState.blackKingLoc[1]
+    else:  # mirror the board so the strong side plays up the board as white
+        strongKing = (DIMS - 1 - currState.blackKingLoc[0]) * DIMS + currState.blackKingLoc[1]
+        weakKing = (DIMS - 1 - currState.whiteKingLoc[0]) * DIMS + currState.whiteKingLoc[1]
+        square = (DIMS - 1 - square // DIMS) * DIMS + square % DIMS
+    weakToMove = 0 if currState.whiteToMove == strongIsWhite else 1
+    if not table.is_win(position_index(weakToMove, strongKing, weakKing, square)):
+        return 0
+    return 1 if strongIsWhite else -1
+
+
+# does the strong side's piece on square attack target - the strong king (blocker) is the only other piece that can
+# stand in its way, since the weak king is the one looking for safe squares
+def piece_attacks(pieceType, square, target, blocker):
+    r, c = divmod(square, DIMS)
+    targetRow, targetCol = divmod(target, DIMS)
+    if pieceType == 'P':
+        return targetRow == r - 1 and abs(targetCol - c) == 1
+    dr = targetRow - r
+    dc = targetCol - c
+    if (dr == 0 and dc == 0) or not (dr == 0 or dc == 0 or (pieceType == 'Q' and abs(dr) == abs(dc))):
+        return False
+    stepRow = (dr > 0) - (dr < 0)
+    stepCol = (dc > 0) - (dc < 0)
+    r += stepRow
+    c += stepCol
+    while r != targetRow or c != targetCol:
+        if r * DIMS + c == blocker:
+            return False
+        r += stepRow
+        c += stepCol
+    return True
+
+
+# classifications of the positions after every move of the strong side (promotions look up KQK / KRK)
+def strong_move_results(pieceType, strongKing, weakKing, piece, state, promotions):
+    for target in KING_NEIGHBORS[strongKing]:
+        if target != piece and target != weakKing and target not in KING_NEIGHBOR_SETS[weakKing]:
+            yield state[position_index(1, target, weakKing, piece)]
+    if pieceType == 'P':
+        target = piece - DIMS
+        if target == strongKing or target == weakKing:
+            return
+        if target < DIMS:
+            promotedIndex = position_index(1, strongKing, weakKing, target)
+            yield WIN if any(table.is_win(promotedIndex) for table in promotions) else DRAW
+            return
+        yield state[position_index(1, strongKing, weakKing, target)]
+        if piece // DIMS == DIMS - 2:  # double push from the starting row
+            target -= DIMS
+            if target != strongKing and target != weakKing:
+                yield state[position_index(1, strongKing, weakKing, target)]
+        return
+    r, c = divmod(piece, DIMS)
+    for dr, dc in (ROOK_DIRECTIONS if pieceType == 'R' else QUEEN_DIRECTIONS):
+        newRow = r + dr
+        newCol = c + dc
+        while 0 <= newRow < DIMS and 0 <= newCol < DIMS:
+            target = newRow * DIMS + newCol
+            if target == strongKing or target == weakKing:
+                break
+            yield state[position_index(1, strongKing, weakKing, target)]
+            newRow += dr
+            newCol += dc
+
+
+def classify(pieceType, index, state, promotions):
+    piece = index & 63
+    weakKing = index >> 6 & 63
+    strongKing = index >> 12 & 63
+    weakToMove = index >> 18
+    if strongKing == weakKing or piece == strongKing or piece == weakKing or \
+            weakKing in KING_NEIGHBOR_SETS[strongKing] or (pieceType == 'P' and not 0 < piece // DIMS < DIMS - 1):
+        return INVALID
+    weakInCheck = piece_attacks(pieceType, piece, weakKing, strongKing)
+    if not weakToMove:
+        if weakInCheck:
+            return INVALID
+        allDraws = True
+        for value in strong_move_results(pieceType, strongKing, weakKing, piece, state, promotions):
+            if value == WIN:
+                return WIN
+            if value != DRAW:
+                allDraws = False
+        return DRAW if allDraws else UNKNOWN  # no moves at all is stalemate
+    hasMove = False
+    allWins = True
+    for target in KING_NEIGHBORS[weakKing]:
+        if target == strongKing or target in KING_NEIGHBOR_SETS[strongKing]:
+            continue
+        if target == piece:
+            return DRAW  # the piece is not defended by its king - taking it leaves kings only
+        if piece_attacks(pieceType, piece, target, strongKing):
+            continue
+        hasMove = True
+        value = state[position_index(0, strongKing, target, piece)]
+        if value == DRAW:
+            return DRAW
+        if value != WIN:
+            allWins = False
+    if not hasMove:
+        return WIN if weakInCheck else DRAW  # checkmate or stalemate
+    return WIN if allWins else UNKNOWN
+
+
+# worker process state - the table being generated (shared memory) and the bitbases promotions lead into
+workerState = None
+workerPromotions = None
+
+
+def init_generation_worker(sharedState, promotionPaths):
+    global workerState, workerPromotions
+    workerState = memoryview(sharedState).cast("B")
+    workerPromotions = [Bitbase(path) for path in promotionPaths]
+
+
+# runs in a worker process - one pass over the positions start..end, returning their new classifications
+def classify_range(pieceType, start, end):
+    state = workerState
+    result = bytearray(state[start:end])
+    for index in range(start, end):
+        if result[index - start] == UNKNOWN:
+            result[index - start] = classify(pieceType, index, state, workerPromotions)
+    return bytes(result)
+
+
+def generate_bitbase(material, directory=BITBASE_DIRECTORY, workers=1):
+    # imported here - the engine imports this module for probe, and should not pay for starting up process pools
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    pieceType = material[1]
+    promotionPaths = [os.path.join(directory, promoted + ".bb") for promoted in ("KQK", "KRK")] \
+        if pieceType == 'P' else []
+    sharedState = multiprocessing.RawArray('B', POSITION_COUNT)  # all UNKNOWN
+    state = memoryview(sharedState).cast("B")
+    chunkSize = POSITION_COUNT // (workers * 8)
+    starts = list(range(0, POSITION_COUNT, chunkSize))
+    ends = [min(start + chunkSize, POSITION_COUNT) for start in starts]
+    passes = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_generation_worker,
+                             initargs=(sharedState, promotionPaths)) as executor:
+        while True:
+            passes += 1
+            newState = b"".join(executor.map(classify_range, [pieceType] * len(starts), starts, ends))
+            if newState == state.tobytes():
+                break
+            state[:] = newState
+    bits = bytearray(POSITION_COUNT // 8)
+    for index in range(POSITION_COUNT):
+        if state[index] == WIN:
+            bits[index >> 3] |= 1 << (index & 7)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, material + ".bb"), "wb") as bitbaseFile:
+        bitbaseFile.write(bits)
+    return passes, state.tobytes().count(WIN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK endgame bitbases")
+    parser.add_argument("--out", default=BITBASE_DIRECTORY, help="directory the bitbases are written to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    for material in MATERIALS:
+        startTime = time.perf_counter()
+        passes, wins = generate_bitbase(material, args.out, args.workers)
+        print("%s: %d winning positions, %d passes, %.1fs" % (material, wins, passes, time.perf_counter() - startTime))
+
+
+if __name__ == "__main__":
+    main()
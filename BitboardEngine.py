@@ -0,0 +1,359 @@
+'''
+    Bitboard backend for GameState.
+    Square index is row * 8 + col (a8 = 0, h1 = 63), bit i of a bitboard is set when square i is occupied.
+    The mailbox board of GameState is still kept up to date, so ChessAI and main.py work unchanged, while
+    move generation and attack detection run on 64 bit integers.
+    Perft runs about 1.2-1.3x as fast as on the mailbox board (python Perft.py --suite --backend bitboard) - most
+    of the remaining time goes into building Move objects, which both backends share.
+'''
+from ChessEngine import GameState, Move, UNDER_PROMOTION_PIECES, CASTLE_WKS, CASTLE_WQS, CASTLE_BKS, CASTLE_BQS
+from Constants import DIMS, FOUR_WAY_DIRS, DIAGONAL_DIRS, KNIGHT_DIRS
+
+BB_ALL = (1 << 64) - 1
+ROW_MASKS = [0xFF << (r * DIMS) for r in range(DIMS)]
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+
+
+def _in_bounds(r, c):
+    return 0 <= r < DIMS and 0 <= c < DIMS
+
+
+def _offset_table(offsets):
+    table = []
+    for sq in range(DIMS * DIMS):
+        r, c = divmod(sq, DIMS)
+        mask = 0
+        for dr, dc in offsets:
+            if _in_bounds(r + dr, c + dc):
+                mask |= 1 << ((r + dr) * DIMS + c + dc)
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _offset_table(KNIGHT_DIRS)
+KING_ATTACKS = _offset_table(FOUR_WAY_DIRS + DIAGONAL_DIRS)
+# squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {'w': _offset_table([(-1, -1), (-1, 1)]), 'b': _offset_table([(1, -1), (1, 1)])}
+
+# (row, col) of every square index
+SQUARE_COORDS = [divmod(sq, DIMS) for sq in range(DIMS * DIMS)]
+
+# squares strictly between two squares on a common line (0 if they are not aligned)
+BETWEEN = [[0] * (DIMS * DIMS) for _ in range(DIMS * DIMS)]
+for _sq in range(DIMS * DIMS):
+    _r, _c = divmod(_sq, DIMS)
+    for _dr, _dc in FOUR_WAY_DIRS + DIAGONAL_DIRS:
+        _mask = 0
+        _nr, _nc = _r + _dr, _c + _dc
+        while _in_bounds(_nr, _nc):
+            BETWEEN[_sq][_nr * DIMS + _nc] = _mask
+            _mask |= 1 << (_nr * DIMS + _nc)
+            _nr, _nc = _nr + _dr, _nc + _dc
+
+'''
+    Precomputed sliding attacks - for every square, the attack set of a rook / bishop for every occupancy of the
+    squares that can block it (its rays short of the board edge, ROOK_MASKS / BISHOP_MASKS). Looking the masked
+    occupancy up in a dict does what the magic multiplication does in C engines: one lookup per slider instead of a
+    scan along every ray. The tables (about 107000 entries) are built by init_sliding_tables on first use, so
+    importing this module stays cheap.
+'''
+ROOK_MASKS = []
+ROOK_TABLES = []
+BISHOP_MASKS = []
+BISHOP_TABLES = []
+
+
+# blocker mask of the ray from sq in direction (dr, dc), and its attack set for every occupancy of the mask
+def _ray_attack_table(sq, dr, dc):
+    r, c = divmod(sq, DIMS)
+    squares = []
+    r, c = r + dr, c + dc
+    while _in_bounds(r, c):
+        squares.append(r * DIMS + c)
+        r, c = r + dr, c + dc
+    blockerSquares = squares[:-1]  # a piece on the last square of a ray blocks nothing
+    table = {}
+    for subset in range(1 << len(blockerSquares)):
+        occupied = 0
+        for i, blockerSq in enumerate(blockerSquares):
+            if subset >> i & 1:
+                occupied |= 1 << blockerSq
+        attacks = 0
+        for targetSq in squares:
+            attacks |= 1 << targetSq
+            if occupied >> targetSq & 1:
+                break
+        table[occupied] = attacks
+    return sum(1 << blockerSq for blockerSq in blockerSquares), table
+
+
+# the rays' tables merged into one - the rays' masks do not overlap, so their occupancies and attacks just add up
+def _merge_attack_tables(rayTables):
+    mask, table = rayTables[0]
+    for rayMask, rayTable in rayTables[1:]:
+        mask |= rayMask
+        table = {occupied | rayOccupied: attacks | rayAttacks for occupied, attacks in table.items()
+                 for rayOccupied, rayAttacks in rayTable.items()}
+    return mask, table
+
+
+def init_sliding_tables():
+    if len(ROOK_TABLES) != 0:
+        return
+    for sq in range(DIMS * DIMS):
+        mask, table = _merge_attack_tables([_ray_attack_table(sq, dr, dc) for dr, dc in FOUR_WAY_DIRS])
+        ROOK_MASKS.append(mask)
+        ROOK_TABLES.append(table)
+        mask, table = _merge_attack_tables([_ray_attack_table(sq, dr, dc) for dr, dc in DIAGONAL_DIRS])
+        BISHOP_MASKS.append(mask)
+        BISHOP_TABLES.append(table)
+
+
+def rook_attacks(sq, occupied):
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+
+
+def bishop_attacks(sq, occupied):
+    return BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def iterate_bits(bitboard):
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitboardGameState(GameState):
+    def __init__(self, fen=None):
+        init_sliding_tables()
+        super().__init__(fen)
+        self.init_bitboards()
+
+    # build all bitboards from the mailbox board
+    def init_bitboards(self):
+        self.pieceBitboards = {piece: 0 for piece in PIECES}
+        for r in range(DIMS):
+            for c in range(DIMS):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.pieceBitboards[piece] |= 1 << (r * DIMS + c)
+        self.colorBitboards = {
+            'w': sum(self.pieceBitboards[piece] for piece in PIECES if piece[0] == 'w'),
+            'b': sum(self.pieceBitboards[piece] for piece in PIECES if piece[0] == 'b')
+        }
+
+    def make_move(self, move):
+        super().make_move(move)
+        self.toggle_move_bits(move)
+
+    def undo_move(self):
+        if len(self.moveLog) != 0:
+            self.toggle_move_bits(self.moveLog[-1])
+            super().undo_move()
+
+    # xor every square a made move changed - the same toggles apply the move and take it back
+    def toggle_move_bits(self, move):
+        pieceBitboards = self.pieceBitboards
+        colorBitboards = self.colorBitboards
+        ally = move.pieceMoved[0]
+        startBit = 1 << (move.startRow * DIMS + move.startCol)
+        endBit = 1 << (move.endRow * DIMS + move.endCol)
+        pieceBitboards[move.pieceMoved] ^= startBit
+        pieceBitboards[self.board[move.endRow][move.endCol]] ^= endBit  # the promoted piece after a promotion
+        colorBitboards[ally] ^= startBit | endBit
+        if move.pieceCaptured != "--":
+            captureBit = 1 << (move.startRow * DIMS + move.endCol) if move.isEnPassant else endBit
+            pieceBitboards[move.pieceCaptured] ^= captureBit
+            colorBitboards[move.pieceCaptured[0]] ^= captureBit
+        if move.isCastleMove:
+            rowStart = move.endRow * DIMS
+            if move.endCol - move.startCol == 2:  # king side castle
+                rookBits = (1 << (rowStart + DIMS - 1)) | (1 << (rowStart + move.endCol - 1))
+            else:  # queen side castle
+                rookBits = (1 << rowStart) | (1 << (rowStart + move.endCol + 1))
+            pieceBitboards[ally + 'R'] ^= rookBits
+            colorBitboards[ally] ^= rookBits
+
+    # bitboard of pieces of the given color attacking square sq
+    def attackers_to(self, sq, color, occupied):
+        pieceBitboards = self.pieceBitboards
+        queens = pieceBitboards[color + 'Q']
+        return (KNIGHT_ATTACKS[sq] & pieceBitboards[color + 'N']) | \
+            (KING_ATTACKS[sq] & pieceBitboards[color + 'K']) | \
+            (PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & pieceBitboards[color + 'p']) | \
+            (ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] & (pieceBitboards[color + 'R'] | queens)) | \
+            (BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]] & (pieceBitboards[color + 'B'] | queens))
+
+    def square_under_attack(self, r, c):
+        opposition = 'b' if self.whiteToMove else 'w'
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        return self.attackers_to(r * DIMS + c, opposition, occupied) != 0
+
+    def in_check(self):
+        ally = 'w' if self.whiteToMove else 'b'
+        kingSq = self.pieceBitboards[ally + 'K'].bit_length() - 1
+        return self.square_under_attack(kingSq // DIMS, kingSq % DIMS)
+
+    def get_all_valid_moves(self):
+        moves = []
+        board = self.board
+        pieceBitboards = self.pieceBitboards
+        if self.whiteToMove:
+            ally, opposition = 'w', 'b'
+        else:
+            ally, opposition = 'b', 'w'
+        allies = self.colorBitboards[ally]
+        enemies = self.colorBitboards[opposition]
+        occupied = allies | enemies
+        kingSq = pieceBitboards[ally + 'K'].bit_length() - 1
+
+        checkers = self.attackers_to(kingSq, opposition, occupied)
+        self.inCheck = checkers != 0
+        # pinned pieces - an enemy slider looking at the king through exactly one ally piece
+        pinMasks = {}
+        enemyQueens = pieceBitboards[opposition + 'Q']
+        snipers = (rook_attacks(kingSq, enemies) & (pieceBitboards[opposition + 'R'] | enemyQueens)) | \
+                  (bishop_attacks(kingSq, enemies) & (pieceBitboards[opposition + 'B'] | enemyQueens))
+        for sniperSq in iterate_bits(snipers):
+            between = BETWEEN[kingSq][sniperSq] & occupied
+            if between and between & (between - 1) == 0 and between & allies:
+                pinMasks[between.bit_length() - 1] = BETWEEN[kingSq][sniperSq] | (1 << sniperSq)
+
+        # king moves - the king itself must not block attacks on the squares it steps back to
+        occupiedWithoutKing = occupied ^ (1 << kingSq)
+        for endSq in iterate_bits(KING_ATTACKS[kingSq] & ~allies):
+            if not self.attackers_to(endSq, opposition, occupiedWithoutKing):
+                moves.append(Move(SQUARE_COORDS[kingSq], SQUARE_COORDS[endSq], board))
+
+        if checkers & (checkers - 1):  # double check - only king moves
+            targets = 0
+        elif checkers:  # single check - capture the checking piece or block the check
+            targets = checkers | BETWEEN[kingSq][checkers.bit_length() - 1]
+        else:
+            targets = BB_ALL
+            self.get_bitboard_castle_moves(kingSq, ally, opposition, occupied, moves)
+
+        if targets:
+            self.get_bitboard_pawn_moves(ally, opposition, enemies, occupied, kingSq, targets, pinMasks, moves)
+            nonPawnTargets = targets & ~allies
+            for startSq in iterate_bits(pieceBitboards[ally + 'N']):
+                if startSq not in pinMasks:  # a pinned knight can never move
+                    self.add_bitboard_moves(startSq, KNIGHT_ATTACKS[startSq] & nonPawnTargets, pinMasks, moves)
+            for startSq in iterate_bits(pieceBitboards[ally + 'B']):
+                attacks = BISHOP_TABLES[startSq][occupied & BISHOP_MASKS[startSq]]
+                self.add_bitboard_moves(startSq, attacks & nonPawnTargets, pinMasks, moves)
+            for startSq in iterate_bits(pieceBitboards[ally + 'R']):
+                attacks = ROOK_TABLES[startSq][occupied & ROOK_MASKS[startSq]]
+                self.add_bitboard_moves(startSq, attacks & nonPawnTargets, pinMasks, moves)
+            for startSq in iterate_bits(pieceBitboards[ally + 'Q']):
+                attacks = ROOK_TABLES[startSq][occupied & ROOK_MASKS[startSq]] | \
+                    BISHOP_TABLES[startSq][occupied & BISHOP_MASKS[startSq]]
+                self.add_bitboard_moves(startSq, attacks & nonPawnTargets, pinMasks, moves)
+
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
+        return moves
+
+    # full generation is cheap with bitboards, so the stages are cut from a single move list
+    def get_staged_moves(self, hashMove=None, moveKey=None):
+        moves = self.get_all_valid_moves()
+        legalHashMove = None
+        if hashMove is not None:
+            for move in moves:
+                if move == hashMove:
+                    legalHashMove = move
+                    yield move
+                    break
+        captures = [move for move in moves if move.pieceCaptured != "--" or move.isPawnPromotion]
+        if moveKey is not None:
+            captures.sort(key=moveKey, reverse=True)
+        for move in captures:
+            if move != legalHashMove:
+                yield move
+        quietMoves = [move for move in moves
+                      if move.pieceCaptured == "--" and not move.isPawnPromotion and move != legalHashMove]
+        if moveKey is not None:
+            quietMoves.sort(key=moveKey, reverse=True)
+        for move in quietMoves:
+            yield move
+
+    def get_capture_moves(self):
+        return [move for move in self.get_all_valid_moves() if move.pieceCaptured != "--" or move.isPawnPromotion]
+
+    def add_bitboard_moves(self, startSq, attacks, pinMasks, moves):
+        if startSq in pinMasks:
+            attacks &= pinMasks[startSq]
+        startSquare = SQUARE_COORDS[startSq]
+        board = self.board
+        while attacks:
+            lowest = attacks & -attacks
+            moves.append(Move(startSquare, SQUARE_COORDS[lowest.bit_length() - 1], board))
+            attacks ^= lowest
+
+    def get_bitboard_pawn_moves(self, ally, opposition, enemies, occupied, kingSq, targets, pinMasks, moves):
+        board = self.board
+        pawns = self.pieceBitboards[ally + 'p']
+        empty = ~occupied & BB_ALL
+        if ally == 'w':
+            step = -DIMS
+            singlePushes = (pawns >> DIMS) & empty
+            doublePushes = ((singlePushes & ROW_MASKS[5]) >> DIMS) & empty
+        else:
+            step = DIMS
+            singlePushes = (pawns << DIMS) & empty
+            doublePushes = ((singlePushes & ROW_MASKS[2]) << DIMS) & empty
+
+        for endSq in iterate_bits(singlePushes & targets):
+            self.add_bitboard_pawn_move(endSq - step, endSq, pinMasks, moves)
+        for endSq in iterate_bits(doublePushes & targets):
+            self.add_bitboard_pawn_move(endSq - 2 * step, endSq, pinMasks, moves)
+        for startSq in iterate_bits(pawns):
+            for endSq in iterate_bits(PAWN_ATTACKS[ally][startSq] & enemies & targets):
+                self.add_bitboard_pawn_move(startSq, endSq, pinMasks, moves)
+
+        # en passant - checked by looking for attacks on the king once both pawns have left their squares
+        if self.enPassantPossible != ():
+            endSq = self.enPassantPossible[0] * DIMS + self.enPassantPossible[1]
+            capturedSq = endSq - step
+            if targets & ((1 << endSq) | (1 << capturedSq)):
+                for startSq in iterate_bits(PAWN_ATTACKS[opposition][endSq] & pawns):
+                    occupiedAfter = (occupied ^ (1 << startSq) ^ (1 << capturedSq)) | (1 << endSq)
+                    pieceBitboards = self.pieceBitboards
+                    enemyQueens = pieceBitboards[opposition + 'Q']
+                    if not (rook_attacks(kingSq, occupiedAfter) & (pieceBitboards[opposition + 'R'] | enemyQueens)) \
+                            and not (bishop_attacks(kingSq, occupiedAfter) &
+                                     (pieceBitboards[opposition + 'B'] | enemyQueens)):
+                        moves.append(Move(SQUARE_COORDS[startSq], SQUARE_COORDS[endSq], board, isEnPassant=True))
+
+    def add_bitboard_pawn_move(self, startSq, endSq, pinMasks, moves):
+        if startSq in pinMasks and not pinMasks[startSq] >> endSq & 1:
+            return
+        startSquare = SQUARE_COORDS[startSq]
+        endSquare = SQUARE_COORDS[endSq]
+        move = Move(startSquare, endSquare, self.board)
+        moves.append(move)
+        if move.isPawnPromotion:
+            for promotionPiece in UNDER_PROMOTION_PIECES:
+                moves.append(Move(startSquare, endSquare, self.board, promotionPiece=promotionPiece))
+
+    def get_bitboard_castle_moves(self, kingSq, ally, opposition, occupied, moves):
+        if ally == 'w':
+            kingSide, queenSide = self.castlingRights & CASTLE_WKS, self.castlingRights & CASTLE_WQS
+        else:
+            kingSide, queenSide = self.castlingRights & CASTLE_BKS, self.castlingRights & CASTLE_BQS
+        kingSquare = SQUARE_COORDS[kingSq]
+        if kingSide and not (occupied >> (kingSq + 1)) & 3:
+            if not self.attackers_to(kingSq + 1, opposition, occupied) and \
+                    not self.attackers_to(kingSq + 2, opposition, occupied):
+                moves.append(Move(kingSquare, (kingSquare[0], kingSquare[1] + 2), self.board, isCastleMove=True))
+        if queenSide and not (occupied >> (kingSq - 3)) & 7:
+            if not self.attackers_to(kingSq - 1, opposition, occupied) and \
+                    not self.attackers_to(kingSq - 2, opposition, occupied):
+                moves.append(Move(kingSquare, (kingSquare[0], kingSquare[1] - 2), self.board, isCastleMove=True))
@@ -1,9 +1,71 @@
+import os
+import pickle
 import random
+import time
 
-PIECE_SCORE = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-CHECKMATE_SCORE = 1000
+import Bitbases
+from PieceSquareTables import PIECE_SCORE, TOTAL_PHASE
+from SearchStats import SearchStats
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, DEPTH, SCORE, BOUND, MOVE, \
+    MATE_THRESHOLD
+
+CHECKMATE_SCORE = 1000  # the search scores a mate CHECKMATE_SCORE less the plies from the root to the mate
 STALEMATE_SCORE = 0
+BITBASE_WIN_SCORE = 100  # positions the bitbases call won - above any material balance, below a found mate
 MAX_DEPTH = 2
+TT_SIZE_MB = 16
+MOVE_TIME = 1.0  # seconds the AI may think per move
+MAX_SEARCH_DEPTH = 32  # depth limit for iterative deepening
+MOVES_TO_GO = 30  # moves a clock is assumed to last when no move count is given
+SEARCH_WORKERS = os.cpu_count() or 1  # processes used by the parallel search
+POLL_INTERVAL = 0.005  # seconds between the parallel search's checks of the clock and the stop event
+ROOT_SCORE_MARGIN = 1e-6  # root moves are searched from just below the best score, so that equal scores are exact
+
+# move ordering - hash move, then captures by MVV-LVA, then killer moves, then quiet moves by history score
+ORDERING_PIECE_VALUE = {"K": 10, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORES = [90000, 80000]
+MAX_HISTORY_SCORE = 50000
+
+# quiescence search - captures further than this below alpha even after winning the captured piece are skipped
+DELTA_MARGIN = 2
+QUIESCENCE_CHECK_EVASIONS = False  # search every reply when in check instead of standing pat
+
+# kept between searches so positions reached again on the next move are not searched from scratch
+transpositionTable = TranspositionTable(TT_SIZE_MB)
+# depth of the current root call, and the wall clock times at which a timed search started and must stop
+rootDepth = MAX_DEPTH
+searchStartTime = 0.0
+searchDeadline = None
+# threading.Event that cancels the running search when set (searches started from a background worker)
+searchStopEvent = None
+# counters of the current search - copied into searchStats, the SearchStats of the running search (the searches
+# return it with their move)
+searchNodes = 0  # nodes visited by the current search
+quiescenceNodes = 0
+betaCutoffs = 0
+firstMoveCutoffs = 0
+transpositionCutoffs = 0
+searchStats = SearchStats()
+# SearchHook called at search events - None keeps the search free of any hook calls
+searchHook = None
+# two quiet moves per ply that last caused a beta cutoff, and cutoff counts of quiet moves by (piece, end square)
+killerMoves = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+historyScores = {}
+# parallel search - the worker pool is kept between searches. sharedAlpha holds the best root score found so far,
+# rootMoveIndex the next root move to be taken by a worker, and poolStopEvent stops the workers' searches
+searchPool = None
+searchPoolWorkers = 0
+sharedAlpha = None
+rootMoveIndex = None
+poolStopEvent = None
+searchCount = 0  # lets a worker notice that a new search started, to age its transposition table
+workerSearchCount = -1
+
+
+class SearchTimeout(Exception):
+    pass
 
 
 def find_random_move(validMoves):
@@ -44,42 +106,373 @@ def find_best_move(currState, validMoves):
 
 
 '''
-    Helper function to make first recursive call to find_move_min_max
+    Helper function to make first recursive call to find_move_min_max - returns the best move and the SearchStats
+    of the search
 '''
 
 
 def find_best_move_min_max(currState, validMoves):
     global nextMove
     nextMove = None
+    start_search_clock(None)
+    begin_search_stats(currState)
     random.shuffle(validMoves)
-    find_move_min_max(currState, validMoves, MAX_DEPTH, currState.whiteToMove)
-    return nextMove
+    score = find_move_min_max(currState, validMoves, MAX_DEPTH, currState.whiteToMove)
+    if not currState.whiteToMove:
+        score = -score  # scores of the iterations are from the side to move's view, as in the other searches
+    update_search_stats()
+    searchStats.iterations.append((MAX_DEPTH, score, nextMove, searchNodes, searchStats.elapsed))
+    end_search_stats(currState)
+    return nextMove, searchStats
 
 
 '''
-    Helper function to make first recursive call to find_move_nega_max
+    Helper function to make first recursive call to find_move_nega_max - returns the best move and the SearchStats
+    of the search
 '''
 
 
 def find_best_move_nega_max(currState, validMoves):
     global nextMove
     nextMove = None
+    start_search_clock(None)
+    begin_search_stats(currState)
     random.shuffle(validMoves)
-    find_move_nega_max(currState, validMoves, MAX_DEPTH, 1 if currState.whiteToMove else -1)
-    return nextMove
+    score = find_move_nega_max(currState, validMoves, MAX_DEPTH, 1 if currState.whiteToMove else -1)
+    update_search_stats()
+    searchStats.iterations.append((MAX_DEPTH, score, nextMove, searchNodes, searchStats.elapsed))
+    end_search_stats(currState)
+    return nextMove, searchStats
 
 
 '''
-    Helper function to make first recursive call to find_move_nega_max_alpha_beta
+    Helper function to make first recursive call to find_move_nega_max_alpha_beta - returns the best move and the
+    SearchStats of the search
 '''
 
 
-def find_best_move_nega_max_alpha_beta(currState, validMoves):
-    global nextMove
+def find_best_move_nega_max_alpha_beta(currState, validMoves, depth=MAX_DEPTH):
+    global nextMove, rootDepth
     nextMove = None
-    random.shuffle(validMoves)
-    find_move_nega_max_alpha_beta(currState, validMoves, MAX_DEPTH, -CHECKMATE_SCORE, CHECKMATE_SCORE, 1 if currState.whiteToMove else -1)
-    return nextMove
+    rootDepth = depth
+    start_search_clock(None)
+    begin_search_stats(currState)
+    random.shuffle(validMoves)  # only breaks ties - order_moves sorts stably
+    transpositionTable.new_search()
+    reset_move_ordering()
+    score = find_move_nega_max_alpha_beta(currState, validMoves, depth, -CHECKMATE_SCORE, CHECKMATE_SCORE,
+                                          1 if currState.whiteToMove else -1)
+    update_search_stats()
+    searchStats.iterations.append((depth, score, nextMove, searchNodes, searchStats.elapsed))
+    end_search_stats(currState)
+    return nextMove, searchStats
+
+
+'''
+    Iterative deepening around find_move_nega_max_alpha_beta - searches depth 1, 2, 3, ... until moveTime seconds
+    have passed. Returns the best move of the last iteration that completed - or, when not even depth 1 completed,
+    the best root move searched so far, else the first root move in search order, so a legal move is returned
+    whenever there is one, however short the time - and the SearchStats of the search.
+    Every iteration searches the previous iteration's best move first.
+    moveTime None searches until maxDepth or until stopEvent is set. onIteration, if given, is called with
+    (depth, score, bestMove) after every completed iteration - score in pawns, from the side to move's view.
+    Every completed iteration is also recorded in the SearchStats.
+'''
+
+
+def find_best_move_iterative_deepening(currState, validMoves, moveTime=MOVE_TIME, maxDepth=MAX_SEARCH_DEPTH,
+                                       stopEvent=None, onIteration=None):
+    global nextMove, rootDepth, searchDeadline, searchStopEvent
+    start_search_clock(moveTime)
+    begin_search_stats(currState)
+    searchStopEvent = stopEvent
+    rootMoveCount = len(currState.moveLog)
+    turnMultiplier = 1 if currState.whiteToMove else -1
+    random.shuffle(validMoves)  # only breaks ties - order_moves sorts stably
+    transpositionTable.new_search()
+    reset_move_ordering()
+    bestMove = None
+    for depth in range(1, maxDepth + 1):
+        nextMove = None
+        rootDepth = depth
+        try:
+            score = find_move_nega_max_alpha_beta(currState, validMoves, depth, -CHECKMATE_SCORE, CHECKMATE_SCORE,
+                                                  turnMultiplier)
+        except SearchTimeout:
+            # unwind the moves the interrupted iteration had made
+            while len(currState.moveLog) > rootMoveCount:
+                currState.undo_move()
+            if bestMove is None:
+                bestMove = nextMove  # not even depth 1 finished - the best move seen so far beats a random one
+            break
+        if nextMove is not None:
+            bestMove = nextMove
+            validMoves.remove(bestMove)
+            validMoves.insert(0, bestMove)
+            update_search_stats()
+            searchStats.iterations.append((depth, score, bestMove, searchNodes, searchStats.elapsed))
+            if searchHook is not None:
+                searchHook.on_iteration(depth, score, bestMove, searchStats)
+            if onIteration is not None:
+                onIteration(depth, score, bestMove)
+        # stop on a forced mate, or when the next iteration (which takes longer) can not finish in time
+        if abs(score) >= MATE_THRESHOLD or (searchDeadline is not None and
+                                             time.perf_counter() - searchStartTime > (searchDeadline - searchStartTime) / 2):
+            break
+    if bestMove is None and len(validMoves) != 0:
+        bestMove = validMoves[0]  # stopped before any root move was searched
+    searchDeadline = None
+    searchStopEvent = None
+    end_search_stats(currState)
+    return bestMove, searchStats
+
+
+'''
+    Iterative deepening like find_best_move_iterative_deepening, with every iteration split over a pool of worker
+    processes at the root. The first (best ordered) root move is searched here to get a good alpha, then the workers
+    take the remaining root moves one by one, each starting from the best root score any of them has found so far.
+    A root move's score above the alpha it started from is exact, anything else only an upper bound that can not
+    beat the move that set the alpha, so the move and score match the serial search at the same depth.
+    moveTime and stopEvent are checked here every POLL_INTERVAL seconds, and stop the workers through a shared event.
+    Every worker keeps its own transposition table, killer moves and history between searches. The SearchStats only
+    get the workers' node counts - hooks are not called in worker processes.
+    With a single worker (or a single legal move) this is find_best_move_iterative_deepening.
+'''
+
+
+def find_best_move_parallel(currState, validMoves, moveTime=MOVE_TIME, maxDepth=MAX_SEARCH_DEPTH, stopEvent=None,
+                            onIteration=None, workers=SEARCH_WORKERS):
+    global rootDepth, searchDeadline, searchStopEvent, searchCount
+    if workers <= 1 or len(validMoves) <= 1:
+        return find_best_move_iterative_deepening(currState, validMoves, moveTime, maxDepth, stopEvent, onIteration)
+    start_search_clock(moveTime)
+    begin_search_stats(currState)
+    searchStopEvent = stopEvent
+    pool = get_search_pool(workers)
+    searchCount += 1
+    random.shuffle(validMoves)  # only breaks ties - order_moves sorts stably
+    transpositionTable.new_search()
+    reset_move_ordering()
+    entry = transpositionTable.probe(currState.zobristKey)
+    order_moves(validMoves, entry[MOVE] if entry is not None else None, 0)
+    stateData = pickle.dumps(currState)
+    bestMove = None
+    for depth in range(1, maxDepth + 1):
+        rootDepth = depth
+        try:
+            move, score = search_root_parallel(currState, validMoves, depth, pool, stateData)
+        except SearchTimeout:
+            break
+        bestMove = move
+        validMoves.remove(bestMove)
+        validMoves.insert(0, bestMove)
+        update_search_stats()
+        searchStats.iterations.append((depth, score, bestMove, searchNodes, searchStats.elapsed))
+        if searchHook is not None:
+            searchHook.on_iteration(depth, score, bestMove, searchStats)
+        if onIteration is not None:
+            onIteration(depth, score, bestMove)
+        if abs(score) >= MATE_THRESHOLD or (searchDeadline is not None and
+                                             time.perf_counter() - searchStartTime > (searchDeadline - searchStartTime) / 2):
+            break
+    if bestMove is None:
+        bestMove = validMoves[0]  # not even depth 1 finished
+    searchDeadline = None
+    searchStopEvent = None
+    end_search_stats(currState)
+    return bestMove, searchStats
+
+
+# one iteration of find_best_move_parallel - (best move, score), or SearchTimeout if it was stopped
+def search_root_parallel(currState, validMoves, depth, pool, stateData):
+    global searchNodes
+    from concurrent.futures import FIRST_COMPLETED, wait
+    turnMultiplier = 1 if currState.whiteToMove else -1
+    rootMoveCount = len(currState.moveLog)
+    currState.make_move(validMoves[0])
+    try:
+        bestScore = - find_move_nega_max_alpha_beta(currState, None, depth - 1, -CHECKMATE_SCORE, CHECKMATE_SCORE,
+                                                    -turnMultiplier)
+    finally:
+        while len(currState.moveLog) > rootMoveCount:  # also unwinds an interrupted search
+            currState.undo_move()
+    sharedAlpha.value = bestScore
+    rootMoveIndex.value = 0
+    poolStopEvent.clear()
+    moveIDs = [move.moveID for move in validMoves[1:]]
+    futures = [pool.submit(search_root_moves, stateData, moveIDs, depth, turnMultiplier, searchCount)
+               for _ in range(min(searchPoolWorkers, len(moveIDs)))]
+    pending = set(futures)
+    while len(pending) != 0:
+        _, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        if (searchDeadline is not None and time.perf_counter() >= searchDeadline) or \
+                (searchStopEvent is not None and searchStopEvent.is_set()):
+            poolStopEvent.set()
+    bestMove = validMoves[0]
+    results = []
+    for future in futures:
+        workerResults, nodes = future.result()
+        searchNodes += nodes
+        results.extend(workerResults)
+    if poolStopEvent.is_set():
+        raise SearchTimeout()
+    # in root move order, so that of equal scores the first wins as in the serial search
+    for index, score, alpha in sorted(results):
+        if score > alpha - ROOT_SCORE_MARGIN and score > bestScore:
+            bestMove = validMoves[index + 1]
+            bestScore = score
+    return bestMove, bestScore
+
+
+def get_search_pool(workers):
+    global searchPool, searchPoolWorkers, sharedAlpha, rootMoveIndex, poolStopEvent
+    if searchPool is None or searchPoolWorkers != workers:
+        # imported here - only the parallel search needs them, and they slow down start up (e.g. of UCI.py)
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        shutdown_search_pool()
+        # spawned rather than forked - the search usually runs on a thread of a process with other threads
+        context = multiprocessing.get_context("spawn")
+        sharedAlpha = context.Value('d', -CHECKMATE_SCORE)
+        rootMoveIndex = context.Value('i', 0)
+        poolStopEvent = context.Event()
+        searchPool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_search_worker,
+                                         initargs=(sharedAlpha, rootMoveIndex, poolStopEvent))
+        searchPoolWorkers = workers
+    return searchPool
+
+
+def shutdown_search_pool():
+    global searchPool, searchPoolWorkers
+    if searchPool is not None:
+        searchPool.shutdown()
+        searchPool = None
+        searchPoolWorkers = 0
+
+
+def init_search_worker(alphaValue, moveIndex, stopEvent):
+    global sharedAlpha, rootMoveIndex, searchStopEvent
+    sharedAlpha = alphaValue
+    rootMoveIndex = moveIndex
+    searchStopEvent = stopEvent
+
+
+'''
+    Runs in a worker process - takes root moves (given by moveID) off the shared list until none are left, reading
+    the shared alpha before each one. Returns (root move index, score, alpha it started from) of every root move
+    searched, and the nodes searched.
+'''
+
+
+def search_root_moves(stateData, moveIDs, depth, turnMultiplier, searchId):
+    global rootDepth, workerSearchCount, searchNodes
+    if searchId != workerSearchCount:
+        workerSearchCount = searchId
+        transpositionTable.new_search()
+        reset_move_ordering()
+    currState = pickle.loads(stateData)
+    movesByID = {move.moveID: move for move in currState.get_all_valid_moves()}
+    rootDepth = depth
+    searchNodes = 0
+    results = []
+    while True:
+        with rootMoveIndex.get_lock():
+            index = rootMoveIndex.value
+            rootMoveIndex.value += 1
+        if index >= len(moveIDs):
+            break
+        alpha = sharedAlpha.value
+        currState.make_move(movesByID[moveIDs[index]])
+        try:
+            score = - find_move_nega_max_alpha_beta(currState, None, depth - 1, -CHECKMATE_SCORE,
+                                                    -(alpha - ROOT_SCORE_MARGIN), -turnMultiplier)
+        except SearchTimeout:
+            break  # stopped - the main process drops this iteration
+        currState.undo_move()
+        with sharedAlpha.get_lock():
+            if score > sharedAlpha.value:
+                sharedAlpha.value = score
+        results.append((index, score, alpha))
+    return results, searchNodes
+
+
+# starts the clock of a search - also used to put a time limit on a running untimed (pondering) search
+def start_search_clock(moveTime):
+    global searchStartTime, searchDeadline
+    searchStartTime = time.perf_counter()
+    searchDeadline = searchStartTime + moveTime if moveTime is not None else None
+
+
+# resets the search counters and starts a new searchStats, at the start of every search
+def begin_search_stats(currState):
+    global searchStats, searchNodes, quiescenceNodes, betaCutoffs, firstMoveCutoffs, transpositionCutoffs
+    searchNodes = quiescenceNodes = betaCutoffs = firstMoveCutoffs = transpositionCutoffs = 0
+    searchStats = SearchStats()
+    if searchHook is not None:
+        searchHook.on_search_start(currState, searchStats)
+
+
+# copies the search counters into searchStats
+def update_search_stats():
+    searchStats.elapsed = time.perf_counter() - searchStats.startTime
+    searchStats.nodes = searchNodes
+    searchStats.quiescenceNodes = quiescenceNodes
+    searchStats.betaCutoffs = betaCutoffs
+    searchStats.firstMoveCutoffs = firstMoveCutoffs
+    searchStats.transpositionCutoffs = transpositionCutoffs
+
+
+def end_search_stats(currState):
+    update_search_stats()
+    if searchHook is not None:
+        searchHook.on_search_end(currState, searchStats)
+
+
+# expected line of play from currState - the chain of best moves stored in the transposition table
+def get_principal_variation(currState, maxLength=MAX_SEARCH_DEPTH):
+    line = []
+    entry = transpositionTable.probe(currState.zobristKey)
+    while entry is not None and entry[MOVE] is not None and len(line) < maxLength:
+        move = currState.find_legal_move(entry[MOVE])
+        if move is None:
+            break
+        line.append(move)
+        currState.make_move(move)
+        entry = transpositionTable.probe(currState.zobristKey)
+    for _ in line:
+        currState.undo_move()
+    return line
+
+
+# the reply the transposition table expects to move - the move to ponder on, or None
+def find_ponder_move(currState, move):
+    currState.make_move(move)
+    entry = transpositionTable.probe(currState.zobristKey)
+    ponderMove = None
+    if entry is not None and entry[MOVE] is not None:
+        ponderMove = currState.find_legal_move(entry[MOVE])
+    currState.undo_move()
+    return ponderMove
+
+
+# full moves to the mate a search score announces, negative when the side to move gets mated - None if it is no mate
+def moves_to_mate(score):
+    if abs(score) < MATE_THRESHOLD:
+        return None
+    movesToMate = (CHECKMATE_SCORE - int(round(abs(score))) + 1) // 2
+    return movesToMate if score > 0 else -movesToMate
+
+
+'''
+    Time to spend on the next move when playing with a clock of timeLeft seconds plus increment seconds per move
+'''
+
+
+def allocate_move_time(timeLeft, increment=0.0, movesToGo=None):
+    movesToGo = movesToGo if movesToGo else MOVES_TO_GO
+    moveTime = timeLeft / movesToGo + increment * 0.8
+    # never use more than half the clock, and keep a margin for the move to get back
+    return max(0.01, min(moveTime, timeLeft / 2 - 0.05))
 
 
 '''
@@ -88,7 +481,8 @@ def find_best_move_nega_max_alpha_beta(currState, validMoves):
 
 
 def find_move_min_max(currState, validMoves, depth, whiteToMove):
-    global nextMove
+    global nextMove, searchNodes
+    searchNodes += 1
     if depth == 0:
         return score_material(currState.board)
 
@@ -124,7 +518,8 @@ def find_move_min_max(currState, validMoves, depth, whiteToMove):
 
 
 def find_move_nega_max(currState, validMoves, depth, turnMultiplier):
-    global nextMove
+    global nextMove, searchNodes
+    searchNodes += 1
     if depth == 0:
         return turnMultiplier * score_board(currState)
     maxScore = -CHECKMATE_SCORE
@@ -146,26 +541,178 @@ def find_move_nega_max(currState, validMoves, depth, turnMultiplier):
 
 
 def find_move_nega_max_alpha_beta(currState, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
+    global nextMove, searchNodes, betaCutoffs, firstMoveCutoffs, transpositionCutoffs
+    searchNodes += 1
+    if (searchDeadline is not None and time.perf_counter() >= searchDeadline) or \
+            (searchStopEvent is not None and searchStopEvent.is_set()):
+        raise SearchTimeout()
+    if searchHook is not None:
+        searchHook.on_node(currState, depth, alpha, beta)
     if depth == 0:
-        return turnMultiplier * score_board(currState)
+        return quiescence_search(currState, alpha, beta, turnMultiplier, rootDepth)
+    if currState.pieceCount <= 3 and depth != rootDepth and Bitbases.probe(currState) == 0:
+        return STALEMATE_SCORE  # a known draw needs no search
+    # look up the position in the transposition table - the root always searches so that nextMove gets set
+    alphaOriginal = alpha
+    ply = rootDepth - depth
+    entry = transpositionTable.probe(currState.zobristKey, ply)
+    if entry is not None:
+        if depth != rootDepth and entry[DEPTH] >= depth:
+            if entry[BOUND] == EXACT:
+                transpositionCutoffs += 1
+                return entry[SCORE]
+            elif entry[BOUND] == LOWER_BOUND:
+                alpha = max(alpha, entry[SCORE])
+            elif entry[BOUND] == UPPER_BOUND:
+                beta = min(beta, entry[SCORE])
+            if alpha >= beta:
+                transpositionCutoffs += 1
+                return entry[SCORE]
+    hashMove = entry[MOVE] if entry is not None else None
+    if hashMove is None and depth == rootDepth and len(validMoves) != 0:
+        hashMove = validMoves[0]  # iterative deepening puts the previous iteration's best move first
+    if validMoves is None:
+        # below the root moves are picked stage by stage - a node that cuts off early never generates the rest
+        moves = currState.get_staged_moves(hashMove, move_order_key(None, ply))
+    else:
+        order_moves(validMoves, hashMove, ply)
+        moves = validMoves
     maxScore = -CHECKMATE_SCORE
-    for move in validMoves:
+    bestMove = None
+    movesSearched = 0
+    for move in moves:
+        movesSearched += 1
         currState.make_move(move)
-        nextMoves = currState.get_all_valid_moves()
-        score = - find_move_nega_max_alpha_beta(currState, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
+        score = - find_move_nega_max_alpha_beta(currState, None, depth - 1, -beta, -alpha, -turnMultiplier)
         if score > maxScore:
             maxScore = score
-            if depth == MAX_DEPTH:
+            bestMove = move
+            if depth == rootDepth:
                 nextMove = move
         currState.undo_move()
         if maxScore > alpha:
             alpha = maxScore
         if alpha >= beta:
+            betaCutoffs += 1
+            if movesSearched == 1:
+                firstMoveCutoffs += 1
+            if searchHook is not None:
+                searchHook.on_cutoff(currState, move, depth, movesSearched - 1)
+            if move.pieceCaptured == "--" and not move.isPawnPromotion:
+                update_quiet_move_scores(move, ply, depth)
             break
+    # no legal moves - set by the last stage of the move picker
+    if currState.checkmate:
+        return -CHECKMATE_SCORE + ply  # the nearer the mate, the better for the side giving it
+    if currState.stalemate:
+        return STALEMATE_SCORE
+    if maxScore <= alphaOriginal:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transpositionTable.store(currState.zobristKey, depth, maxScore, bound, bestMove, ply)
+    return maxScore
+
+
+'''
+    Searches only captures and promotions below the horizon, so that positions are not scored in the middle of
+    an exchange. The side to move may "stand pat" on the static score instead of capturing.
+'''
+
+
+def quiescence_search(currState, alpha, beta, turnMultiplier, ply):
+    global searchNodes, quiescenceNodes
+    searchNodes += 1
+    quiescenceNodes += 1
+    if (searchDeadline is not None and time.perf_counter() >= searchDeadline) or \
+            (searchStopEvent is not None and searchStopEvent.is_set()):
+        raise SearchTimeout()
+    if searchHook is not None:
+        searchHook.on_node(currState, 0, alpha, beta)
+    moves = currState.get_capture_moves()  # generates all evasions when in check, which also detects checkmate
+    if currState.checkmate:
+        return -CHECKMATE_SCORE + ply
+    if currState.stalemate:
+        return STALEMATE_SCORE
+    standPat = turnMultiplier * score_board(currState)
+    inCheck = QUIESCENCE_CHECK_EVASIONS and currState.inCheck
+    if inCheck:
+        # no standing pat when in check - every evasion is searched
+        maxScore = -CHECKMATE_SCORE
+        moves = currState.get_all_valid_moves()
+    else:
+        if standPat >= beta:
+            return standPat
+        maxScore = standPat
+        alpha = max(alpha, standPat)
+    order_moves(moves, None, ply)
+    for move in moves:
+        # delta pruning - even winning the captured piece for free can not bring this move up to alpha
+        if not inCheck and not move.isPawnPromotion and \
+                standPat + PIECE_SCORE[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+            continue
+        currState.make_move(move)
+        score = - quiescence_search(currState, -beta, -alpha, -turnMultiplier, ply + 1)
+        currState.undo_move()
+        if score > maxScore:
+            maxScore = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
     return maxScore
 
 
+'''
+    Sorts moves best first: hash move, captures by most valuable victim / least valuable attacker,
+    killer moves of this ply, then the remaining quiet moves by history score.
+    The sort is stable, so moves with equal scores keep their incoming (possibly shuffled) order.
+'''
+
+
+def order_moves(validMoves, hashMove, ply):
+    validMoves.sort(key=move_order_key(hashMove, ply), reverse=True)
+
+
+# sort key giving the ordering score of a move at this ply
+def move_order_key(hashMove, ply):
+    killers = killerMoves[ply] if ply < len(killerMoves) else [None, None]
+
+    def move_order_score(move):
+        if hashMove is not None and move == hashMove:
+            return HASH_MOVE_SCORE
+        if move.pieceCaptured != "--" or move.isPawnPromotion:
+            victimValue = ORDERING_PIECE_VALUE[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0
+            if move.isPawnPromotion:
+                victimValue += ORDERING_PIECE_VALUE[move.promotionPiece]
+            return CAPTURE_SCORE + 10 * victimValue - ORDERING_PIECE_VALUE[move.pieceMoved[1]]
+        if move == killers[0]:
+            return KILLER_SCORES[0]
+        if move == killers[1]:
+            return KILLER_SCORES[1]
+        return historyScores.get((move.pieceMoved, move.endRow, move.endCol), 0)
+
+    return move_order_score
+
+
+def update_quiet_move_scores(move, ply, depth):
+    if ply < len(killerMoves) and killerMoves[ply][0] != move:
+        killerMoves[ply][1] = killerMoves[ply][0]
+        killerMoves[ply][0] = move
+    key = (move.pieceMoved, move.endRow, move.endCol)
+    historyScores[key] = min(historyScores.get(key, 0) + depth * depth, MAX_HISTORY_SCORE)
+
+
+def reset_move_ordering():
+    for killers in killerMoves:
+        killers[0] = killers[1] = None
+    # keep some history from earlier searches, but let it fade
+    for key in historyScores:
+        historyScores[key] //= 2
+
+
 '''
 Scores the current game state based on multiple factors.
 (+ve score is good for white, -ve score is good for black)
@@ -181,14 +728,16 @@ def score_board(currState):
     elif currState.stalemate:
         return STALEMATE_SCORE
     else:
-        score = 0
-        for row in currState.board:
-            for square in row:
-                if square[0] == 'w':
-                    score += PIECE_SCORE[square[1]]
-                elif square[0] == 'b':
-                    score -= PIECE_SCORE[square[1]]
-        return score
+        if currState.pieceCount <= 3:
+            result = Bitbases.probe(currState)
+            if result is not None:
+                # king and piece against king - the endgame score is kept on top of a win so that the search still
+                # drives the weak king to the edge and the pawn forward
+                return result * BITBASE_WIN_SCORE + currState.egScore / 100 if result != 0 else STALEMATE_SCORE
+        # material and piece placement, kept up to date by make_move/undo_move, blended between middlegame and
+        # endgame values by game phase and converted from centipawns to pawns
+        phase = min(currState.phase, TOTAL_PHASE)
+        return (currState.mgScore * phase + currState.egScore * (TOTAL_PHASE - phase)) / (TOTAL_PHASE * 100)
 
 
 '''
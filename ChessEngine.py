@@ -1,8 +1,84 @@
-from Constants import DIMS, FOUR_WAY_DIRS, DIAGONAL_DIRS, KNIGHT_DIRS, COLS_TO_FILES, ROWS_TO_RANKS
+import random
+
+from Constants import DIMS, FOUR_WAY_DIRS, DIAGONAL_DIRS, KNIGHT_DIRS, COLS_TO_FILES, ROWS_TO_RANKS, FILES_TO_COLS, \
+    RANKS_TO_ROWS
+from PieceSquareTables import MG_SQUARE_SCORES, EG_SQUARE_SCORES, PHASE_WEIGHTS
+
+# Zobrist keys - one random 64 bit number per (piece, square), castling right, en passant file and side to move
+ZOBRIST_SEED = 0x5EED
+_zobristRandom = random.Random(ZOBRIST_SEED)
+ZOBRIST_PIECES = {piece: [_zobristRandom.getrandbits(64) for _ in range(DIMS * DIMS)]
+                  for piece in ["bp", "wp", "bN", "wN", "bB", "wB", "bR", "wR", "bQ", "wQ", "bK", "wK"]}
+ZOBRIST_PIECES["--"] = [0] * (DIMS * DIMS)  # empty squares never change the key
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for _ in range(4)]  # wks, wqs, bks, bqs
+ZOBRIST_EN_PASSANT = [_zobristRandom.getrandbits(64) for _ in range(DIMS)]
+ZOBRIST_WHITE_TO_MOVE = _zobristRandom.getrandbits(64)
+PROMOTION_PIECES = "QRBN"
+
+# castling rights as a 4 bit int
+CASTLE_WKS, CASTLE_WQS, CASTLE_BKS, CASTLE_BQS = 1, 2, 4, 8
+ALL_CASTLING_RIGHTS = CASTLE_WKS | CASTLE_WQS | CASTLE_BKS | CASTLE_BQS
+# zobrist key of every combination of castling rights
+ZOBRIST_CASTLING_RIGHTS = [0] * (ALL_CASTLING_RIGHTS + 1)
+for _rights in range(ALL_CASTLING_RIGHTS + 1):
+    for _bit in range(4):
+        if _rights >> _bit & 1:
+            ZOBRIST_CASTLING_RIGHTS[_rights] ^= ZOBRIST_CASTLING[_bit]
+# rights kept when a move starts or ends on a square (index row * 8 + col) - a king or rook leaving its starting
+# square, or a rook being captured on it, loses the matching rights
+CASTLE_RIGHTS_MASK = [ALL_CASTLING_RIGHTS] * (DIMS * DIMS)
+CASTLE_RIGHTS_MASK[7 * DIMS + 4] ^= CASTLE_WKS | CASTLE_WQS
+CASTLE_RIGHTS_MASK[7 * DIMS + 7] ^= CASTLE_WKS
+CASTLE_RIGHTS_MASK[7 * DIMS] ^= CASTLE_WQS
+CASTLE_RIGHTS_MASK[4] ^= CASTLE_BKS | CASTLE_BQS
+CASTLE_RIGHTS_MASK[7] ^= CASTLE_BKS
+CASTLE_RIGHTS_MASK[0] ^= CASTLE_BQS
+# the king and rook every castling right needs on their home squares - (row, col, piece)
+CASTLING_HOME_SQUARES = {CASTLE_WKS: [(7, 4, "wK"), (7, 7, "wR")], CASTLE_WQS: [(7, 4, "wK"), (7, 0, "wR")],
+                         CASTLE_BKS: [(0, 4, "bK"), (0, 7, "bR")], CASTLE_BQS: [(0, 4, "bK"), (0, 0, "bR")]}
+
+# undo records - one preallocated list per ply, overwritten in place by make_move and read back by undo_move
+UNDO_CASTLING, UNDO_EN_PASSANT, UNDO_FIFTY_MOVE_COUNT, UNDO_KEY, UNDO_MG_SCORE, UNDO_EG_SCORE, UNDO_PHASE = range(7)
+UNDO_RECORD_SIZE = 7
+UNDO_STACK_SIZE = 256  # plies preallocated - the stack grows past it for longer games
+
+
+def _ray(r, c, dx, dy):
+    squares = []
+    r += dx
+    c += dy
+    while 0 <= r < DIMS and 0 <= c < DIMS:
+        squares.append((r, c))
+        r += dx
+        c += dy
+    return squares
+
+
+def _targets(r, c, offsets):
+    return [(r + dx, c + dy) for dx, dy in offsets if 0 <= r + dx < DIMS and 0 <= c + dy < DIMS]
+
+
+# move tables indexed [row][col], built once - every square they list is on the board, so no bounds checks are needed
+# (direction, squares outwards from the square) per direction - the 4 orthogonal directions, then the 4 diagonal ones
+RAYS = [[[(direction, _ray(r, c, *direction)) for direction in FOUR_WAY_DIRS + DIAGONAL_DIRS] for c in range(DIMS)]
+        for r in range(DIMS)]
+ROOK_RAYS = [[rays[:4] for rays in row] for row in RAYS]
+BISHOP_RAYS = [[rays[4:] for rays in row] for row in RAYS]
+KNIGHT_TARGETS = [[_targets(r, c, KNIGHT_DIRS) for c in range(DIMS)] for r in range(DIMS)]
+KING_TARGETS = [[_targets(r, c, FOUR_WAY_DIRS + DIAGONAL_DIRS) for c in range(DIMS)] for r in range(DIMS)]
+# squares strictly between two squares on a common line, outwards from the first - indexed by row * 8 + col of both,
+# empty if the squares do not share a line
+BETWEEN_SQUARES = [[[] for _ in range(DIMS * DIMS)] for _ in range(DIMS * DIMS)]
+for _r in range(DIMS):
+    for _c in range(DIMS):
+        for _, _raySquares in RAYS[_r][_c]:
+            for _i, (_endRow, _endCol) in enumerate(_raySquares):
+                BETWEEN_SQUARES[_r * DIMS + _c][_endRow * DIMS + _endCol] = _raySquares[:_i]
+UNDER_PROMOTION_PIECES = "RBN"
 
 
 class GameState:
-    def __init__(self):
+    def __init__(self, fen=None):
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
@@ -22,8 +98,6 @@ class GameState:
             'K': self.get_king_moves
         }
         self.fiftyMoveCount = 0
-        self.fiftyMoveCountLog = [self.fiftyMoveCount]
-        self.stateRepetitionCounts = {}
         self.whiteToMove = True
         self.moveLog = []
         self.whiteKingLoc = (7, 4)
@@ -36,12 +110,110 @@ class GameState:
         self.pins = []
         self.checks = []
         self.enPassantPossible = ()
-        self.enPassantPossibleLog = [self.enPassantPossible]
-        self.castlingRights = CastleRights(True, True, True, True)
-        self.castlingRightsLog = [CastleRights(True, True, True, True)]
+        self.castlingRights = ALL_CASTLING_RIGHTS  # CASTLE_* bits
+        self.zobristKey = self.compute_zobrist_key()
+        # incrementally updated evaluation - middlegame and endgame score (centipawns, + good for white) and phase
+        self.mgScore, self.egScore, self.phase = self.compute_evaluation()
+        # state make_move can not recompute on undo - the record of ply i holds it as it was before moveLog[i]
+        self.undoStack = [[None] * UNDO_RECORD_SIZE for _ in range(UNDO_STACK_SIZE)]
+        self.pieceCount = self.count_pieces()  # pieces on the board, kings included
+        self.startPly = 0  # half moves played before the game's first position (see the FEN full move number)
+        if fen is not None:
+            self.load_fen(fen)
+
+    # set up the position described by a FEN string, e.g. "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    def load_fen(self, fen):
+        fields = fen.split()
+        self.board = []
+        for rowString in fields[0].split("/"):
+            row = []
+            for char in rowString:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                else:
+                    row.append(('w' if char.isupper() else 'b') + (char.upper() if char.lower() != 'p' else 'p'))
+            self.board.append(row)
+        for r in range(DIMS):
+            for c in range(DIMS):
+                if self.board[r][c] == "wK":
+                    self.whiteKingLoc = (r, c)
+                elif self.board[r][c] == "bK":
+                    self.blackKingLoc = (r, c)
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else "-"
+        self.castlingRights = (CASTLE_WKS if 'K' in castling else 0) | (CASTLE_WQS if 'Q' in castling else 0) | \
+                              (CASTLE_BKS if 'k' in castling else 0) | (CASTLE_BQS if 'q' in castling else 0)
+        # a right whose king or rook is not on its home square is void, whatever the FEN says
+        for right, homeSquares in CASTLING_HOME_SQUARES.items():
+            if any(self.board[r][c] != piece for r, c, piece in homeSquares):
+                self.castlingRights &= ~right
+        self.enPassantPossible = ()
+        if len(fields) > 3 and fields[3] != "-":
+            row, col = RANKS_TO_ROWS[fields[3][1]], FILES_TO_COLS[fields[3][0]]
+            # only the square a pawn of the side that just moved skipped with a double push
+            direction = 1 if self.whiteToMove else -1
+            if row == (2 if self.whiteToMove else DIMS - 3) and self.board[row][col] == "--" and \
+                    self.board[row - direction][col] == "--" and \
+                    self.board[row + direction][col] == ('bp' if self.whiteToMove else 'wp'):
+                self.enPassantPossible = (row, col)
+        self.fiftyMoveCount = int(fields[4]) if len(fields) > 4 else 0
+        self.fiftyMovesDone = self.fiftyMoveCount >= 100
+        self.moveLog = []
+        self.inCheck = self.checkmate = self.stalemate = self.repetition = False
+        self.pins = []
+        self.checks = []
+        self.zobristKey = self.compute_zobrist_key()
+        self.mgScore, self.egScore, self.phase = self.compute_evaluation()
+        self.pieceCount = self.count_pieces()
+        fullMoveNumber = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        self.startPly = 2 * (max(fullMoveNumber, 1) - 1) + (0 if self.whiteToMove else 1)
+
+    # FEN string of the current position - the inverse of load_fen
+    def get_fen(self):
+        rowStrings = []
+        for row in self.board:
+            rowString = ""
+            emptySquares = 0
+            for piece in row:
+                if piece == "--":
+                    emptySquares += 1
+                    continue
+                if emptySquares != 0:
+                    rowString += str(emptySquares)
+                    emptySquares = 0
+                rowString += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            if emptySquares != 0:
+                rowString += str(emptySquares)
+            rowStrings.append(rowString)
+        castling = "".join(char for char, right in zip("KQkq", (CASTLE_WKS, CASTLE_WQS, CASTLE_BKS, CASTLE_BQS))
+                           if self.castlingRights & right)
+        if self.enPassantPossible != ():
+            enPassant = COLS_TO_FILES[self.enPassantPossible[1]] + ROWS_TO_RANKS[self.enPassantPossible[0]]
+        else:
+            enPassant = "-"
+        fullMoveNumber = (self.startPly + len(self.moveLog)) // 2 + 1
+        return " ".join(["/".join(rowStrings), 'w' if self.whiteToMove else 'b', castling or "-", enPassant,
+                         str(self.fiftyMoveCount), str(fullMoveNumber)])
 
     # function to execute a Move (doesn't work for castling, en passant, and pawn promotion)
     def make_move(self, move):
+        startIndex = move.startRow * DIMS + move.startCol
+        endIndex = move.endRow * DIMS + move.endCol
+        ply = len(self.moveLog)
+        if ply == len(self.undoStack):
+            self.undoStack.append([None] * UNDO_RECORD_SIZE)
+        record = self.undoStack[ply]
+        record[UNDO_CASTLING] = self.castlingRights
+        record[UNDO_EN_PASSANT] = self.enPassantPossible
+        record[UNDO_FIFTY_MOVE_COUNT] = self.fiftyMoveCount
+        record[UNDO_KEY] = self.zobristKey
+        record[UNDO_MG_SCORE] = self.mgScore
+        record[UNDO_EG_SCORE] = self.egScore
+        record[UNDO_PHASE] = self.phase
+        key = self.zobristKey ^ ZOBRIST_WHITE_TO_MOVE ^ ZOBRIST_CASTLING_RIGHTS[self.castlingRights]
+        key ^= ZOBRIST_PIECES[move.pieceMoved][startIndex]
+        mgScore = self.mgScore - MG_SQUARE_SCORES[move.pieceMoved][startIndex]
+        egScore = self.egScore - EG_SQUARE_SCORES[move.pieceMoved][startIndex]
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.moveLog.append(move)
@@ -53,35 +225,53 @@ class GameState:
             self.blackKingLoc = (move.endRow, move.endCol)
         # pawn promotion
         if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotionPiece
+            self.phase += PHASE_WEIGHTS[move.promotionPiece]
+        endPiece = self.board[move.endRow][move.endCol]
+        key ^= ZOBRIST_PIECES[endPiece][endIndex]
+        mgScore += MG_SQUARE_SCORES[endPiece][endIndex]
+        egScore += EG_SQUARE_SCORES[endPiece][endIndex]
         # en passant
         if move.isEnPassant:
             self.board[move.startRow][move.endCol] = "--"  # capture the opposition pawn located at (startRow, endCol)
+            captureIndex = move.startRow * DIMS + move.endCol
+        else:
+            captureIndex = endIndex
+        if move.pieceCaptured != "--":
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][captureIndex]
+            mgScore -= MG_SQUARE_SCORES[move.pieceCaptured][captureIndex]
+            egScore -= EG_SQUARE_SCORES[move.pieceCaptured][captureIndex]
+            self.phase -= PHASE_WEIGHTS[move.pieceCaptured[1]]
+            self.pieceCount -= 1
         # castle
         if move.isCastleMove:
             if move.endCol - move.startCol == 2:  # king side castle
                 # move the rook - which is in col endCol + 1
                 self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1]
                 self.board[move.endRow][move.endCol + 1] = "--"
+                rook = self.board[move.endRow][move.endCol - 1]
+                key ^= ZOBRIST_PIECES[rook][endIndex + 1] ^ ZOBRIST_PIECES[rook][endIndex - 1]
+                mgScore += MG_SQUARE_SCORES[rook][endIndex - 1] - MG_SQUARE_SCORES[rook][endIndex + 1]
+                egScore += EG_SQUARE_SCORES[rook][endIndex - 1] - EG_SQUARE_SCORES[rook][endIndex + 1]
             elif move.startCol - move.endCol == 2:  # queen side castle
                 # move the rook - which is in col endCol - 2
                 self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]
                 self.board[move.endRow][move.endCol - 2] = "--"
+                rook = self.board[move.endRow][move.endCol + 1]
+                key ^= ZOBRIST_PIECES[rook][endIndex - 2] ^ ZOBRIST_PIECES[rook][endIndex + 1]
+                mgScore += MG_SQUARE_SCORES[rook][endIndex + 1] - MG_SQUARE_SCORES[rook][endIndex - 2]
+                egScore += EG_SQUARE_SCORES[rook][endIndex + 1] - EG_SQUARE_SCORES[rook][endIndex - 2]
+        self.mgScore = mgScore
+        self.egScore = egScore
 
         # update enPassantPossible
+        if self.enPassantPossible != ():
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
         if move.pieceMoved[1] == 'p' and abs(move.endRow - move.startRow) == 2:
             self.enPassantPossible = ((move.startRow + move.endRow) // 2, move.endCol)
+            key ^= ZOBRIST_EN_PASSANT[move.endCol]
         else:
             self.enPassantPossible = ()
-        self.enPassantPossibleLog.append(self.enPassantPossible)
-        # update repetition count
-        boardString = str(self)
-        if boardString in self.stateRepetitionCounts.keys():
-            self.stateRepetitionCounts[boardString] += 1
-        else:
-            self.stateRepetitionCounts[boardString] = 1
-        if self.stateRepetitionCounts[boardString] == 3:
-            self.repetition = True
         # update fiftyMove count
         if move.pieceMoved[1] != 'p' and move.pieceCaptured == "--":
             self.fiftyMoveCount += 1
@@ -90,18 +280,25 @@ class GameState:
         else:
             self.fiftyMoveCount = 0
             self.fiftyMovesDone = False
-        self.fiftyMoveCountLog.append(self.fiftyMoveCount)
         # update castling rights
-        self.update_castle_rights(move)
+        self.castlingRights &= CASTLE_RIGHTS_MASK[startIndex] & CASTLE_RIGHTS_MASK[endIndex]
+        # update zobrist key and repetition
+        self.zobristKey = key ^ ZOBRIST_CASTLING_RIGHTS[self.castlingRights]
+        if self.get_repetition_count() >= 3:
+            self.repetition = True
 
     # function to undo the last move
     def undo_move(self):
         if len(self.moveLog) != 0:
-            # update repetition count
-            self.stateRepetitionCounts[str(self)] -= 1
+            # restore castling rights, en passant square, fiftyMove count, zobrist key and evaluation
+            move = self.moveLog.pop()
+            self.castlingRights, self.enPassantPossible, self.fiftyMoveCount, self.zobristKey, self.mgScore, \
+                self.egScore, self.phase = self.undoStack[len(self.moveLog)]
             self.repetition = False
+            self.fiftyMovesDone = False
             # update board state
-            move = self.moveLog.pop()
+            if move.pieceCaptured != "--":
+                self.pieceCount += 1
             self.whiteToMove = not self.whiteToMove
             self.board[move.startRow][move.startCol] = move.pieceMoved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
@@ -114,9 +311,6 @@ class GameState:
             if move.isEnPassant:
                 self.board[move.endRow][move.endCol] = "--"
                 self.board[move.startRow][move.endCol] = move.pieceCaptured
-            self.enPassantPossibleLog.pop()
-            self.enPassantPossible = self.enPassantPossibleLog[-1]
-
             # undo castle
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:  # king side castle
@@ -127,64 +321,55 @@ class GameState:
                     # move the rook - which is in col endCol - 2
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
                     self.board[move.endRow][move.endCol + 1] = "--"
-            # update castling rights
-            self.undo_update_castle_rights()
-
-            # update fiftyMove count
-            self.fiftyMoveCountLog.pop()
-            self.fiftyMoveCount = self.fiftyMoveCountLog[-1]
-            self.fiftyMovesDone = False
 
             # undo checkmate or stalemate flags
             self.checkmate = False
             self.stalemate = False
 
-    def update_castle_rights(self, move):
-        # update - when it is a king or a rook move
-        if move.pieceMoved == 'wK':
-            self.castlingRights.wks = False
-            self.castlingRights.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.castlingRights.bks = False
-            self.castlingRights.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:  # left rook
-                    self.castlingRights.wqs = False
-                elif move.startCol == 7:  # right rook
-                    self.castlingRights.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:  # left rook
-                    self.castlingRights.bqs = False
-                elif move.startCol == 7:  # right rook
-                    self.castlingRights.bks = False
-        # update - when a rook is captured
-        if move.pieceCaptured == "wR":
-            if move.endRow == 7:
-                if move.endCol == 0:  # left rook
-                    self.castlingRights.wqs = False
-                elif move.endCol == 7:  # right rook
-                    self.castlingRights.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:  # left rook
-                    self.castlingRights.bqs = False
-                elif move.endCol == 7:  # right rook
-                    self.castlingRights.bks = False
-
-        self.castlingRightsLog.append(CastleRights(self.castlingRights.wks, self.castlingRights.bks,
-                                                   self.castlingRights.wqs, self.castlingRights.bqs))
-
-    def undo_update_castle_rights(self):
-        self.castlingRightsLog.pop()
-        self.castlingRights = self.castlingRightsLog[-1]
+    # hash the whole position from scratch - make_move/undo_move keep zobristKey up to date incrementally
+    def compute_zobrist_key(self):
+        key = 0
+        for r in range(DIMS):
+            for c in range(DIMS):
+                key ^= ZOBRIST_PIECES[self.board[r][c]][r * DIMS + c]
+        key ^= ZOBRIST_CASTLING_RIGHTS[self.castlingRights]
+        if self.enPassantPossible != ():
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        if self.whiteToMove:
+            key ^= ZOBRIST_WHITE_TO_MOVE
+        return key
+
+    # evaluation of the whole position from scratch - make_move/undo_move keep it up to date incrementally
+    def compute_evaluation(self):
+        mgScore = egScore = phase = 0
+        for r in range(DIMS):
+            for c in range(DIMS):
+                piece = self.board[r][c]
+                if piece != "--":
+                    mgScore += MG_SQUARE_SCORES[piece][r * DIMS + c]
+                    egScore += EG_SQUARE_SCORES[piece][r * DIMS + c]
+                    phase += PHASE_WEIGHTS[piece[1]]
+        return mgScore, egScore, phase
+
+    # pieces on the board, kings included - kept up to date in pieceCount by make_move/undo_move
+    def count_pieces(self):
+        return sum(1 for row in self.board for piece in row if piece != "--")
+
+    # number of times the current position has occurred - only positions since the last
+    # capture or pawn move (tracked by fiftyMoveCount) with the same side to move can repeat it
+    def get_repetition_count(self):
+        count = 1
+        lastIndex = len(self.moveLog)
+        firstIndex = max(lastIndex - self.fiftyMoveCount, 0)
+        undoStack = self.undoStack
+        for i in range(lastIndex - 4, firstIndex - 1, -2):
+            if undoStack[i][UNDO_KEY] == self.zobristKey:
+                count += 1
+        return count
 
     def get_all_valid_moves(self):
-        # init temp vars to make sure we do not modify enPassantPossible or castleRights unknowingly
+        # init temp var to make sure we do not modify enPassantPossible unknowingly
         tempEnPassantPossible = self.enPassantPossible
-        tempCastleRights = CastleRights(self.castlingRights.wks, self.castlingRights.bks, self.castlingRights.wqs,
-                                        self.castlingRights.bqs)
         moves = []
         self.inCheck, self.pins, self.checks = self.get_pins_and_checks()
         if self.whiteToMove:
@@ -194,37 +379,7 @@ class GameState:
             kingRow = self.blackKingLoc[0]
             kingCol = self.blackKingLoc[1]
         if self.inCheck:
-            if len(self.checks) == 1:  # single check
-                moves = self.get_all_possible_moves()
-                # to block this check, do - 1. capture the piece checking, 2. block the check, 3. move the king
-                check = self.checks[0]
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []
-                if pieceChecking == 'N':  # if knight is checking
-                    # it must be captured
-                    validSquares = (checkRow, checkCol)
-                else:
-                    dx = check[2]
-                    dy = check[3]
-                    r = kingRow + dx
-                    c = kingCol + dy
-                    while GameState.check_bounds(r, c):
-                        validSquares.append((r, c))
-                        if r == checkRow and c == checkCol:
-                            break
-                        r += dx
-                        c += dy
-                # get rid of extra moves
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved[1] != 'K':  # block or capture move
-                        # if move doesn't block or capture piece
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            moves.remove(moves[i])
-            else:  # >=2 checks - king has to move
-                self.get_king_moves(kingRow, kingCol, moves)
-
+            moves = self.get_evasion_moves()
         else:  # not in check
             moves = self.get_all_possible_moves()
             if self.whiteToMove:
@@ -233,7 +388,7 @@ class GameState:
                 self.get_castle_moves(self.blackKingLoc[0], self.blackKingLoc[1], moves)
 
         if len(moves) == 0:
-            if self.in_check():
+            if self.inCheck:
                 self.checkmate = True
             else:
                 self.stalemate = True
@@ -242,7 +397,16 @@ class GameState:
             self.stalemate = False
 
         self.enPassantPossible = tempEnPassantPossible
-        self.castlingRights = tempCastleRights
+        return moves
+
+    # all legal moves out of check - inCheck, pins and checks must be set for this position
+    def get_evasion_moves(self):
+        moves = []
+        kingRow, kingCol = self.whiteKingLoc if self.whiteToMove else self.blackKingLoc
+        if len(self.checks) == 1:  # single check
+            self.get_check_evasions(kingRow, kingCol, moves)
+        else:  # >=2 checks - king has to move
+            self.get_king_moves(kingRow, kingCol, moves)
         return moves
 
     def get_all_possible_moves(self):
@@ -255,6 +419,205 @@ class GameState:
                     self.moveFunctions[piece](r, c, moves)
         return moves
 
+    '''
+        Staged move picker for the search - yields the hash move (if it is legal here), then captures and
+        promotions, then the quiet moves. A stage is only generated once the previous one is used up, so a node
+        that cuts off on the hash move or a capture never generates its quiet moves. Pins and checks are found
+        once, before the captures, and reused for the quiet moves. In check all evasions are generated at once.
+        moveKey, if given, orders the moves within each stage (highest first).
+        When the position has no legal moves the checkmate/stalemate flags are set as by get_all_valid_moves.
+    '''
+
+    def get_staged_moves(self, hashMove=None, moveKey=None):
+        legalHashMove = self.find_legal_move(hashMove) if hashMove is not None else None
+        if legalHashMove is not None:
+            yield legalHashMove
+        inCheck, pins, checks = self.get_pins_and_checks()
+        self.inCheck, self.pins, self.checks = inCheck, list(pins), checks
+        if inCheck:  # evasions are few - generate them all and split them into the stages
+            evasions = self.get_evasion_moves()
+            captures = [move for move in evasions if move.pieceCaptured != "--" or move.isPawnPromotion]
+        else:
+            pinDirections = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in pins}
+            captures = self.get_captures_not_in_check(pinDirections)
+        if moveKey is not None:
+            captures.sort(key=moveKey, reverse=True)
+        for move in captures:
+            if move != legalHashMove:
+                yield move
+        # searching the captures changed inCheck, pins and checks - back to this position's
+        self.inCheck, self.pins, self.checks = inCheck, list(pins), checks
+        if inCheck:
+            quietMoves = [move for move in evasions if move.pieceCaptured == "--" and not move.isPawnPromotion]
+        else:
+            quietMoves = self.get_quiet_moves_not_in_check(pinDirections)
+        hasMoves = legalHashMove is not None or len(captures) != 0 or len(quietMoves) != 0
+        self.checkmate = not hasMoves and inCheck
+        self.stalemate = not hasMoves and not inCheck
+        if legalHashMove is not None and legalHashMove in quietMoves:
+            quietMoves.remove(legalHashMove)
+        if moveKey is not None:
+            quietMoves.sort(key=moveKey, reverse=True)
+        for move in quietMoves:
+            yield move
+
+    # the legal move of this position matching move (e.g. a move from the transposition table), or None
+    def find_legal_move(self, move):
+        piece = self.board[move.startRow][move.startCol]
+        if piece == "--" or (piece[0] == 'w') != self.whiteToMove:
+            return None
+        self.inCheck, self.pins, self.checks = self.get_pins_and_checks()
+        if self.inCheck:
+            candidates = self.get_all_valid_moves()
+        else:  # only the moves of the piece on the start square have to be generated
+            candidates = []
+            self.moveFunctions[piece[1]](move.startRow, move.startCol, candidates)
+            if piece[1] == 'K':
+                self.get_castle_moves(move.startRow, move.startCol, candidates)
+        for candidate in candidates:
+            if candidate == move:
+                return candidate
+        return None
+
+    '''
+        Legal captures and promotions only - every piece looks along its moves for an enemy piece, without
+        creating moves for the empty squares on the way. Sets inCheck, pins and checks like get_all_valid_moves.
+    '''
+
+    def get_capture_moves(self):
+        self.inCheck, self.pins, self.checks = self.get_pins_and_checks()
+        if self.inCheck:  # evasions are few - generate them all and keep the captures
+            return [move for move in self.get_all_valid_moves() if move.pieceCaptured != "--" or move.isPawnPromotion]
+        return self.get_captures_not_in_check({(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins})
+
+    # pinDirections - (row, col) of every pinned piece -> direction of its pin line
+    def get_captures_not_in_check(self, pinDirections):
+        board = self.board
+        if self.whiteToMove:
+            ally, opposition, moveAmount, promotionRow = 'w', 'b', -1, 1
+        else:
+            ally, opposition, moveAmount, promotionRow = 'b', 'w', 1, DIMS - 2
+        moves = []
+        for r in range(DIMS):
+            for c in range(DIMS):
+                piece = board[r][c]
+                if piece[0] != ally:
+                    continue
+                pieceType = piece[1]
+                pinDirection = pinDirections.get((r, c))
+                if pieceType == 'p':
+                    newRow = r + moveAmount
+                    for dy in (-1, 1):
+                        newCol = c + dy
+                        if 0 <= newCol < DIMS and board[newRow][newCol][0] == opposition and \
+                                (pinDirection is None or self.along_pin(r, c, newRow, newCol, pinDirection)):
+                            self.add_pawn_move((r, c), (newRow, newCol), moves)
+                    if r == promotionRow and board[newRow][c] == "--" and (pinDirection is None or pinDirection[1] == 0):
+                        self.add_pawn_move((r, c), (newRow, c), moves)
+                elif pieceType == 'N':
+                    if pinDirection is None:  # a pinned knight can never move
+                        for newRow, newCol in KNIGHT_TARGETS[r][c]:
+                            if board[newRow][newCol][0] == opposition:
+                                moves.append(Move((r, c), (newRow, newCol), board))
+                elif pieceType == 'K':
+                    for newRow, newCol in KING_TARGETS[r][c]:
+                        # not in check, so the king's own square hides no slider attack on the squares around it
+                        if board[newRow][newCol][0] == opposition and \
+                                not self.is_square_attacked(newRow, newCol, opposition == 'w'):
+                            moves.append(Move((r, c), (newRow, newCol), board))
+                else:
+                    if pieceType == 'R':
+                        rays = ROOK_RAYS[r][c]
+                    elif pieceType == 'B':
+                        rays = BISHOP_RAYS[r][c]
+                    else:
+                        rays = RAYS[r][c]
+                    for direction, ray in rays:
+                        if pinDirection is not None and direction != pinDirection and \
+                                direction != (-pinDirection[0], -pinDirection[1]):
+                            continue
+                        for newRow, newCol in ray:
+                            endPiece = board[newRow][newCol]
+                            if endPiece != "--":
+                                if endPiece[0] == opposition:
+                                    moves.append(Move((r, c), (newRow, newCol), board))
+                                break
+        # en passant - get_pawn_moves checks the rank pin it can expose
+        if self.enPassantPossible != ():
+            enPassantRow, enPassantCol = self.enPassantPossible
+            pawnRow = enPassantRow - moveAmount
+            for pawnCol in (enPassantCol - 1, enPassantCol + 1):
+                if 0 <= pawnCol < DIMS and board[pawnRow][pawnCol] == ally + 'p':
+                    pawnMoves = []
+                    self.get_pawn_moves(pawnRow, pawnCol, pawnMoves)
+                    moves.extend(move for move in pawnMoves if move.isEnPassant)
+        return moves
+
+    '''
+        Legal moves that neither capture nor promote, castling included, when not in check - the counterpart of
+        get_captures_not_in_check. inCheck must be set for this position (castling looks at it).
+    '''
+
+    def get_quiet_moves_not_in_check(self, pinDirections):
+        board = self.board
+        if self.whiteToMove:
+            ally, opposition, moveAmount, startRow, promotionRow = 'w', 'b', -1, DIMS - 2, 1
+            kingRow, kingCol = self.whiteKingLoc
+        else:
+            ally, opposition, moveAmount, startRow, promotionRow = 'b', 'w', 1, 1, DIMS - 2
+            kingRow, kingCol = self.blackKingLoc
+        moves = []
+        for r in range(DIMS):
+            for c in range(DIMS):
+                piece = board[r][c]
+                if piece[0] != ally:
+                    continue
+                pieceType = piece[1]
+                pinDirection = pinDirections.get((r, c))
+                if pieceType == 'p':
+                    # pushes onto the last rank are promotions, generated with the captures
+                    if r != promotionRow and board[r + moveAmount][c] == "--" and \
+                            (pinDirection is None or pinDirection[1] == 0):
+                        moves.append(Move((r, c), (r + moveAmount, c), board))
+                        if r == startRow and board[r + 2 * moveAmount][c] == "--":
+                            moves.append(Move((r, c), (r + 2 * moveAmount, c), board))
+                elif pieceType == 'N':
+                    if pinDirection is None:  # a pinned knight can never move
+                        for newRow, newCol in KNIGHT_TARGETS[r][c]:
+                            if board[newRow][newCol] == "--":
+                                moves.append(Move((r, c), (newRow, newCol), board))
+                elif pieceType == 'K':
+                    for newRow, newCol in KING_TARGETS[r][c]:
+                        # not in check, so the king's own square hides no slider attack on the squares around it
+                        if board[newRow][newCol] == "--" and \
+                                not self.is_square_attacked(newRow, newCol, opposition == 'w'):
+                            moves.append(Move((r, c), (newRow, newCol), board))
+                else:
+                    if pieceType == 'R':
+                        rays = ROOK_RAYS[r][c]
+                    elif pieceType == 'B':
+                        rays = BISHOP_RAYS[r][c]
+                    else:
+                        rays = RAYS[r][c]
+                    for direction, ray in rays:
+                        if pinDirection is not None and direction != pinDirection and \
+                                direction != (-pinDirection[0], -pinDirection[1]):
+                            continue
+                        for newRow, newCol in ray:
+                            if board[newRow][newCol] != "--":
+                                break
+                            moves.append(Move((r, c), (newRow, newCol), board))
+        self.get_castle_moves(kingRow, kingCol, moves)
+        return moves
+
+    # does moving a pinned piece from (r, c) to (endRow, endCol) keep it on its pin line
+    @staticmethod
+    def along_pin(r, c, endRow, endCol, pinDirection):
+        dx, dy = pinDirection
+        rowStep = (endRow > r) - (endRow < r)
+        colStep = (endCol > c) - (endCol < c)
+        return (rowStep, colStep) == (dx, dy) or (rowStep, colStep) == (-dx, -dy)
+
     def in_check(self):
         if self.whiteToMove:
             return self.square_under_attack(self.whiteKingLoc[0], self.whiteKingLoc[1])
@@ -262,13 +625,101 @@ class GameState:
             return self.square_under_attack(self.blackKingLoc[0], self.blackKingLoc[1])
 
     def square_under_attack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        opponentsMoves = self.get_all_possible_moves()
-        self.whiteToMove = not self.whiteToMove
-        for move in opponentsMoves:
-            if move.endRow == r and move.endCol == c:  # square is under attack
-                return True
-        return False
+        return self.is_square_attacked(r, c, not self.whiteToMove)
+
+    # is square (r, c) attacked by white (byWhite) or black - looks outwards from the square for attackers
+    def is_square_attacked(self, r, c, byWhite):
+        return len(self.get_attackers(r, c, byWhite, True)) != 0
+
+    # squares of all pieces of one side attacking square (r, c), or just the first one found if firstOnly is set
+    def get_attackers(self, r, c, byWhite, firstOnly=False):
+        attackers = []
+        board = self.board
+        attacker = 'w' if byWhite else 'b'
+        # pawns - a white pawn attacks the squares diagonally above it, a black pawn the ones below it
+        pawnRow = r + 1 if byWhite else r - 1
+        if 0 <= pawnRow < DIMS:
+            for pawnCol in (c - 1, c + 1):
+                if 0 <= pawnCol < DIMS and board[pawnRow][pawnCol] == attacker + 'p':
+                    attackers.append((pawnRow, pawnCol))
+                    if firstOnly:
+                        return attackers
+        # knights and king
+        knight = attacker + 'N'
+        for newRow, newCol in KNIGHT_TARGETS[r][c]:
+            if board[newRow][newCol] == knight:
+                attackers.append((newRow, newCol))
+                if firstOnly:
+                    return attackers
+        king = attacker + 'K'
+        for newRow, newCol in KING_TARGETS[r][c]:
+            if board[newRow][newCol] == king:
+                attackers.append((newRow, newCol))
+                if firstOnly:
+                    return attackers
+        # sliding pieces - the first piece along each ray
+        for rays, slider in ((ROOK_RAYS[r][c], 'R'), (BISHOP_RAYS[r][c], 'B')):
+            for _, ray in rays:
+                for newRow, newCol in ray:
+                    piece = board[newRow][newCol]
+                    if piece != "--":
+                        if piece[0] == attacker and (piece[1] == slider or piece[1] == 'Q'):
+                            attackers.append((newRow, newCol))
+                            if firstOnly:
+                                return attackers
+                        break
+        return attackers
+
+    '''
+        Moves out of a single check - capture the checking piece, block the check or move the king.
+        Only pieces that can reach the checking piece or a square between it and the king are looked at.
+    '''
+
+    def get_check_evasions(self, kingRow, kingCol, moves):
+        board = self.board
+        checkRow, checkCol, dx, dy = self.checks[0]
+        pieceChecking = board[checkRow][checkCol]
+        # a pinned piece can never resolve a check - it would have to leave its pin line
+        pinnedSquares = set((pin[0], pin[1]) for pin in self.pins)
+        # squares that capture the checking piece or block the check (a knight can only be captured)
+        targetSquares = [(checkRow, checkCol)]
+        if pieceChecking[1] != 'N':
+            targetSquares += BETWEEN_SQUARES[kingRow * DIMS + kingCol][checkRow * DIMS + checkCol]
+        moveAmount = -1 if self.whiteToMove else 1
+        startRow = 6 if self.whiteToMove else 1
+        allyPawn = ('w' if self.whiteToMove else 'b') + 'p'
+        for r, c in targetSquares:
+            for attackerRow, attackerCol in self.get_attackers(r, c, self.whiteToMove):
+                piece = board[attackerRow][attackerCol]
+                if (attackerRow, attackerCol) in pinnedSquares or piece[1] == 'K':
+                    continue
+                if piece[1] == 'p':
+                    if (r, c) == (checkRow, checkCol):  # pawns only capture diagonally
+                        self.add_pawn_move((attackerRow, attackerCol), (r, c), moves)
+                else:
+                    moves.append(Move((attackerRow, attackerCol), (r, c), board))
+            # pawn pushes onto a blocking square
+            if (r, c) != (checkRow, checkCol):
+                pawnRow = r - moveAmount
+                if 0 <= pawnRow < DIMS and board[pawnRow][c] == allyPawn:
+                    if (pawnRow, c) not in pinnedSquares:
+                        self.add_pawn_move((pawnRow, c), (r, c), moves)
+                elif pawnRow - moveAmount == startRow and board[pawnRow][c] == "--" and \
+                        board[startRow][c] == allyPawn and (startRow, c) not in pinnedSquares:
+                    moves.append(Move((startRow, c), (r, c), board))
+        # en passant - capturing the checking pawn, or landing on a blocking square
+        if self.enPassantPossible != ():
+            enPassantRow, enPassantCol = self.enPassantPossible
+            capturesChecker = (enPassantRow - moveAmount, enPassantCol) == (checkRow, checkCol)
+            if capturesChecker or self.enPassantPossible in targetSquares:
+                for pawnCol in (enPassantCol - 1, enPassantCol + 1):
+                    pawnRow = enPassantRow - moveAmount
+                    if 0 <= pawnCol < DIMS and board[pawnRow][pawnCol] == allyPawn and \
+                            (pawnRow, pawnCol) not in pinnedSquares:
+                        pawnMoves = []
+                        self.get_pawn_moves(pawnRow, pawnCol, pawnMoves)  # checks the rank pin en passant can expose
+                        moves.extend(move for move in pawnMoves if move.isEnPassant)
+        self.get_king_moves(kingRow, kingCol, moves)
 
     def get_pawn_moves(self, r, c, moves):
         piece_pinned = False
@@ -293,8 +744,8 @@ class GameState:
 
         # 1 square pawn advance
         if self.board[r + moveAmount][c] == "--":
-            if not piece_pinned or pin_direction == (moveAmount, 0):
-                moves.append(Move((r, c), (r + moveAmount, c), self.board))
+            if not piece_pinned or pin_direction == (moveAmount, 0) or pin_direction == (-moveAmount, 0):
+                self.add_pawn_move((r, c), (r + moveAmount, c), moves)
                 # 2 square pawn advance
                 if r == startRow and self.board[r + 2 * moveAmount][c] == "--":
                     moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
@@ -302,7 +753,7 @@ class GameState:
         if c - 1 >= 0:
             if not piece_pinned or pin_direction == (moveAmount, -1):
                 if self.board[r + moveAmount][c - 1][0] == enemyColor:
-                    moves.append(Move((r, c), (r + moveAmount, c - 1), self.board))
+                    self.add_pawn_move((r, c), (r + moveAmount, c - 1), moves)
                 elif (r + moveAmount, c - 1) == self.enPassantPossible:
                     attackingPiece = blockingPiece = False
                     if kingRow == r:
@@ -318,19 +769,21 @@ class GameState:
                         for i in insideRange:  # check for blocking piece
                             if self.board[r][i] != "--":  # some other piece beside en-passant pawn blocks
                                 blockingPiece = True
-                        for i in outsideRange:  # check for attacking piece
+                        for i in outsideRange:  # check for attacking piece - only the first piece found matters
                             square = self.board[r][i]
                             if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'):  # enemy rook or queen is attacking
                                 attackingPiece = True
+                                break
                             elif square != "--":
                                 blockingPiece = True
+                                break
                     if not attackingPiece or blockingPiece:
                         moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, isEnPassant=True))
         # right capture
         if c + 1 < DIMS:
             if not piece_pinned or pin_direction == (moveAmount, 1):
                 if self.board[r + moveAmount][c + 1][0] == enemyColor:
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board))
+                    self.add_pawn_move((r, c), (r + moveAmount, c + 1), moves)
                 elif (r + moveAmount, c + 1) == self.enPassantPossible:
                     attackingPiece = blockingPiece = False
                     if kingRow == r:
@@ -346,15 +799,24 @@ class GameState:
                         for i in insideRange:  # check for blocking piece
                             if self.board[r][i] != "--":  # some other piece beside en-passant pawn blocks
                                 blockingPiece = True
-                        for i in outsideRange:  # check for attacking piece
+                        for i in outsideRange:  # check for attacking piece - only the first piece found matters
                             square = self.board[r][i]
                             if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'):  # enemy rook or queen is attacking
                                 attackingPiece = True
+                                break
                             elif square != "--":
                                 blockingPiece = True
+                                break
                     if not attackingPiece or blockingPiece:
                         moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, isEnPassant=True))
 
+    def add_pawn_move(self, startSquare, endSquare, moves):
+        move = Move(startSquare, endSquare, self.board)
+        moves.append(move)
+        if move.isPawnPromotion:
+            for promotionPiece in UNDER_PROMOTION_PIECES:
+                moves.append(Move(startSquare, endSquare, self.board, promotionPiece=promotionPiece))
+
     def get_rook_moves(self, r, c, moves):
         piece_pinned = False
         pin_direction = ()
@@ -367,22 +829,7 @@ class GameState:
                     self.pins.remove(self.pins[i])
                 break
 
-        opposition = 'b' if self.whiteToMove else 'w'
-        for dx, dy in FOUR_WAY_DIRS:
-            newRow = r + dx
-            newCol = c + dy
-
-            # move without capture
-            while GameState.check_bounds(newRow, newCol) and self.board[newRow][newCol] == "--":
-                if not piece_pinned or pin_direction == (dx, dy) or pin_direction == (-dx, -dy):
-                    moves.append(Move((r, c), (newRow, newCol), self.board))
-                    newRow = newRow + dx
-                    newCol = newCol + dy
-
-            # move with capture
-            if GameState.check_bounds(newRow, newCol) and self.board[newRow][newCol][0] == opposition:
-                if not piece_pinned or pin_direction == (dx, dy) or pin_direction == (-dx, -dy):
-                    moves.append(Move((r, c), (newRow, newCol), self.board))
+        self.get_ray_moves(r, c, ROOK_RAYS[r][c], pin_direction if piece_pinned else None, moves)
 
     def get_knight_moves(self, r, c, moves):
         piece_pinned = False
@@ -392,15 +839,13 @@ class GameState:
                 self.pins.remove(self.pins[i])
                 break
 
+        if piece_pinned:
+            return  # a pinned knight can never move
         ally = 'w' if self.whiteToMove else 'b'
-        for dx, dy in KNIGHT_DIRS:
-            newRow = r + dx
-            newCol = c + dy
-
+        for newRow, newCol in KNIGHT_TARGETS[r][c]:
             # move to empty square or with capture
-            if GameState.check_bounds(newRow, newCol) and self.board[newRow][newCol][0] != ally:
-                if not piece_pinned:
-                    moves.append(Move((r, c), (newRow, newCol), self.board))
+            if self.board[newRow][newCol][0] != ally:
+                moves.append(Move((r, c), (newRow, newCol), self.board))
 
     def get_bishop_moves(self, r, c, moves):
         piece_pinned = False
@@ -412,55 +857,47 @@ class GameState:
                 self.pins.remove(self.pins[i])
                 break
 
+        self.get_ray_moves(r, c, BISHOP_RAYS[r][c], pin_direction if piece_pinned else None, moves)
+
+    # moves of a sliding piece along rays - a pinned piece (pinDirection set) only along its pin line
+    def get_ray_moves(self, r, c, rays, pinDirection, moves):
+        board = self.board
         opposition = 'b' if self.whiteToMove else 'w'
-        for dx, dy in DIAGONAL_DIRS:
-            newRow = r + dx
-            newCol = c + dy
-
-            # move without capture
-            while GameState.check_bounds(newRow, newCol) and self.board[newRow][newCol] == "--":
-                if not piece_pinned or pin_direction == (dx, dy) or pin_direction == (-dx, -dy):
-                    moves.append(Move((r, c), (newRow, newCol), self.board))
-                    newRow = newRow + dx
-                    newCol = newCol + dy
-
-            # move with capture
-            if GameState.check_bounds(newRow, newCol) and self.board[newRow][newCol][0] == opposition:
-                if not piece_pinned or pin_direction == (dx, dy) or pin_direction == (-dx, -dy):
-                    moves.append(Move((r, c), (newRow, newCol), self.board))
+        for direction, ray in rays:
+            if pinDirection is not None and pinDirection != direction and \
+                    pinDirection != (-direction[0], -direction[1]):
+                continue
+            for newRow, newCol in ray:
+                endPiece = board[newRow][newCol]
+                if endPiece == "--":  # move without capture
+                    moves.append(Move((r, c), (newRow, newCol), board))
+                else:  # move with capture
+                    if endPiece[0] == opposition:
+                        moves.append(Move((r, c), (newRow, newCol), board))
+                    break
 
     def get_queen_moves(self, r, c, moves):
         self.get_rook_moves(r, c, moves)
         self.get_bishop_moves(r, c, moves)
 
     def get_king_moves(self, r, c, moves):
-        ally = 'w' if self.whiteToMove else 'b'
-        for dx, dy in FOUR_WAY_DIRS + DIAGONAL_DIRS:
-            newRow = r + dx
-            newCol = c + dy
-
-            # move to empty square or with capture 
-            if GameState.check_bounds(newRow, newCol) and self.board[newRow][newCol][0] != ally:
-                # place king on end square and check for checks
-                if ally == "w":
-                    self.whiteKingLoc = (newRow, newCol)
-                else:
-                    self.blackKingLoc = (newRow, newCol)
-                in_check, pins, checks = self.get_pins_and_checks()
-                if not in_check:
-                    moves.append(Move((r, c), (newRow, newCol), self.board))
-                # place king back on original location
-                if ally == "w":
-                    self.whiteKingLoc = (r, c)
-                else:
-                    self.blackKingLoc = (r, c)
+        board = self.board
+        king = board[r][c]
+        # lift the king off the board while testing its targets - a slider checking it along a line still attacks the
+        # square behind it
+        board[r][c] = "--"
+        targets = [(newRow, newCol) for newRow, newCol in KING_TARGETS[r][c]
+                   if board[newRow][newCol][0] != king[0] and not self.is_square_attacked(newRow, newCol, king[0] == 'b')]
+        board[r][c] = king
+        for target in targets:
+            moves.append(Move((r, c), target, board))
 
     def get_castle_moves(self, r, c, moves):
-        if self.square_under_attack(r, c):
+        if self.inCheck:
             return  # can't castle if king is in check
-        if (self.whiteToMove and self.castlingRights.wks) or (not self.whiteToMove and self.castlingRights.bks):
+        if self.castlingRights & (CASTLE_WKS if self.whiteToMove else CASTLE_BKS):
             self.get_king_side_castle_moves(r, c, moves)
-        if (self.whiteToMove and self.castlingRights.wqs) or (not self.whiteToMove and self.castlingRights.bqs):
+        if self.castlingRights & (CASTLE_WQS if self.whiteToMove else CASTLE_BQS):
             self.get_queen_side_castle_moves(r, c, moves)
 
     def get_king_side_castle_moves(self, r, c, moves):
@@ -489,15 +926,9 @@ class GameState:
             c = self.blackKingLoc[1]
 
         # check radially outwards from king for pins and checks
-        index = -1
-        for dx, dy in FOUR_WAY_DIRS + DIAGONAL_DIRS:
-            index += 1
-            newRow = r + dx
-            newCol = c + dy
+        for index, ((dx, dy), ray) in enumerate(RAYS[r][c]):
             possiblePin = ()
-            distance = 0
-            while GameState.check_bounds(newRow, newCol):
-                distance += 1
+            for distance, (newRow, newCol) in enumerate(ray, 1):
                 piece = self.board[newRow][newCol]
                 if piece[0] == ally and piece[1] != 'K':
                     # a piece could be a pin only if it is the first ally piece between king and attacker
@@ -529,23 +960,14 @@ class GameState:
                     else:
                         # enemy piece but not applying pin or check
                         break
-                newRow = newRow + dx
-                newCol = newCol + dy
         # handle knight checks
-        for dx, dy in KNIGHT_DIRS:
-            newRow = r + dx
-            newCol = c + dy
-            if GameState.check_bounds(newRow, newCol):
-                piece = self.board[newRow][newCol]
-                if piece[0] == opposition and piece[1] == 'N':
-                    inCheck = True
-                    checks.append((newRow, newCol, dx, dy))
+        knight = opposition + 'N'
+        for newRow, newCol in KNIGHT_TARGETS[r][c]:
+            if self.board[newRow][newCol] == knight:
+                inCheck = True
+                checks.append((newRow, newCol, newRow - r, newCol - c))
         return inCheck, pins, checks
 
-    @staticmethod
-    def check_bounds(r, c):
-        return 0 <= r < DIMS and 0 <= c < DIMS
-
     def __str__(self):
         result = ""
         for r in range(DIMS):
@@ -554,32 +976,31 @@ class GameState:
         return result
 
 
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
-
-
 class Move:
-    def __init__(self, startSquare, endSquare, board, isEnPassant=False, isCastleMove=False):
-        self.startRow = startSquare[0]
-        self.startCol = startSquare[1]
-        self.endRow = endSquare[0]
-        self.endCol = endSquare[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        # pawn promotion
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (
-                self.pieceMoved == 'bp' and self.endRow == 7)
+    # fixed attribute slots instead of a per-move __dict__ - moves are created thousands of times per search
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isPawnPromotion",
+                 "promotionPiece", "isEnPassant", "isCastleMove", "moveID")
+
+    def __init__(self, startSquare, endSquare, board, isEnPassant=False, isCastleMove=False, promotionPiece='Q'):
+        self.startRow, self.startCol = startRow, startCol = startSquare
+        self.endRow, self.endCol = endRow, endCol = endSquare
+        self.pieceMoved = pieceMoved = board[startRow][startCol]
+        # pawn promotion - pawns only ever move forwards, so reaching either edge row means promoting
+        self.isPawnPromotion = isPawnPromotion = pieceMoved[1] == 'p' and (endRow == 0 or endRow == DIMS - 1)
+        self.promotionPiece = promotionPiece
         # en passant
         self.isEnPassant = isEnPassant
-        if self.isEnPassant:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
+        if isEnPassant:
+            self.pieceCaptured = 'wp' if pieceMoved == 'bp' else 'bp'
+        else:
+            self.pieceCaptured = board[endRow][endCol]
         # castle
         self.isCastleMove = isCastleMove
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        moveID = startRow * 1000 + startCol * 100 + endRow * 10 + endCol
+        if isPawnPromotion:
+            # queen promotions keep the plain id, so a move built from two clicks matches them
+            moveID += PROMOTION_PIECES.index(promotionPiece) * 10000
+        self.moveID = moveID
 
     # Override the equals() method
     def __eq__(self, other):
@@ -587,12 +1008,18 @@ class Move:
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
     @staticmethod
     def get_rank_file(row, col):
         return COLS_TO_FILES[col] + ROWS_TO_RANKS[row]
 
     def get_chess_notation(self):
-        return self.get_rank_file(self.startRow, self.startCol) + self.get_rank_file(self.endRow, self.endCol)
+        notation = self.get_rank_file(self.startRow, self.startCol) + self.get_rank_file(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionPiece.lower()
+        return notation
 
     def __str__(self):
         if self.isCastleMove:
@@ -609,7 +1036,7 @@ class Move:
                 moveString += endSquare
             # pawn promotion
             if self.isPawnPromotion:
-                moveString += "=Q"
+                moveString += "=" + self.promotionPiece
             return moveString
 
         moveString = self.pieceMoved[1]
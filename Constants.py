@@ -1,3 +1,5 @@
+import os
+
 BOARD_WIDTH = BOARD_HEIGHT = 512
 MOVE_LOG_PANEL_WIDTH = BOARD_WIDTH//2
 MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
@@ -14,3 +16,14 @@ RANKS_TO_ROWS = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
 ROWS_TO_RANKS = {value: key for key, value in RANKS_TO_ROWS.items()}
 FILES_TO_COLS = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
 COLS_TO_FILES = {value: key for key, value in FILES_TO_COLS.items()}
+
+# standard starting position in Forsyth-Edwards Notation
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# data files generated next to the code, so they are found whatever the working directory
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# opening book used by the GUI and the UCI front end, if the file exists (see OpeningBook.py)
+BOOK_PATH = os.path.join(CODE_DIRECTORY, "book.bin")
+BITBASE_DIRECTORY = os.path.join(CODE_DIRECTORY, "bitbases")  # endgame bitbases (see Bitbases.py)
+# evaluation tables fitted by Tuning.py, used if the file exists
+TUNED_TABLES_PATH = os.path.join(CODE_DIRECTORY, "tuned_tables.json")
@@ -0,0 +1,178 @@
+'''
+    EPD test suite runner - searches every position of a suite (WAC, STS, ...) for a fixed time and checks the move
+    played against the position's "bm" (best move) and "am" (avoid move) operations.
+    Positions are spread across a pool of worker processes. For every position it reports whether it was solved,
+    the time to solution - when the search settled on a correct move for good - and the nodes searched, then the
+    totals and nodes per second, so search strength and speed can be compared between versions.
+    The totals also give the search's cutoff rates and branching factor (SearchStats), and with --profile the share
+    of the search time spent in move generation, evaluation and make/undo.
+
+    An EPD line is the first four FEN fields followed by operations, e.g.
+        2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";
+    Moves may be given in standard algebraic notation or in UCI notation.
+
+    Usage:
+        python EpdSuite.py wac.epd --movetime 1 --workers 4 [--profile]
+'''
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ChessAI
+from Constants import COLS_TO_FILES, ROWS_TO_RANKS
+from Perft import BACKENDS
+from SearchStats import SearchStats, SearchProfiler
+
+OPERATION_PATTERN = re.compile(r'(\w+)\s*((?:"[^"]*"|[^;"])*);')
+
+
+# (id, fen, best moves, avoided moves) of an EPD line, or None for blank lines, comments and lines with no bm / am
+def parse_epd(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4 or line.startswith("#"):
+        return None
+    operations = {opcode: operand.strip().strip('"')
+                  for opcode, operand in OPERATION_PATTERN.findall(fields[4] if len(fields) > 4 else "")}
+    if "bm" not in operations and "am" not in operations:
+        return None
+    # the half move clock and full move number are optional EPD operations rather than FEN fields
+    fen = " ".join(fields[:4] + [operations.get("hmvc", "0"), operations.get("fmvn", "1")])
+    return operations.get("id", " ".join(fields[:4])), fen, operations.get("bm", "").split(), \
+        operations.get("am", "").split()
+
+
+def read_epd(path):
+    with open(path) as epdFile:
+        return [entry for entry in (parse_epd(line.strip()) for line in epdFile) if entry is not None]
+
+
+# standard algebraic notation of move (without check marks) - validMoves are used to tell apart pieces of the same
+# kind that can reach the same square
+def get_san(move, validMoves):
+    if move.isCastleMove:
+        return "O-O" if move.endCol > move.startCol else "O-O-O"
+    endSquare = COLS_TO_FILES[move.endCol] + ROWS_TO_RANKS[move.endRow]
+    if move.pieceMoved[1] == 'p':
+        san = (COLS_TO_FILES[move.startCol] + "x" if move.pieceCaptured != "--" else "") + endSquare
+        return san + ("=" + move.promotionPiece if move.isPawnPromotion else "")
+    rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and other.endRow == move.endRow
+              and other.endCol == move.endCol and (other.startRow, other.startCol) != (move.startRow, move.startCol)]
+    disambiguation = ""
+    if len(rivals) != 0:
+        if all(other.startCol != move.startCol for other in rivals):
+            disambiguation = COLS_TO_FILES[move.startCol]
+        elif all(other.startRow != move.startRow for other in rivals):
+            disambiguation = ROWS_TO_RANKS[move.startRow]
+        else:
+            disambiguation = COLS_TO_FILES[move.startCol] + ROWS_TO_RANKS[move.startRow]
+    return move.pieceMoved[1] + disambiguation + ("x" if move.pieceCaptured != "--" else "") + endSquare
+
+
+# the move of validMoves written as notation (SAN or UCI), or None
+def find_notated_move(notation, validMoves):
+    notation = notation.rstrip("+#!?").replace("0", "O")
+    for move in validMoves:
+        if move.get_chess_notation() == notation.lower() or get_san(move, validMoves) == notation:
+            return move
+    return None
+
+
+'''
+    Runs in a worker process - searches one position and returns
+    (id, solved, move played in SAN, time to solution or None, SearchStats, depth reached)
+'''
+
+
+def solve_position(entry, moveTime, maxDepth, backend, profile=False):
+    ChessAI.searchHook = SearchProfiler() if profile else None
+    epdId, fen, bestNotations, avoidNotations = entry
+    currState = BACKENDS[backend](fen)
+    validMoves = currState.get_all_valid_moves()
+    bestMoves = [find_notated_move(notation, validMoves) for notation in bestNotations]
+    avoidMoves = [find_notated_move(notation, validMoves) for notation in avoidNotations]
+
+    def is_solution(move):
+        return move is not None and (len(bestMoves) == 0 or move in bestMoves) and move not in avoidMoves
+
+    ChessAI.transpositionTable.clear()
+    solvedAt = None
+    iterations = []
+    startTime = time.perf_counter()
+
+    def record_iteration(depth, score, bestMove):
+        nonlocal solvedAt
+        iterations.append(depth)
+        if not is_solution(bestMove):
+            solvedAt = None
+        elif solvedAt is None:
+            solvedAt = time.perf_counter() - startTime
+
+    move, stats = ChessAI.find_best_move_iterative_deepening(currState, validMoves, moveTime, maxDepth,
+                                                             onIteration=record_iteration)
+    solved = is_solution(move)
+    return epdId, solved, get_san(move, validMoves) if move is not None else "-", solvedAt if solved else None, \
+        stats, iterations[-1] if iterations else 0
+
+
+def run_suite(entries, moveTime=ChessAI.MOVE_TIME, maxDepth=ChessAI.MAX_SEARCH_DEPTH, workers=1, backend="mailbox",
+              profile=False):
+    startTime = time.perf_counter()
+    solvedCount = 0
+    solutionTimes = []
+    branchingFactors = []
+    totals = SearchStats()  # the counters and timings of all searches added up
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(solve_position, entry, moveTime, maxDepth, backend, profile) for entry in entries]
+        for entry, future in zip(entries, futures):
+            epdId, solved, played, solvedAt, stats, depth = future.result()
+            nodes = stats.nodes
+            elapsed = stats.elapsed
+            add_search_stats(totals, stats)
+            if stats.branching_factor() > 0:
+                branchingFactors.append(stats.branching_factor())
+            if solved:
+                solvedCount += 1
+                solutionTimes.append(solvedAt)
+            expected = " ".join(entry[2] + ["not " + notation for notation in entry[3]])
+            print("%-20s %-6s played %-8s expected %-16s depth %2d  %9d nodes  %6.2fs  %s"
+                  % (epdId, "OK" if solved else "FAIL", played, expected, depth, nodes, elapsed,
+                     "solved after %.2fs" % solvedAt if solved else ""))
+    print("solved %d of %d  (average time to solution %.2fs)  %d nodes in %.2fs (%.0f nps)  wall time %.2fs"
+          % (solvedCount, len(entries), sum(solutionTimes) / max(len(solutionTimes), 1), totals.nodes, totals.elapsed,
+             totals.nps(), time.perf_counter() - startTime))
+    print("beta cutoffs %.1f%% of interior nodes, %.1f%% on the first move  average branching factor %.2f"
+          % (100 * totals.cutoff_rate(), 100 * totals.first_move_cutoff_rate(),
+             sum(branchingFactors) / max(len(branchingFactors), 1)))
+    for category, seconds in sorted(totals.timings.items(), key=lambda timing: -timing[1]):
+        print("%-16s %7.2fs  %5.1f%%" % (category, seconds, 100 * seconds / max(totals.elapsed, 1e-9)))
+    return solvedCount
+
+
+def add_search_stats(totals, stats):
+    totals.elapsed += stats.elapsed
+    totals.nodes += stats.nodes
+    totals.quiescenceNodes += stats.quiescenceNodes
+    totals.betaCutoffs += stats.betaCutoffs
+    totals.firstMoveCutoffs += stats.firstMoveCutoffs
+    totals.transpositionCutoffs += stats.transpositionCutoffs
+    for category, seconds in stats.timings.items():
+        totals.timings[category] = totals.timings.get(category, 0.0) + seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an EPD test suite and report solved positions and speed")
+    parser.add_argument("epd", help="EPD file with bm / am operations")
+    parser.add_argument("--movetime", type=float, default=ChessAI.MOVE_TIME, help="search time per position in seconds")
+    parser.add_argument("--depth", type=int, default=ChessAI.MAX_SEARCH_DEPTH, help="depth limit per position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    parser.add_argument("--profile", action="store_true",
+                        help="time move generation, evaluation and make/undo (slows the search down)")
+    args = parser.parse_args()
+    run_suite(read_epd(args.epd), args.movetime, args.depth, args.workers, args.backend, args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+'''
+    Opening book in the Polyglot binary layout - a file of 16 byte big endian entries sorted by position key:
+        key     uint64   position key
+        move    uint16   bits 0-5 to square, 6-11 from square (file + 8 * rank, a1 = 0), 12-14 promotion piece
+                         (0 none, 1 knight, 2 bishop, 3 rook, 4 queen); castling is written as king takes own rook
+        weight  uint16   how good / how often played the move is
+        learn   uint32   unused
+    The position key is the standard Polyglot hash (polyglot_key), so books written by other Polyglot tools can be
+    used as they are, and books built here with build_book (from games in UCI move notation) work in other engines.
+    The file is memory-mapped and searched with a binary search, so opening a book costs no parsing.
+
+    Usage:
+        python OpeningBook.py --build games.txt --out book.bin --max-ply 16
+'''
+import argparse
+import mmap
+import os
+import random
+import struct
+
+import ChessEngine
+from Constants import DIMS, START_FEN
+from PolyglotRandom import RANDOM64
+
+ENTRY_FORMAT = ">QHHI"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+POLYGLOT_PROMOTION_PIECES = " NBRQ"
+POLYGLOT_PIECE_KINDS = {"bp": 0, "wp": 1, "bN": 2, "wN": 3, "bB": 4, "wB": 5, "bR": 6, "wR": 7, "bQ": 8, "wQ": 9,
+                        "bK": 10, "wK": 11}
+POLYGLOT_CASTLING_OFFSET = 768  # castling bit b of GameState.castlingRights (wks, wqs, bks, bqs) is number 768 + b
+POLYGLOT_EN_PASSANT_OFFSET = 772
+POLYGLOT_WHITE_TO_MOVE = 780
+
+
+def square_code(row, col):
+    return (DIMS - 1 - row) * DIMS + col
+
+
+'''
+    Polyglot key of a position. The en passant file only counts when a pawn of the side to move stands next to the
+    pawn that just moved two squares - whether the capture would be legal does not matter.
+'''
+
+
+def polyglot_key(currState):
+    key = 0
+    board = currState.board
+    for r in range(DIMS):
+        for c in range(DIMS):
+            piece = board[r][c]
+            if piece != "--":
+                key ^= RANDOM64[64 * POLYGLOT_PIECE_KINDS[piece] + square_code(r, c)]
+    for bit in range(4):
+        if currState.castlingRights & (1 << bit):
+            key ^= RANDOM64[POLYGLOT_CASTLING_OFFSET + bit]
+    if currState.enPassantPossible != ():
+        enPassantRow, enPassantCol = currState.enPassantPossible
+        # the pawn that moved two squares stands one row further from the side to move than the square it skipped
+        pawnRow = enPassantRow + 1 if currState.whiteToMove else enPassantRow - 1
+        capturingPawn = 'wp' if currState.whiteToMove else 'bp'
+        if any(0 <= pawnCol < DIMS and board[pawnRow][pawnCol] == capturingPawn
+               for pawnCol in (enPassantCol - 1, enPassantCol + 1)):
+            key ^= RANDOM64[POLYGLOT_EN_PASSANT_OFFSET + enPassantCol]
+    if currState.whiteToMove:
+        key ^= RANDOM64[POLYGLOT_WHITE_TO_MOVE]
+    return key
+
+
+def encode_move(move):
+    endCol = move.endCol
+    if move.isCastleMove:  # king takes own rook
+        endCol = DIMS - 1 if move.endCol > move.startCol else 0
+    code = square_code(move.endRow, endCol) | square_code(move.startRow, move.startCol) << 6
+    if move.isPawnPromotion:
+        code |= POLYGLOT_PROMOTION_PIECES.index(move.promotionPiece) << 12
+    return code
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = os.path.getsize(path) // ENTRY_SIZE
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def key_at(self, index):
+        return struct.unpack_from(">Q", self.data, index * ENTRY_SIZE)[0]
+
+    # (move code, weight) of every entry for the position key
+    def get_entries(self, key):
+        low = 0
+        high = self.size
+        while low < high:  # first entry with a key >= key
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            entryKey, move, weight, _ = struct.unpack_from(ENTRY_FORMAT, self.data, low * ENTRY_SIZE)
+            if entryKey != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    '''
+        Book move for currState out of validMoves, or None if the position is not in the book.
+        weighted picks a move at random in proportion to its weight, otherwise the highest weighted move is played.
+    '''
+
+    def find_move(self, currState, validMoves, weighted=True, rng=random):
+        movesByCode = {encode_move(move): move for move in validMoves}
+        candidates = [(movesByCode[code], weight) for code, weight in self.get_entries(polyglot_key(currState))
+                      if code in movesByCode and weight > 0]
+        if len(candidates) == 0:
+            return None
+        if not weighted:
+            return max(candidates, key=lambda candidate: candidate[1])[0]
+        pick = rng.uniform(0, sum(weight for _, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return candidates[-1][0]
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.file.close()
+
+
+# the book at path, or None if there is no book file
+def open_book(path):
+    return OpeningBook(path) if path is not None and os.path.isfile(path) else None
+
+
+'''
+    Writes a book from games given as lists of moves in UCI notation ("e2e4", "e7e8q", ...). The weight of a move
+    is the number of games that played it, scaled to fit 16 bits. Only the first maxPly half moves are used.
+'''
+
+
+def build_book(games, path, maxPly=16, fen=START_FEN):
+    counts = {}
+    for game in games:
+        currState = ChessEngine.GameState(fen)
+        for notation in game[:maxPly]:
+            move = next((move for move in currState.get_all_valid_moves() if move.get_chess_notation() == notation), None)
+            if move is None:
+                break  # illegal or unknown move - the rest of the game is skipped
+            entryKey = (polyglot_key(currState), encode_move(move))
+            counts[entryKey] = counts.get(entryKey, 0) + 1
+            currState.make_move(move)
+    scale = max(1, (max(counts.values()) + 0xFFFF - 1) // 0xFFFF) if counts else 1
+    with open(path, "wb") as bookFile:
+        for (key, move), count in sorted(counts.items()):
+            bookFile.write(struct.pack(ENTRY_FORMAT, key, move, max(1, count // scale), 0))
+    return len(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from games in UCI move notation")
+    parser.add_argument("--build", required=True, help="text file with one game per line, moves separated by spaces")
+    parser.add_argument("--out", required=True, help="book file to write")
+    parser.add_argument("--max-ply", type=int, default=16, help="half moves of every game to put in the book")
+    args = parser.parse_args()
+    with open(args.build) as gamesFile:
+        games = [line.split() for line in gamesFile if line.strip()]
+    entries = build_book(games, args.out, args.max_ply)
+    print("%d entries from %d games written to %s" % (entries, len(games), args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+'''
+    Perft - counts the leaf nodes of the legal move tree to a fixed depth.
+    Used to verify move generation (counts must match the reference values) and to benchmark
+    get_all_valid_moves/make_move/undo_move (nodes per second).
+
+    Usage:
+        python Perft.py --suite --depth 3
+        python Perft.py --fen "<fen>" --depth 4 --divide --workers 4 --backend bitboard
+'''
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import BitboardEngine
+import ChessEngine
+from Constants import START_FEN
+
+BACKENDS = {
+    "mailbox": ChessEngine.GameState,
+    "bitboard": BitboardEngine.BitboardGameState
+}
+
+# reference positions - (name, fen, expected node counts for depth 1, 2, 3, ...)
+PERFT_POSITIONS = [
+    ("startpos", START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("en passant and pins", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("castling and promotion", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("castling and promotion (mirrored)", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("promotion with check", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551])
+]
+
+
+def perft(currState, depth):
+    if depth == 0:
+        return 1
+    validMoves = currState.get_all_valid_moves()
+    if depth == 1:
+        return len(validMoves)
+    nodes = 0
+    for move in validMoves:
+        currState.make_move(move)
+        nodes += perft(currState, depth - 1)
+        currState.undo_move()
+    return nodes
+
+
+'''
+    Perft split by root move - maps the notation of every root move to the number of leaf nodes below it
+'''
+
+
+def divide(currState, depth):
+    results = {}
+    for move in currState.get_all_valid_moves():
+        currState.make_move(move)
+        results[move.get_chess_notation()] = perft(currState, depth - 1)
+        currState.undo_move()
+    return results
+
+
+'''
+    Same as divide, but the root moves are spread across a process pool - every worker sets up its own copy of
+    the position from the FEN string and searches the subtree of one root move
+'''
+
+
+def parallel_divide(fen, depth, workers, backend="mailbox"):
+    validMoves = BACKENDS[backend](fen).get_all_valid_moves()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(perft_root_move, fen, move.moveID, depth - 1, backend) for move in validMoves]
+        return {move.get_chess_notation(): future.result() for move, future in zip(validMoves, futures)}
+
+
+def perft_root_move(fen, moveID, depth, backend):
+    currState = BACKENDS[backend](fen)
+    for move in currState.get_all_valid_moves():
+        if move.moveID == moveID:
+            currState.make_move(move)
+            break
+    return perft(currState, depth)
+
+
+def run_perft(fen, depth, workers=1, backend="mailbox", showDivide=False):
+    currState = BACKENDS[backend](fen)
+    startTime = time.perf_counter()
+    results = {}
+    if workers > 1 and depth > 1:
+        results = parallel_divide(fen, depth, workers, backend)
+        nodes = sum(results.values())
+    elif showDivide:
+        results = divide(currState, depth)
+        nodes = sum(results.values())
+    else:
+        nodes = perft(currState, depth)
+    elapsed = time.perf_counter() - startTime
+    if showDivide:
+        for notation in sorted(results):
+            print(notation + ": " + str(results[notation]))
+    return nodes, elapsed
+
+
+def run_suite(maxDepth, workers=1, backend="mailbox"):
+    totalNodes = 0
+    totalTime = 0.0
+    failures = 0
+    for name, fen, expectedCounts in PERFT_POSITIONS:
+        for depth in range(1, min(maxDepth, len(expectedCounts)) + 1):
+            nodes, elapsed = run_perft(fen, depth, workers, backend)
+            totalNodes += nodes
+            totalTime += elapsed
+            status = "OK" if nodes == expectedCounts[depth - 1] else "FAIL (expected " + str(expectedCounts[depth - 1]) + ")"
+            if nodes != expectedCounts[depth - 1]:
+                failures += 1
+            print("%-34s depth %d  %10d nodes  %8.2fs  %8.0f nps  %s"
+                  % (name, depth, nodes, elapsed, nodes / max(elapsed, 1e-9), status))
+    print("total: %d nodes in %.2fs (%.0f nps), %d failures"
+          % (totalNodes, totalTime, totalNodes / max(totalTime, 1e-9), failures))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation test and benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--suite", action="store_true", help="run all reference positions up to --depth")
+    parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes the root moves are split across")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    args = parser.parse_args()
+    if args.suite:
+        failures = run_suite(args.depth, args.workers, args.backend)
+        raise SystemExit(1 if failures else 0)
+    nodes, elapsed = run_perft(args.fen, args.depth, args.workers, args.backend, args.divide)
+    print("nodes: %d  time: %.2fs  nps: %.0f" % (nodes, elapsed, nodes / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
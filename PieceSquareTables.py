@@ -0,0 +1,157 @@
+'''
+    Evaluation tables shared by ChessEngine (which keeps the evaluation up to date incrementally) and ChessAI.
+    Material values and piece-square tables are in centipawns, tables are written from white's point of view with
+    row 0 being the 8th rank - black uses the same tables mirrored vertically.
+    Every table has a middlegame and an endgame version, and the evaluation blends the two by game phase.
+    Values fitted by Tuning.py replace the hand-picked ones below when its output file exists.
+'''
+import json
+import os
+
+from Constants import DIMS, TUNED_TABLES_PATH
+
+# material in pawns, as used by the simple evaluations and the search margins
+PIECE_SCORE = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
+
+MG_PIECE_VALUE = {"K": 0, "Q": 900, "R": 500, "B": 330, "N": 320, "p": 100}
+EG_PIECE_VALUE = {"K": 0, "Q": 940, "R": 520, "B": 320, "N": 300, "p": 120}
+
+# game phase - 24 with all minor and major pieces on the board, 0 with only kings and pawns left
+PHASE_WEIGHTS = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "p": 0}
+TOTAL_PHASE = 24
+
+PAWN_TABLE = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5, 5, 10, 25, 25, 10, 5, 5],
+    [0, 0, 0, 20, 20, 0, 0, 0],
+    [5, -5, -10, 0, 0, -10, -5, 5],
+    [5, 10, 10, -20, -20, 10, 10, 5],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+PAWN_ENDGAME_TABLE = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [80, 80, 80, 80, 80, 80, 80, 80],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [30, 30, 30, 30, 30, 30, 30, 30],
+    [15, 15, 15, 15, 15, 15, 15, 15],
+    [5, 5, 5, 5, 5, 5, 5, 5],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+KNIGHT_TABLE = [
+    [-50, -40, -30, -30, -30, -30, -40, -50],
+    [-40, -20, 0, 0, 0, 0, -20, -40],
+    [-30, 0, 10, 15, 15, 10, 0, -30],
+    [-30, 5, 15, 20, 20, 15, 5, -30],
+    [-30, 0, 15, 20, 20, 15, 0, -30],
+    [-30, 5, 10, 15, 15, 10, 5, -30],
+    [-40, -20, 0, 5, 5, 0, -20, -40],
+    [-50, -40, -30, -30, -30, -30, -40, -50]
+]
+
+BISHOP_TABLE = [
+    [-20, -10, -10, -10, -10, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 10, 10, 5, 0, -10],
+    [-10, 5, 5, 10, 10, 5, 5, -10],
+    [-10, 0, 10, 10, 10, 10, 0, -10],
+    [-10, 10, 10, 10, 10, 10, 10, -10],
+    [-10, 5, 0, 0, 0, 0, 5, -10],
+    [-20, -10, -10, -10, -10, -10, -10, -20]
+]
+
+ROOK_TABLE = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [5, 10, 10, 10, 10, 10, 10, 5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [0, 0, 0, 5, 5, 0, 0, 0]
+]
+
+QUEEN_TABLE = [
+    [-20, -10, -10, -5, -5, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 5, 5, 5, 0, -10],
+    [-5, 0, 5, 5, 5, 5, 0, -5],
+    [0, 0, 5, 5, 5, 5, 0, -5],
+    [-10, 5, 5, 5, 5, 5, 0, -10],
+    [-10, 0, 5, 0, 0, 0, 0, -10],
+    [-20, -10, -10, -5, -5, -10, -10, -20]
+]
+
+KING_TABLE = [
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 30, 10, 0, 0, 10, 30, 20]
+]
+
+KING_ENDGAME_TABLE = [
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]
+]
+
+MG_PST = {"p": PAWN_TABLE, "N": KNIGHT_TABLE, "B": BISHOP_TABLE, "R": ROOK_TABLE, "Q": QUEEN_TABLE, "K": KING_TABLE}
+EG_PST = {"p": PAWN_ENDGAME_TABLE, "N": KNIGHT_TABLE, "B": BISHOP_TABLE, "R": ROOK_TABLE, "Q": QUEEN_TABLE,
+          "K": KING_ENDGAME_TABLE}
+
+
+'''
+    Signed score of every piece on every square (index row * 8 + col) - material plus piece-square value,
+    positive for white pieces and negative for black ones. "--" scores 0 so empty squares can be looked up too.
+'''
+
+
+def build_square_scores(pieceValues, pieceSquareTables):
+    squareScores = {"--": [0] * (DIMS * DIMS)}
+    for pieceType, table in pieceSquareTables.items():
+        squareScores["w" + pieceType] = [pieceValues[pieceType] + table[r][c]
+                                         for r in range(DIMS) for c in range(DIMS)]
+        squareScores["b" + pieceType] = [-(pieceValues[pieceType] + table[DIMS - 1 - r][c])
+                                         for r in range(DIMS) for c in range(DIMS)]
+    return squareScores
+
+
+# the dicts are updated in place on rebuild, so modules that imported them see new values
+MG_SQUARE_SCORES = {}
+EG_SQUARE_SCORES = {}
+
+
+def rebuild_square_scores():
+    MG_SQUARE_SCORES.update(build_square_scores(MG_PIECE_VALUE, MG_PST))
+    EG_SQUARE_SCORES.update(build_square_scores(EG_PIECE_VALUE, EG_PST))
+
+
+# replace the piece values and tables with the ones saved by Tuning.py - returns False if there is no such file
+def load_tuned_tables(path=TUNED_TABLES_PATH):
+    if path is None or not os.path.isfile(path):
+        return False
+    with open(path) as tablesFile:
+        tables = json.load(tablesFile)
+    MG_PIECE_VALUE.update(tables["mgPieceValue"])
+    EG_PIECE_VALUE.update(tables["egPieceValue"])
+    MG_PST.update(tables["mgPst"])
+    EG_PST.update(tables["egPst"])
+    rebuild_square_scores()
+    return True
+
+
+rebuild_square_scores()
+load_tuned_tables()
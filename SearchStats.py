@@ -0,0 +1,149 @@
+'''
+    Search instrumentation - ChessAI fills in a SearchStats object for every search, returned with the search's
+    move, and calls ChessAI.searchHook, if one is set, at search events.
+    The search itself only bumps a few integer counters, so the statistics are always on. Hooks are only called
+    when set, and SearchProfiler - which times move generation, evaluation and make/undo - only wraps those
+    functions while a search it profiles runs.
+'''
+import time
+
+
+class SearchStats:
+    def __init__(self):
+        self.startTime = time.perf_counter()
+        self.elapsed = 0.0
+        self.nodes = 0  # all nodes searched, quiescence nodes included
+        self.quiescenceNodes = 0
+        self.betaCutoffs = 0  # interior nodes that failed high
+        self.firstMoveCutoffs = 0  # ... on the first move searched - the better the move ordering, the more
+        self.transpositionCutoffs = 0  # nodes answered by the transposition table
+        self.iterations = []  # (depth, score, best move, nodes, seconds) of every completed iteration
+        self.timings = {}  # seconds per category, filled in by SearchProfiler
+
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    # share of the interior nodes that were cut off by a move
+    def cutoff_rate(self):
+        interiorNodes = self.nodes - self.quiescenceNodes
+        return self.betaCutoffs / interiorNodes if interiorNodes > 0 else 0.0
+
+    def first_move_cutoff_rate(self):
+        return self.firstMoveCutoffs / self.betaCutoffs if self.betaCutoffs > 0 else 0.0
+
+    # effective branching factor - how many times more nodes the last iteration needed than the one before
+    def branching_factor(self):
+        if len(self.iterations) < 2:
+            return 0.0
+        lastNodes = self.iterations[-1][3] - self.iterations[-2][3]
+        previousNodes = self.iterations[-2][3] - (self.iterations[-3][3] if len(self.iterations) > 2 else 0)
+        return lastNodes / previousNodes if previousNodes > 0 else 0.0
+
+    def __str__(self):
+        lines = ["%d nodes (%d quiescence) in %.2fs, %.0f nps" % (self.nodes, self.quiescenceNodes, self.elapsed,
+                                                                  self.nps()),
+                 "beta cutoffs %.1f%% of interior nodes, %.1f%% on the first move, %d transposition cutoffs"
+                 % (100 * self.cutoff_rate(), 100 * self.first_move_cutoff_rate(), self.transpositionCutoffs)]
+        if len(self.iterations) > 1:
+            lines.append("branching factor %.2f" % self.branching_factor())
+        for depth, score, bestMove, nodes, seconds in self.iterations:
+            lines.append("depth %2d  score %7.2f  %-6s %9d nodes  %6.2fs" % (depth, score, bestMove.get_chess_notation(),
+                                                                         nodes, seconds))
+        for category, seconds in sorted(self.timings.items(), key=lambda timing: -timing[1]):
+            lines.append("%-16s %6.2fs  %5.1f%%" % (category, seconds, 100 * seconds / max(self.elapsed, 1e-9)))
+        return "\n".join(lines)
+
+
+'''
+    Base class of search hooks - override the events of interest. on_node and on_cutoff are called for every node,
+    so they slow the search down by however long they take.
+'''
+
+
+class SearchHook:
+    def on_search_start(self, currState, stats):
+        pass
+
+    # depth 0 for quiescence nodes
+    def on_node(self, currState, depth, alpha, beta):
+        pass
+
+    # moveIndex - how many moves were searched at the node before move caused the cutoff
+    def on_cutoff(self, currState, move, depth, moveIndex):
+        pass
+
+    def on_iteration(self, depth, score, bestMove, stats):
+        pass
+
+    def on_search_end(self, currState, stats):
+        pass
+
+
+'''
+    Attributes search time to move generation, evaluation and make/undo by wrapping the move generators,
+    ChessAI.score_board and make_move / undo_move while a search runs - the rest of the time is reported as
+    "search". Nested calls of the same category (e.g. get_capture_moves generating all evasions) are timed once.
+    get_staged_moves is a generator, so each of its steps is timed - not the moves searched in between.
+'''
+
+
+class SearchProfiler(SearchHook):
+    TIMED_METHODS = [("get_all_valid_moves", "move generation"), ("get_capture_moves", "move generation"),
+                     ("get_captures_not_in_check", "move generation"),
+                     ("get_quiet_moves_not_in_check", "move generation"),
+                     ("get_pins_and_checks", "move generation"), ("find_legal_move", "move generation"),
+                     ("make_move", "make/undo"), ("undo_move", "make/undo")]
+    TIMED_GENERATORS = [("get_staged_moves", "move generation")]
+
+    def __init__(self):
+        self.runningCategories = set()
+        self.scoreBoard = None
+
+    def timed(self, function, category, timings):
+        timings.setdefault(category, 0.0)
+        clock = time.perf_counter
+        runningCategories = self.runningCategories
+
+        def timed_call(*args):
+            if category in runningCategories:
+                return function(*args)
+            runningCategories.add(category)
+            startTime = clock()
+            try:
+                return function(*args)
+            finally:
+                timings[category] += clock() - startTime
+                runningCategories.discard(category)
+
+        return timed_call
+
+    def timed_generator(self, function, category, timings):
+        timedNext = self.timed(next, category, timings)
+
+        def timed_steps(*args):
+            steps = function(*args)
+            while True:
+                try:
+                    move = timedNext(steps)
+                except StopIteration:
+                    return
+                yield move
+
+        return timed_steps
+
+    def on_search_start(self, currState, stats):
+        import ChessAI  # imported here - ChessAI imports this module
+        for name, category in self.TIMED_METHODS:
+            setattr(currState, name, self.timed(getattr(currState, name), category, stats.timings))
+        for name, category in self.TIMED_GENERATORS:
+            setattr(currState, name, self.timed_generator(getattr(currState, name), category, stats.timings))
+        self.scoreBoard = ChessAI.score_board
+        ChessAI.score_board = self.timed(self.scoreBoard, "evaluation", stats.timings)
+
+    def on_search_end(self, currState, stats):
+        import ChessAI
+        for name, _ in self.TIMED_METHODS + self.TIMED_GENERATORS:
+            currState.__dict__.pop(name, None)  # back to the class's methods
+        ChessAI.score_board = self.scoreBoard
+        self.runningCategories.clear()
+        stats.timings["search"] = max(0.0, stats.elapsed - sum(stats.timings.values()))
@@ -0,0 +1,113 @@
+'''
+    Runs ChessAI's iterative deepening search on a background thread, so that the caller (the pygame loop, the UCI
+    front end) keeps handling events while the AI thinks.
+    The search works on its own copy of the position, can be stopped (keeping its best move so far) or cancelled
+    (dropping it) at any time, and reports every iteration it completes.
+    Pondering searches the position after the opponent's expected reply, without a time limit, while the opponent
+    thinks - ponder_hit puts that search on the clock once the expected reply is played.
+    Positions found in the opening book are answered with a book move straight away, without searching.
+    With more than one worker the search is split over that many processes (ChessAI.find_best_move_parallel).
+'''
+import pickle
+import threading
+
+import ChessAI
+
+
+class SearchWorker:
+    def __init__(self, book=None, workers=1):
+        self.book = book  # OpeningBook consulted before searching, or None
+        self.workers = workers  # processes searching
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.cancelled = False
+        self.searchState = None  # the search's copy of the position
+        self.positionKey = None  # zobrist key of the position searched
+        self.bestMove = None
+        self.ponderMove = None  # reply expected to bestMove
+        self.progress = None  # (depth, score, best move) of the last completed iteration
+        self.stats = None  # SearchStats of the last finished search
+        self.finished = False
+        self.pondering = False
+
+    '''
+        Start searching currState - or, with ponderMove, the position after ponderMove - cancelling any running search.
+        onIteration(depth, score, bestMove) is called on the search thread after every completed iteration, while
+        searchState is at the root, and onFinished(bestMove, ponderMove) once the search has stopped.
+    '''
+
+    def start(self, currState, moveTime=ChessAI.MOVE_TIME, maxDepth=ChessAI.MAX_SEARCH_DEPTH, ponderMove=None,
+              onIteration=None, onFinished=None):
+        self.cancel()
+        searchState = pickle.loads(pickle.dumps(currState))  # the caller keeps using currState during the search
+        if ponderMove is not None:
+            searchState.make_move(ponderMove)
+            moveTime = None
+        validMoves = searchState.get_all_valid_moves()
+        self.positionKey = searchState.zobristKey
+        self.bestMove = None
+        self.ponderMove = None
+        self.progress = None
+        self.pondering = ponderMove is not None
+        self.cancelled = False
+        self.searchState = searchState
+        if self.book is not None and len(validMoves) != 0:
+            self.bestMove = self.book.find_move(searchState, validMoves)
+        self.finished = len(validMoves) == 0 or self.bestMove is not None
+        if self.finished:
+            if onFinished is not None:
+                onFinished(self.bestMove, None)
+            return
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(searchState, validMoves, moveTime, maxDepth,
+                                                              self.stopEvent, onIteration, onFinished, self.workers),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, searchState, validMoves, moveTime, maxDepth, stopEvent, onIteration, onFinished, workers=1):
+        def report_progress(depth, score, bestMove):
+            self.progress = (depth, score, bestMove)
+            if onIteration is not None:
+                onIteration(depth, score, bestMove)
+
+        bestMove, stats = ChessAI.find_best_move_parallel(searchState, validMoves, moveTime, maxDepth, stopEvent,
+                                                          report_progress, workers)
+        self.stats = stats
+        self.ponderMove = ChessAI.find_ponder_move(searchState, bestMove)
+        self.bestMove = bestMove
+        self.finished = True
+        if onFinished is not None and not self.cancelled:
+            onFinished(bestMove, self.ponderMove)
+
+    # stop the running search and wait for it - its best move so far becomes the result
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    # stop the running search and drop its result
+    def cancel(self):
+        self.cancelled = True
+        self.stop()
+        self.thread = None
+        self.positionKey = None
+        self.finished = False
+        self.pondering = False
+
+    # the expected reply was played - the pondering search continues as the real one, with moveTime seconds left
+    def ponder_hit(self, moveTime=ChessAI.MOVE_TIME):
+        self.pondering = False
+        if not self.finished:
+            ChessAI.start_search_clock(moveTime)
+
+    # is this worker searching currState, or holding the result of a search of it
+    def is_working_on(self, currState):
+        return self.positionKey is not None and self.positionKey == currState.zobristKey
+
+    # the best move for currState once the search of it has finished, else None
+    def take_result(self, currState):
+        if not self.finished or not self.is_working_on(currState):
+            return None
+        self.finished = False
+        self.positionKey = None
+        return self.bestMove
@@ -0,0 +1,222 @@
+'''
+    Self-play dataset generator - the engine plays games against itself on a pool of worker processes and stores
+    every position it searched, with the search score and the game result, as fixed size binary records.
+
+    Record layout (RECORD_SIZE = 32 bytes, little endian):
+        occupancy      uint64   bit (row * 8 + col) set for every occupied square, row 0 being the 8th rank
+        pieces         16 bytes one 4 bit PIECE_CODES entry per occupied square in square order, low nibble first
+        flags          uint8    bit 0 white to move, bits 1-4 castling rights wks, wqs, bks, bqs
+        enPassantCol   uint8    column of the en passant square + 1, 0 if there is none
+        score          int16    search score in centipawns from white's point of view (+-MATE_SCORE_CP for mates)
+        result         int8     game result from white's point of view - 1 win, 0 draw, -1 loss
+        fiftyMoveCount uint8    half moves since the last capture or pawn move
+        ply            uint16   half moves played since the start of the game
+
+    Games are written to shards of gamesPerShard games. A shard is written to a temporary file and renamed once
+    complete, so an interrupted run resumes by generating only the shards that are missing - the temporary files
+    it left behind are deleted.
+    Shards can be read without parsing through PositionDataset, which memory-maps them.
+
+    Usage:
+        python SelfPlay.py --out selfplay --games 1000 --workers 4 --depth 3
+        python SelfPlay.py --out selfplay --games 1000 --movetime 0.1 --random-plies 8 --random-rate 0.05
+'''
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ChessAI
+from Constants import DIMS, START_FEN
+from Perft import BACKENDS
+
+RECORD_FORMAT = "<Q16sBBhbBH"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+PIECE_CODES = {"wp": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6, "bp": 7, "bN": 8, "bB": 9, "bR": 10, "bQ": 11,
+               "bK": 12}
+CODE_PIECES = {code: piece for piece, code in PIECE_CODES.items()}
+MATE_SCORE_CP = 32000
+MAX_GAME_PLIES = 400  # longer games are adjudicated as draws
+SHARD_NAME = "shard_%05d.bin"
+DEFAULT_DEPTH = 2
+
+
+# record fields of the current position, except the game result which is only known at the end of the game
+def position_fields(currState, score):
+    occupancy = 0
+    codes = []
+    for r in range(DIMS):
+        for c in range(DIMS):
+            piece = currState.board[r][c]
+            if piece != "--":
+                occupancy |= 1 << (r * DIMS + c)
+                codes.append(PIECE_CODES[piece])
+    codes.extend([0] * (32 - len(codes)))
+    pieces = bytes(codes[i] | (codes[i + 1] << 4) for i in range(0, 32, 2))
+    flags = int(currState.whiteToMove) | currState.castlingRights << 1  # CASTLE_* bits are wks, wqs, bks, bqs
+    enPassantCol = currState.enPassantPossible[1] + 1 if currState.enPassantPossible != () else 0
+    return occupancy, pieces, flags, enPassantCol, score, min(currState.fiftyMoveCount, 255), len(currState.moveLog)
+
+
+def pack_record(fields, result):
+    occupancy, pieces, flags, enPassantCol, score, fiftyMoveCount, ply = fields
+    return struct.pack(RECORD_FORMAT, occupancy, pieces, flags, enPassantCol, score, result, fiftyMoveCount, ply)
+
+
+# search score (pawns, side to move's view) as the record's centipawns from white's view
+def score_to_cp(score, whiteToMove):
+    if not whiteToMove:
+        score = -score
+    if ChessAI.moves_to_mate(score) is not None:
+        return MATE_SCORE_CP if score > 0 else -MATE_SCORE_CP
+    return max(-MATE_SCORE_CP + 1, min(MATE_SCORE_CP - 1, int(round(score * 100))))
+
+
+'''
+    Read access to a shard - records are unpacked straight from the memory-mapped file when they are asked for
+'''
+
+
+class PositionDataset:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = os.path.getsize(path) // RECORD_SIZE
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def __len__(self):
+        return self.size
+
+    # raw record fields (occupancy, pieces, flags, enPassantCol, score, result, fiftyMoveCount, ply)
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("record index out of range")
+        return struct.unpack_from(RECORD_FORMAT, self.data, index * RECORD_SIZE)
+
+    def __iter__(self):
+        return struct.iter_unpack(RECORD_FORMAT, self.data[:self.size * RECORD_SIZE])
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.file.close()
+
+
+# 8x8 board of piece strings ("wp", "--", ...) from the occupancy and pieces fields of a record
+def decode_board(occupancy, pieces):
+    board = [["--"] * DIMS for _ in range(DIMS)]
+    pieceIndex = 0
+    for square in range(DIMS * DIMS):
+        if occupancy >> square & 1:
+            code = pieces[pieceIndex // 2] >> (4 * (pieceIndex % 2)) & 0xF
+            board[square // DIMS][square % DIMS] = CODE_PIECES[code]
+            pieceIndex += 1
+    return board
+
+
+def shard_paths(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith("shard_") and name.endswith(".bin"))
+
+
+'''
+    Plays one game and returns its records. The first randomPlies half moves and a randomRate share of the later
+    ones are random legal moves, which keeps games from repeating - positions reached by random moves are still
+    searched and recorded.
+'''
+
+
+def play_game(rng, depth, moveTime, randomPlies, randomRate, backend="mailbox"):
+    currState = BACKENDS[backend](START_FEN)
+    ChessAI.transpositionTable.clear()
+    positions = []
+    validMoves = currState.get_all_valid_moves()
+    while True:
+        if currState.checkmate:
+            result = -1 if currState.whiteToMove else 1
+            break
+        if currState.stalemate or currState.repetition or currState.fiftyMovesDone or \
+                len(currState.moveLog) >= MAX_GAME_PLIES:
+            result = 0
+            break
+        if len(currState.moveLog) < randomPlies:
+            move = rng.choice(validMoves)
+        else:
+            inCheck = currState.inCheck  # set by get_all_valid_moves - the search leaves it on a deeper position
+            iterations = []
+            move, _ = ChessAI.find_best_move_iterative_deepening(currState, validMoves, moveTime, depth,
+                                                                 onIteration=lambda *iteration: iterations.append(iteration))
+            # positions in check are left out - their static scores say little about the position
+            if len(iterations) != 0 and not inCheck:
+                positions.append(position_fields(currState, score_to_cp(iterations[-1][1], currState.whiteToMove)))
+            if move is None or rng.random() < randomRate:
+                move = rng.choice(validMoves)
+        currState.make_move(move)
+        validMoves = currState.get_all_valid_moves()
+    return [pack_record(fields, result) for fields in positions]
+
+
+# runs in a worker process - plays the games of one shard, appending every finished game to a temporary file
+def generate_shard(directory, shardIndex, gamesPerShard, depth, moveTime, randomPlies, randomRate, seed, backend):
+    rng = random.Random(seed * 1000003 + shardIndex)
+    random.seed(rng.random())  # ChessAI breaks ties between equal moves with the global random module
+    path = os.path.join(directory, SHARD_NAME % shardIndex)
+    positionCount = 0
+    with open(path + ".tmp", "wb") as shardFile:
+        for _ in range(gamesPerShard):
+            records = play_game(rng, depth, moveTime, randomPlies, randomRate, backend)
+            shardFile.write(b"".join(records))
+            shardFile.flush()
+            positionCount += len(records)
+    os.replace(path + ".tmp", path)
+    return shardIndex, positionCount
+
+
+def run_self_play(directory, games, gamesPerShard=50, workers=1, depth=DEFAULT_DEPTH, moveTime=None,
+                  randomPlies=8, randomRate=0.0, seed=0, backend="mailbox"):
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):  # partial shards of an interrupted run
+        if name.startswith("shard_") and name.endswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+    shardCount = (games + gamesPerShard - 1) // gamesPerShard
+    missingShards = [i for i in range(shardCount) if not os.path.exists(os.path.join(directory, SHARD_NAME % i))]
+    print("%d of %d shards to generate" % (len(missingShards), shardCount))
+    startTime = time.perf_counter()
+    totalPositions = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(generate_shard, directory, i, gamesPerShard, depth, moveTime, randomPlies,
+                                   randomRate, seed, backend) for i in missingShards]
+        for future in futures:
+            shardIndex, positionCount = future.result()
+            totalPositions += positionCount
+            elapsed = time.perf_counter() - startTime
+            print("shard %d: %d positions  (%d positions in %.1fs)" % (shardIndex, positionCount, totalPositions, elapsed))
+    return totalPositions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play position dataset generator")
+    parser.add_argument("--out", required=True, help="directory the shards are written to")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--games-per-shard", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--depth", type=int, default=None,
+                        help="search depth per move (default %d, or unlimited with --movetime)" % DEFAULT_DEPTH)
+    parser.add_argument("--movetime", type=float, default=None, help="search time per move in seconds")
+    parser.add_argument("--random-plies", type=int, default=8, help="random moves at the start of every game")
+    parser.add_argument("--random-rate", type=float, default=0.0, help="share of later moves played at random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    args = parser.parse_args()
+    if args.depth is not None:
+        depth = args.depth
+    else:
+        depth = DEFAULT_DEPTH if args.movetime is None else ChessAI.MAX_SEARCH_DEPTH
+    run_self_play(args.out, args.games, args.games_per_shard, args.workers, depth, args.movetime,
+                  args.random_plies, args.random_rate, args.seed, args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+'''
+    Fixed size transposition table keyed by GameState.zobristKey.
+    Every bucket holds two entries - a depth-preferred slot, which keeps the deepest search of the current
+    search generation, and an always-replace slot, which takes whatever the depth-preferred slot rejects.
+    The table is allocated once, so its memory stays flat however long the engine runs.
+    Mate scores count the plies from the root to the mate, so the same position reached at another ply needs another
+    score. They are stored as the distance from the entry's position instead (store adds the entry's ply to a mate
+    score, probe takes it off again), which holds wherever the position is found.
+'''
+
+# bound types
+EXACT = 0
+LOWER_BOUND = 1  # score is at least this value (search failed high)
+UPPER_BOUND = 2  # score is at most this value (search failed low)
+
+# approximate memory used by one stored entry (tuple + key/score ints + list slot)
+ENTRY_SIZE_BYTES = 128
+ENTRIES_PER_BUCKET = 2
+
+# entry layout
+KEY, DEPTH, SCORE, BOUND, MOVE, AGE = range(6)
+
+# scores at least this far from 0 are mates (ChessAI.CHECKMATE_SCORE less the plies to the mate) - no position
+# scores this high
+MATE_THRESHOLD = 900
+
+
+class TranspositionTable:
+    def __init__(self, sizeMB=16):
+        self.sizeMB = sizeMB
+        self.numBuckets = max(1, sizeMB * 1024 * 1024 // (ENTRY_SIZE_BYTES * ENTRIES_PER_BUCKET))
+        self.entries = [None] * (self.numBuckets * ENTRIES_PER_BUCKET)
+        self.age = 0
+
+    # start a new search - entries from older searches become replaceable regardless of depth
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        self.entries = [None] * (self.numBuckets * ENTRIES_PER_BUCKET)
+        self.age = 0
+
+    # ply - plies from the root of the search to the position, for its mate scores
+    def probe(self, key, ply=0):
+        index = (key % self.numBuckets) * ENTRIES_PER_BUCKET
+        entry = self.entries[index]
+        if entry is None or entry[KEY] != key:
+            entry = self.entries[index + 1]
+            if entry is None or entry[KEY] != key:
+                return None
+        score = entry[SCORE]
+        if score >= MATE_THRESHOLD:
+            return entry[:SCORE] + (score - ply,) + entry[SCORE + 1:]
+        if score <= -MATE_THRESHOLD:
+            return entry[:SCORE] + (score + ply,) + entry[SCORE + 1:]
+        return entry
+
+    def store(self, key, depth, score, bound, move, ply=0):
+        if score >= MATE_THRESHOLD:
+            score += ply
+        elif score <= -MATE_THRESHOLD:
+            score -= ply
+        index = (key % self.numBuckets) * ENTRIES_PER_BUCKET
+        newEntry = (key, depth, score, bound, move, self.age)
+        entry = self.entries[index]
+        if entry is None or entry[KEY] == key or entry[AGE] != self.age or depth >= entry[DEPTH]:
+            self.entries[index] = newEntry
+        else:
+            self.entries[index + 1] = newEntry
+
+    # permille of depth-preferred slots filled by the current search
+    def hashfull(self):
+        sample = min(1000, self.numBuckets)
+        used = 0
+        for i in range(sample):
+            entry = self.entries[i * ENTRIES_PER_BUCKET]
+            if entry is not None and entry[AGE] == self.age:
+                used += 1
+        return used * 1000 // sample
@@ -0,0 +1,235 @@
+'''
+    Texel tuning - fits the material values and piece-square tables to the results of self-play games (SelfPlay.py).
+    The evaluation is linear in its square scores: every piece adds the middlegame and endgame score of its kind on
+    its square (mirrored for black, with the opposite sign), blended by game phase. So the whole dataset is turned
+    into NumPy arrays once - one (position, feature, sign) entry per piece - and every tuning pass evaluates all
+    positions, the logistic loss of the predicted against the actual game results and its gradient with a handful
+    of array operations.
+    The shards are memory-mapped as structured arrays and decoded in chunks, one shard after the other, so no record
+    is unpacked in Python and no more than a chunk of records is read into memory at a time.
+    The tuned tables are saved as JSON - PieceSquareTables loads them in place of its own when the file exists.
+
+    Requires NumPy (pip install numpy).
+
+    Usage:
+        python Tuning.py --data selfplay --epochs 300 --out tuned_tables.json
+'''
+import argparse
+import json
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("Tuning.py requires NumPy - pip install numpy") from error
+
+from Constants import DIMS, TUNED_TABLES_PATH
+from PieceSquareTables import MG_SQUARE_SCORES, EG_SQUARE_SCORES, PHASE_WEIGHTS, TOTAL_PHASE
+from SelfPlay import CODE_PIECES, RECORD_SIZE, shard_paths
+
+SQUARES = DIMS * DIMS
+PIECE_TYPES = ["p", "N", "B", "R", "Q", "K"]
+FEATURE_COUNT = len(PIECE_TYPES) * SQUARES  # one square score per piece kind and square, for each game phase
+CHUNK_SIZE = 1 << 16  # positions decoded at a time
+
+# SelfPlay's record layout as a NumPy structured type
+RECORD_DTYPE = np.dtype([("occupancy", "<u8"), ("pieces", "u1", 16), ("flags", "u1"), ("enPassantCol", "u1"),
+                         ("score", "<i2"), ("result", "i1"), ("fiftyMoveCount", "u1"), ("ply", "<u2")])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+# per piece code (0 = empty square): kind index, colour sign and phase weight
+CODE_KIND = np.zeros(len(CODE_PIECES) + 1, np.int16)
+CODE_SIGN = np.zeros(len(CODE_PIECES) + 1, np.int8)
+CODE_PHASE = np.zeros(len(CODE_PIECES) + 1, np.int8)
+for pieceCode, pieceName in CODE_PIECES.items():
+    CODE_KIND[pieceCode] = PIECE_TYPES.index(pieceName[1])
+    CODE_SIGN[pieceCode] = 1 if pieceName[0] == 'w' else -1
+    CODE_PHASE[pieceCode] = PHASE_WEIGHTS[pieceName[1]]
+
+
+# the records of every shard in directory, as memory-mapped structured arrays - read when they are decoded
+def load_records(directory):
+    return [np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(os.path.getsize(path) // RECORD_SIZE,))
+            for path in shard_paths(directory) if os.path.getsize(path) >= RECORD_SIZE]
+
+
+# piece code (SelfPlay.PIECE_CODES) of every square of every record - an (N, 64) array, index row * 8 + col
+def decode_squares(records):
+    occupied = np.unpackbits(records["occupancy"].astype("<u8").view(np.uint8).reshape(-1, 8), axis=1,
+                             bitorder="little").astype(bool)
+    pieces = np.asarray(records["pieces"])
+    codes = np.empty((len(records), 32), np.uint8)
+    codes[:, 0::2] = pieces & 0xF
+    codes[:, 1::2] = pieces >> 4
+    pieceIndex = np.cumsum(occupied, axis=1, dtype=np.int8) - 1  # pieces are stored in square order
+    return np.where(occupied, np.take_along_axis(codes, np.clip(pieceIndex, 0, 31), axis=1), 0).astype(np.uint8)
+
+
+# (records, index of the first record in the whole dataset) for every chunk of up to CHUNK_SIZE records of shards
+def iterate_chunks(shards):
+    start = 0
+    for records in shards:
+        for chunkStart in range(0, len(records), CHUNK_SIZE):
+            chunk = records[chunkStart:chunkStart + CHUNK_SIZE]
+            yield chunk, start
+            start += len(chunk)
+
+
+'''
+    The positions of a list of record arrays (e.g. the shards of load_records) as arrays:
+        positions, features, signs   one entry per piece - its position, feature (kind * 64 + square from white's
+                                     point of view) and +1 for white / -1 for black
+        counts                       (N, 12) number of pieces of every PIECE_CODES kind
+        phase                        middlegame share of the blend, 1 with all pieces on the board, 0 in pawn endings
+        targets                      game result from white's point of view - 1 win, 0.5 draw, 0 loss
+'''
+
+
+class FeatureBatch:
+    def __init__(self, shards):
+        self.size = sum(len(records) for records in shards)
+        positions = []
+        features = []
+        signs = []
+        counts = []
+        phase = []
+        targets = []
+        for records, start in iterate_chunks(shards):
+            squares = decode_squares(records)
+            rows, cols = np.nonzero(squares)
+            codes = squares[rows, cols]
+            whitePieces = CODE_SIGN[codes] > 0
+            positions.append((rows + start).astype(np.int32))
+            features.append((CODE_KIND[codes] * SQUARES + np.where(whitePieces, cols, cols ^ (SQUARES - DIMS)))
+                            .astype(np.int16))
+            signs.append(CODE_SIGN[codes])
+            counts.append(np.stack([(squares == code).sum(axis=1, dtype=np.int8) for code in sorted(CODE_PIECES)],
+                                   axis=1))
+            phase.append(np.minimum(CODE_PHASE[squares].sum(axis=1), TOTAL_PHASE) / TOTAL_PHASE)
+            targets.append((np.asarray(records["result"], np.float32) + 1) / 2)
+        self.positions = np.concatenate(positions) if positions else np.zeros(0, np.int32)
+        self.features = np.concatenate(features) if features else np.zeros(0, np.int16)
+        self.signs = np.concatenate(signs) if signs else np.zeros(0, np.int8)
+        self.counts = np.concatenate(counts) if counts else np.zeros((0, len(CODE_PIECES)), np.int8)
+        self.phase = np.concatenate(phase).astype(np.float32) if phase else np.zeros(0, np.float32)
+        self.targets = np.concatenate(targets) if targets else np.zeros(0, np.float32)
+
+
+# the engine's current square scores as a (2, FEATURE_COUNT) array - middlegame and endgame, centipawns
+def current_weights():
+    weights = np.zeros((2, FEATURE_COUNT))
+    for kind, pieceType in enumerate(PIECE_TYPES):
+        weights[0, kind * SQUARES:(kind + 1) * SQUARES] = MG_SQUARE_SCORES["w" + pieceType]
+        weights[1, kind * SQUARES:(kind + 1) * SQUARES] = EG_SQUARE_SCORES["w" + pieceType]
+    return weights
+
+
+# evaluation of every position of the batch in centipawns from white's point of view - same as the tapered score
+def evaluate(weights, batch):
+    middlegame = np.bincount(batch.positions, batch.signs * weights[0][batch.features], minlength=batch.size)
+    endgame = np.bincount(batch.positions, batch.signs * weights[1][batch.features], minlength=batch.size)
+    return middlegame * batch.phase + endgame * (1 - batch.phase)
+
+
+def win_probability(scores, scale):
+    return 1 / (1 + np.exp(-scale * scores))
+
+
+# mean logistic (cross entropy) loss of the predicted win probabilities against the game results
+def logistic_loss(weights, batch, scale):
+    probabilities = np.clip(win_probability(evaluate(weights, batch), scale), 1e-7, 1 - 1e-7)
+    return -np.mean(batch.targets * np.log(probabilities) + (1 - batch.targets) * np.log(1 - probabilities))
+
+
+def loss_gradient(weights, batch, scale):
+    scoreGradient = (win_probability(evaluate(weights, batch), scale) - batch.targets) * scale / batch.size
+    entryGradient = scoreGradient[batch.positions] * batch.signs
+    entryPhase = batch.phase[batch.positions]
+    return np.stack([np.bincount(batch.features, entryGradient * entryPhase, minlength=FEATURE_COUNT),
+                     np.bincount(batch.features, entryGradient * (1 - entryPhase), minlength=FEATURE_COUNT)])
+
+
+# Texel's scaling constant - how sharply the score maps to a win probability - fitted to the current evaluation
+def fit_scale(weights, batch, low=1e-4, high=0.05, iterations=40):
+    for _ in range(iterations):  # golden section search, the loss being unimodal in the scale
+        lower = high - (high - low) / 1.618
+        upper = low + (high - low) / 1.618
+        if logistic_loss(weights, batch, lower) < logistic_loss(weights, batch, upper):
+            high = upper
+        else:
+            low = lower
+    return (low + high) / 2
+
+
+# minimises the loss with Adam, starting from weights - learningRate is in centipawns per step
+def tune(weights, batch, scale, epochs=300, learningRate=1.0, report=None):
+    weights = weights.copy()
+    firstMoment = np.zeros_like(weights)
+    secondMoment = np.zeros_like(weights)
+    for epoch in range(1, epochs + 1):
+        gradient = loss_gradient(weights, batch, scale)
+        firstMoment = 0.9 * firstMoment + 0.1 * gradient
+        secondMoment = 0.999 * secondMoment + 0.001 * gradient ** 2
+        weights -= learningRate * (firstMoment / (1 - 0.9 ** epoch)) / \
+            (np.sqrt(secondMoment / (1 - 0.999 ** epoch)) + 1e-12)
+        if report is not None:
+            report(epoch, weights)
+    return weights
+
+
+'''
+    Splits square scores back into piece values (the average over the squares a piece can stand on) and
+    piece-square tables, in the layout of PieceSquareTables
+'''
+
+
+def weights_to_tables(weights):
+    tables = {"mgPieceValue": {}, "egPieceValue": {}, "mgPst": {}, "egPst": {}}
+    for phaseIndex, phaseName in enumerate(("mg", "eg")):
+        for kind, pieceType in enumerate(PIECE_TYPES):
+            squareScores = weights[phaseIndex, kind * SQUARES:(kind + 1) * SQUARES].reshape(DIMS, DIMS)
+            reachableRows = squareScores[1:DIMS - 1] if pieceType == 'p' else squareScores
+            value = 0 if pieceType == 'K' else int(round(reachableRows.mean()))
+            table = np.rint(squareScores - value).astype(int)
+            if pieceType == 'p':
+                table[0] = table[DIMS - 1] = 0
+            tables[phaseName + "PieceValue"][pieceType] = value
+            tables[phaseName + "Pst"][pieceType] = table.tolist()
+    return tables
+
+
+def save_tables(weights, path=TUNED_TABLES_PATH):
+    with open(path, "w") as tablesFile:
+        json.dump(weights_to_tables(weights), tablesFile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Texel tuning of the evaluation tables on self-play data")
+    parser.add_argument("--data", required=True, help="directory of SelfPlay.py shards")
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--learning-rate", type=float, default=1.0, help="Adam step size in centipawns")
+    parser.add_argument("--out", default=TUNED_TABLES_PATH, help="JSON file the tuned tables are written to")
+    args = parser.parse_args()
+    startTime = time.perf_counter()
+    batch = FeatureBatch(load_records(args.data))
+    if batch.size == 0:
+        raise SystemExit("no positions in " + args.data)
+    print("%d positions, %d features extracted in %.1fs" % (batch.size, len(batch.features),
+                                                             time.perf_counter() - startTime))
+    weights = current_weights()
+    scale = fit_scale(weights, batch)
+    print("scale %.5f  loss %.5f" % (scale, logistic_loss(weights, batch, scale)))
+
+    def report(epoch, tunedWeights):
+        if epoch % 25 == 0 or epoch == args.epochs:
+            print("epoch %4d  loss %.5f  %.1fs" % (epoch, logistic_loss(tunedWeights, batch, scale),
+                                                   time.perf_counter() - startTime))
+
+    weights = tune(weights, batch, scale, args.epochs, args.learning_rate, report)
+    save_tables(weights, args.out)
+    print("tables written to " + args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+'''
+    Headless UCI (Universal Chess Interface) front end - lets chess GUIs and tournament managers play the engine
+    over stdin/stdout, without pygame or a display.
+    Commands are read on the main thread while the search runs on a SearchWorker thread, so "stop" and "isready"
+    are answered during a search.
+
+    Usage:
+        python UCI.py
+'''
+import sys
+import threading
+import time
+
+import ChessAI
+import ChessEngine
+from Constants import START_FEN, BOOK_PATH
+from OpeningBook import open_book
+from SearchWorker import SearchWorker
+from TranspositionTable import TranspositionTable
+
+ENGINE_NAME = "ChessEngine"
+ENGINE_AUTHOR = "grvmishra788"
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+
+
+class UciEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock()
+        self.lock = threading.Lock()  # guards waitForStop and pendingResult, shared with the search thread
+        self.currState = ChessEngine.GameState()
+        self.ownBook = True
+        self.bookPath = BOOK_PATH
+        self.searchWorker = SearchWorker(open_book(self.bookPath))
+        self.searchStartTime = 0.0
+        self.waitForStop = False  # "go infinite" and "go ponder" may only report their move after stop/ponderhit
+        self.pendingResult = None  # (best move, ponder move) of such a search that finished early
+        self.ponderMoveTime = None  # time the search gets once the pondered move is played
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    # handle one command line - returns False on "quit"
+    def handle(self, line):
+        tokens = line.split()
+        if len(tokens) == 0:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default " + str(ChessAI.TT_SIZE_MB) + " min 1 max " + str(MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max " + str(MAX_THREADS))
+            self.send("option name Ponder type check default false")
+            self.send("option name OwnBook type check default true")
+            self.send("option name BookFile type string default " + BOOK_PATH)
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.searchWorker.cancel()
+            ChessAI.transpositionTable.clear()
+            self.currState = ChessEngine.GameState()
+        elif command == "setoption":
+            self.set_option(tokens[1:])
+        elif command == "position":
+            self.set_position(tokens[1:])
+        elif command == "go":
+            self.go(tokens[1:])
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponder_hit()
+        elif command == "quit":
+            self.searchWorker.cancel()
+            return False
+        return True
+
+    # setoption name <name> value <value>
+    def set_option(self, tokens):
+        if "name" not in tokens:
+            return
+        valueIndex = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[tokens.index("name") + 1:valueIndex]).lower()
+        value = " ".join(tokens[valueIndex + 1:])
+        if name == "hash" and value.isdigit():
+            self.searchWorker.cancel()
+            ChessAI.transpositionTable = TranspositionTable(max(1, min(int(value), MAX_HASH_MB)))
+        elif name == "threads" and value.isdigit():
+            self.searchWorker.cancel()
+            self.searchWorker.workers = max(1, min(int(value), MAX_THREADS))
+        elif name == "ownbook" or name == "bookfile":
+            self.searchWorker.cancel()
+            if name == "ownbook":
+                self.ownBook = value.lower() == "true"
+            else:
+                self.bookPath = value
+            self.searchWorker.book = open_book(self.bookPath) if self.ownBook else None
+
+    # position [startpos | fen <fen>] [moves <move1> ... <movei>]
+    def set_position(self, tokens):
+        self.searchWorker.cancel()
+        movesIndex = tokens.index("moves") if "moves" in tokens else len(tokens)
+        if len(tokens) > 0 and tokens[0] == "fen":
+            fen = " ".join(tokens[1:movesIndex])
+        else:
+            fen = START_FEN
+        self.currState = ChessEngine.GameState(fen)
+        for notation in tokens[movesIndex + 1:]:
+            for move in self.currState.get_all_valid_moves():
+                if move.get_chess_notation() == notation:
+                    self.currState.make_move(move)
+                    break
+            else:
+                self.send("info string illegal move " + notation)
+                break
+
+    # go [depth <d>] [movetime <ms>] [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [movestogo <n>] [infinite] [ponder]
+    def go(self, tokens):
+        self.searchWorker.cancel()
+        params = {}
+        for i in range(len(tokens) - 1):
+            if tokens[i + 1].lstrip("-").isdigit():
+                params[tokens[i]] = int(tokens[i + 1])
+        maxDepth = params.get("depth", ChessAI.MAX_SEARCH_DEPTH)
+        if "movetime" in params:
+            moveTime = params["movetime"] / 1000
+        elif "wtime" in params or "btime" in params:
+            white = self.currState.whiteToMove
+            timeLeft = params.get("wtime" if white else "btime", 0) / 1000
+            increment = params.get("winc" if white else "binc", 0) / 1000
+            moveTime = ChessAI.allocate_move_time(timeLeft, increment, params.get("movestogo"))
+        elif "depth" in params or "infinite" in tokens:
+            moveTime = None
+        else:
+            moveTime = ChessAI.MOVE_TIME
+        with self.lock:
+            self.waitForStop = "infinite" in tokens or "ponder" in tokens
+            self.pendingResult = None
+        if "ponder" in tokens:
+            self.ponderMoveTime = moveTime
+            moveTime = None
+        self.searchStartTime = time.perf_counter()
+        self.searchWorker.start(self.currState, moveTime, maxDepth, onIteration=self.report_iteration,
+                                onFinished=self.search_finished)
+
+    def stop(self):
+        with self.lock:
+            self.waitForStop = False
+        self.searchWorker.stop()  # a search still running reports its move through search_finished
+        self.send_pending_result()
+
+    def ponder_hit(self):
+        with self.lock:
+            self.waitForStop = False
+            finished = self.pendingResult is not None
+        if finished:
+            self.send_pending_result()
+        else:
+            self.searchWorker.ponder_hit(self.ponderMoveTime)
+
+    # called on the search thread
+    def search_finished(self, bestMove, ponderMove):
+        with self.lock:
+            if self.waitForStop:
+                self.pendingResult = (bestMove, ponderMove)
+                return
+        self.send_best_move(bestMove, ponderMove)
+
+    def send_pending_result(self):
+        with self.lock:
+            pendingResult = self.pendingResult
+            self.pendingResult = None
+        if pendingResult is not None:
+            self.send_best_move(*pendingResult)
+
+    def send_best_move(self, bestMove, ponderMove):
+        if bestMove is None:
+            self.send("bestmove 0000")  # no legal moves
+        elif ponderMove is None:
+            self.send("bestmove " + bestMove.get_chess_notation())
+        else:
+            self.send("bestmove " + bestMove.get_chess_notation() + " ponder " + ponderMove.get_chess_notation())
+
+    # called on the search thread after every iteration, while the search's position is at the root
+    def report_iteration(self, depth, score, bestMove):
+        elapsed = max(time.perf_counter() - self.searchStartTime, 1e-6)
+        principalVariation = ChessAI.get_principal_variation(self.searchWorker.searchState, depth)
+        if len(principalVariation) == 0 or principalVariation[0] != bestMove:
+            principalVariation = [bestMove]
+        movesToMate = ChessAI.moves_to_mate(score)
+        if movesToMate is not None:
+            scoreText = "mate " + str(movesToMate)
+        else:
+            scoreText = "cp " + str(int(round(score * 100)))
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s"
+                  % (depth, scoreText, ChessAI.searchNodes, ChessAI.searchNodes / elapsed, elapsed * 1000,
+                     " ".join(move.get_chess_notation() for move in principalVariation)))
+
+
+def main():
+    engine = UciEngine()
+    while True:
+        line = sys.stdin.readline()
+        if not line or not engine.handle(line):
+            break
+    engine.searchWorker.cancel()
+    ChessAI.shutdown_search_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import pygame as p
 import ChessAI
 import ChessEngine
-from Constants import BOARD_WIDTH, BOARD_HEIGHT, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT, DIMS, SQ_SIZE, MAX_FPS, COLORS, COLS_TO_FILES, ROWS_TO_RANKS
+from OpeningBook import open_book
+from SearchWorker import SearchWorker
+from Constants import BOARD_WIDTH, BOARD_HEIGHT, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT, DIMS, SQ_SIZE, MAX_FPS, COLORS, COLS_TO_FILES, ROWS_TO_RANKS, \
+    BOOK_PATH
 
 IMAGES = {}
 
@@ -12,110 +15,222 @@ def load_images():
         IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
 
 
-def highlight_squares(screen, currState, validMoves, squareSelected):
+# highlights of a square - the selected piece's square, and the empty squares and captures it can move to
+SELECTED, MOVE_TARGET, CAPTURE_TARGET = range(3)
+
+
+'''
+    Draws the board incrementally - the squares and their rank / file labels are rendered once into a cached
+    background and the highlights into overlays, so a square is redrawn by blitting its background, overlay and
+    piece sprite. Only squares whose piece or highlight changed since they were last drawn are redrawn, and their
+    rectangles are returned for p.display.update.
+'''
+
+
+class BoardRenderer:
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = render_board_background()
+        self.overlays = render_highlight_overlays()
+        self.shownSquares = None  # (piece, highlight) of every square as last drawn - None is redrawn
+        self.invalidate()
+
+    # redraw every square on the next render, e.g. after something was drawn over the board
+    def invalidate(self):
+        self.shownSquares = [[None] * DIMS for _ in range(DIMS)]
+
+    def render(self, currState, validMoves, squareSelected):
+        highlights = get_highlights(currState, validMoves, squareSelected)
+        dirtyRects = []
+        for r in range(DIMS):
+            for c in range(DIMS):
+                square = (currState.board[r][c], highlights.get((r, c)))
+                if square != self.shownSquares[r][c]:
+                    self.shownSquares[r][c] = square
+                    dirtyRects.append(self.draw_square(r, c, *square))
+        return dirtyRects
+
+    def draw_square(self, r, c, piece, highlight):
+        squareRect = p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        self.screen.blit(self.background, squareRect, squareRect)
+        if highlight is not None:
+            self.screen.blit(self.overlays[highlight][(r + c) % 2], squareRect)
+        if piece != "--":
+            self.screen.blit(IMAGES[piece], squareRect)
+        return squareRect
+
+    # slides the piece of the last move (already made in currState) from its start to its end square - every frame
+    # only the sprite's old and new rectangles are redrawn, from a snapshot of the board without the sprite
+    def animate_move(self, move, currState, clock):
+        p.display.update(self.render(currState, [], ()))
+        # the end square shows the captured piece until the moving piece arrives
+        endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        self.screen.blit(self.background, endSquare, endSquare)
+        self.shownSquares[move.endRow][move.endCol] = None
+        if move.pieceCaptured != "--":
+            capturedRow = move.endRow
+            if move.isEnPassant:
+                capturedRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
+            self.draw_square(capturedRow, move.endCol, move.pieceCaptured, None)
+            self.shownSquares[capturedRow][move.endCol] = None
+        boardSnapshot = self.screen.subsurface(p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT)).copy()
+        dR = move.endRow - move.startRow
+        dC = move.endCol - move.startCol
+        framesPerSecond = 10
+        frameCount = (abs(dR) + abs(dC)) * framesPerSecond
+        previousRect = endSquare
+        for frame in range(frameCount + 1):
+            r, c = (move.startRow + dR * frame / frameCount, move.startCol + dC * frame / frameCount)
+            pieceRect = p.Rect(int(c * SQ_SIZE), int(r * SQ_SIZE), SQ_SIZE, SQ_SIZE)
+            self.screen.blit(boardSnapshot, previousRect, previousRect)
+            self.screen.blit(IMAGES[move.pieceMoved], pieceRect)
+            p.display.update([previousRect, pieceRect])
+            previousRect = pieceRect
+            clock.tick(60)
+
+
+# square -> highlight, for the piece selected by the player
+def get_highlights(currState, validMoves, squareSelected):
+    highlights = {}
     if squareSelected != ():
         r, c = squareSelected
         if currState.board[r][c][0] == ('w' if currState.whiteToMove else 'b'):
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)
-            s.fill(p.Color("blue"))
-            screen.blit(s, (c * SQ_SIZE, r * SQ_SIZE))
-            s1 = p.Surface((SQ_SIZE, SQ_SIZE))
-            s1.set_alpha(100)
+            highlights[(r, c)] = SELECTED
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    color = p.Color(COLORS[(r + c) % 2])
-                    if currState.board[move.endRow][move.endCol] == "--":
-                        s1.fill(color)
-                        p.draw.circle(s1, p.Color("blue"), (SQ_SIZE // 2, SQ_SIZE // 2), 10)
-                    else:
-                        s1.fill(p.Color("blue"))
-                        p.draw.circle(s1, color, (SQ_SIZE // 2, SQ_SIZE // 2), SQ_SIZE // 2)
-                    screen.blit(s1, (move.endCol * SQ_SIZE, move.endRow * SQ_SIZE))
-
-
-def animate_move(move, screen, board, clock):
-    dR = move.endRow - move.startRow
-    dC = move.endCol - move.startCol
-    framesPerSecond = 10
-    frameCount = (abs(dR) + abs(dC)) * framesPerSecond
-    for frame in range(frameCount + 1):
-        r, c = (move.startRow + dR * frame / frameCount, move.startCol + dC * frame / frameCount)
-        draw_board(screen)
-        draw_pieces(screen, board)
-        # erase the piece moved from it's ending square
-        color = p.Color(COLORS[(move.endRow + move.endCol) % 2])
-        endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        p.draw.rect(screen, color, endSquare)
-        # draw captured piece onto the rectangle
-        if move.pieceCaptured != "--":
-            if move.isEnPassant:
-                newEnPassantRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
-                endSquare = p.Rect(move.endCol * SQ_SIZE, newEnPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        # draw moving piece
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
-        clock.tick(60)
+                    isCapture = currState.board[move.endRow][move.endCol] != "--"
+                    highlights[(move.endRow, move.endCol)] = CAPTURE_TARGET if isCapture else MOVE_TARGET
+    return highlights
 
 
-def draw_game_state(screen, currState, validMoves, squareSelected, moveLogFont):
-    draw_board(screen)
-    highlight_squares(screen, currState, validMoves, squareSelected)
-    draw_pieces(screen, currState.board)
-    draw_move_log(screen, currState, moveLogFont)
+# highlight -> its overlay surface on a light and on a dark square
+def render_highlight_overlays():
+    overlays = {}
+    for highlight in (SELECTED, MOVE_TARGET, CAPTURE_TARGET):
+        overlays[highlight] = []
+        for squareColor in COLORS:
+            s = p.Surface((SQ_SIZE, SQ_SIZE))
+            s.set_alpha(100)
+            if highlight == SELECTED:
+                s.fill(p.Color("blue"))
+            elif highlight == MOVE_TARGET:
+                s.fill(p.Color(squareColor))
+                p.draw.circle(s, p.Color("blue"), (SQ_SIZE // 2, SQ_SIZE // 2), 10)
+            else:
+                s.fill(p.Color("blue"))
+                p.draw.circle(s, p.Color(squareColor), (SQ_SIZE // 2, SQ_SIZE // 2), SQ_SIZE // 2)
+            overlays[highlight].append(s)
+    return overlays
 
 
-def draw_board(screen):
+# the empty board with its rank and file names
+def render_board_background():
+    background = p.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+    font = p.font.SysFont("Arial", 16, True, False)
+    font.set_bold(True)
     for r in range(DIMS):
         for c in range(DIMS):
             color = p.Color(COLORS[(r + c) % 2])
-            p.draw.rect(screen, color, p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+            p.draw.rect(background, color, p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
             # write rank and file names
             if r == DIMS-1:
                 alternateColor = p.Color(COLORS[(r + c + 1) % 2])
-                font = p.font.SysFont("Arial", 16, True, False)
-                font.set_bold(True)
                 textObj = font.render(COLS_TO_FILES[c], False, alternateColor)
                 textLoc = p.Rect(0, 0, SQ_SIZE//20, SQ_SIZE//20).move(c * SQ_SIZE + SQ_SIZE // 20, r * SQ_SIZE + (14 * SQ_SIZE)//20)
-                screen.blit(textObj, textLoc)
+                background.blit(textObj, textLoc)
             if c == DIMS-1:
                 alternateColor = p.Color(COLORS[(r + c + 1) % 2])
-                font = p.font.SysFont("Arial", 16, True, False)
-                font.set_bold(True)
                 textObj = font.render(ROWS_TO_RANKS[r], False, alternateColor)
                 textLoc = p.Rect(0, 0, SQ_SIZE//20, SQ_SIZE//20).move(c * SQ_SIZE + (17 * SQ_SIZE)//20, r * SQ_SIZE + SQ_SIZE // 20)
-                screen.blit(textObj, textLoc)
+                background.blit(textObj, textLoc)
+    return background
 
 
-def draw_pieces(screen, board):
-    for r in range(DIMS):
-        for c in range(DIMS):
-            piece = board[r][c]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-
-def draw_move_log(screen, currState, font):
-    moveLogRect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
-    p.draw.rect(screen, p.Color("black"), moveLogRect)
-    moveLog = currState.moveLog
-    paddingX = 5
-    paddingY = 5
-    rowSpace = 2
-    colSpace = 4
-    for i in range(len(moveLog)):
-        move = moveLog[i]
-        text = str((i//2+1))+". " if i % 2 == 0 else ""
-        text += str(move)
-        textObj = font.render(text, True, p.Color("white"))
-        textLoc = moveLogRect.move(paddingX, paddingY)
-        screen.blit(textObj, textLoc)
-        if i % 2 == 1:
-            paddingX = 5
-            paddingY += textObj.get_height() + rowSpace
-        else:
-            paddingX += textObj.get_width() + colSpace
+'''
+    The move log panel - one rendered text surface is cached per ply, added when a move is made and dropped when it
+    is undone, so drawing the panel never renders text again. Only the rows that fit in the panel are drawn, from
+    the scroll position - the mouse wheel scrolls, and the panel follows new moves while scrolled to the bottom.
+'''
+
+
+class MoveLogPanel:
+    PADDING = 5
+    ROW_SPACE = 2
+    COL_SPACE = 4
+
+    def __init__(self, font):
+        self.font = font
+        self.rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
+        self.rowHeight = font.get_linesize() + self.ROW_SPACE  # fixed, so a row's position follows from its index
+        self.visibleRows = max(1, (MOVE_LOG_PANEL_HEIGHT - 2 * self.PADDING) // self.rowHeight)
+        self.moves = []  # the moves whose text is cached, in move log order
+        self.textSurfaces = []
+        self.firstRow = 0  # first row shown - a row is one white and one black move
+        self.followLast = True
+        self.dirty = True
+
+    def row_count(self):
+        return (len(self.moves) + 1) // 2
+
+    def max_first_row(self):
+        return max(0, self.row_count() - self.visibleRows)
+
+    # brings the cache in line with moveLog - only moves made or undone since the last call are rendered or dropped
+    def sync(self, moveLog):
+        kept = min(len(self.moves), len(moveLog))
+        while kept > 0 and self.moves[kept - 1] is not moveLog[kept - 1]:
+            kept -= 1
+        if kept == len(self.moves) == len(moveLog):
+            return
+        del self.moves[kept:]
+        del self.textSurfaces[kept:]
+        for i in range(kept, len(moveLog)):
+            text = str((i//2+1))+". " if i % 2 == 0 else ""
+            text += str(moveLog[i])
+            self.moves.append(moveLog[i])
+            self.textSurfaces.append(self.font.render(text, True, p.Color("white")))
+        self.firstRow = self.max_first_row() if self.followLast else min(self.firstRow, self.max_first_row())
+        self.dirty = True
+
+    def scroll(self, rows):
+        firstRow = max(0, min(self.firstRow + rows, self.max_first_row()))
+        if firstRow != self.firstRow:
+            self.firstRow = firstRow
+            self.dirty = True
+        self.followLast = firstRow == self.max_first_row()
+
+    # draws the panel if it changed - returns its rectangle then, else None
+    def draw(self, screen, moveLog):
+        self.sync(moveLog)
+        if not self.dirty:
+            return None
+        self.dirty = False
+        p.draw.rect(screen, p.Color("black"), self.rect)
+        y = self.rect.y + self.PADDING
+        for row in range(self.firstRow, min(self.row_count(), self.firstRow + self.visibleRows)):
+            x = self.rect.x + self.PADDING
+            for textObj in self.textSurfaces[2 * row:2 * row + 2]:
+                screen.blit(textObj, (x, y))
+                x += textObj.get_width() + self.COL_SPACE
+            y += self.rowHeight
+        if self.row_count() > self.visibleRows:  # scroll bar
+            barHeight = max(10, self.rect.height * self.visibleRows // self.row_count())
+            barTop = (self.rect.height - barHeight) * self.firstRow // self.max_first_row()
+            p.draw.rect(screen, p.Color("gray"), p.Rect(self.rect.right - 4, self.rect.y + barTop, 3, barHeight))
+        return self.rect
+
+
+# the result to show over the board, or None while the game goes on
+def get_game_end_text(currState):
+    if currState.checkmate:
+        return "0-1 : Black wins by checkmate!" if currState.whiteToMove else "1-0 : White wins by checkmate!"
+    if currState.stalemate:
+        return "Draw by stalemate!"
+    if currState.repetition:
+        return "Draw by repetition!"
+    if currState.fiftyMovesDone:
+        return "Draw by 50-move rule!"
+    return None
 
 
 def draw_game_end_text(screen, text):
@@ -126,6 +241,7 @@ def draw_game_end_text(screen, text):
     screen.blit(textObj, textLoc)
     textObj = font.render(text, False, p.Color("black"))
     screen.blit(textObj, textLoc.move(2, 2))
+    return p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT)
 
 
 def main():
@@ -140,18 +256,31 @@ def main():
     animate = False
     gameOver = False
     load_images()
+    boardRenderer = BoardRenderer(screen)
+    moveLogPanel = MoveLogPanel(moveLogFont)
+    shownEndText = None
+    p.display.flip()
     running = True
     squareSelected = ()
     playerClicks = []
     humanIsWhite = True  # If a human is playing white, this flag will be true, else False
     humanIsBlack = True  # If a human is playing black, this flag will be true, else False
+    ponder = True  # If true, the AI thinks about its reply to the expected human move during the human's turn ('p' toggles)
+    searchWorker = SearchWorker(open_book(BOOK_PATH))  # the AI searches on a background thread, so the window stays responsive
+    shownProgress = None
     while running:
         humanTurn = (currState.whiteToMove and humanIsWhite) or (not currState.whiteToMove and humanIsBlack)
         for e in p.event.get():
             if e.type == p.QUIT:
+                searchWorker.cancel()
                 running = False
-            # handle mouse clicks
-            elif e.type == p.MOUSEBUTTONDOWN:
+            elif e.type == p.VIDEOEXPOSE:  # the window was uncovered - show the whole screen again
+                p.display.flip()
+            elif e.type == p.MOUSEWHEEL:
+                if moveLogPanel.rect.collidepoint(p.mouse.get_pos()):
+                    moveLogPanel.scroll(-e.y)
+            # handle mouse clicks (buttons 4 and 5 are the wheel, handled above)
+            elif e.type == p.MOUSEBUTTONDOWN and e.button not in (4, 5):
                 if not gameOver and humanTurn:
                     location = p.mouse.get_pos()
                     col = location[0] // SQ_SIZE
@@ -169,6 +298,11 @@ def main():
                                     moveMade = True
                                     animate = True
                                     currState.make_move(validMoves[i])
+                                    if searchWorker.pondering:
+                                        if searchWorker.is_working_on(currState):  # the expected move was played
+                                            searchWorker.ponder_hit(ChessAI.MOVE_TIME)
+                                        else:
+                                            searchWorker.cancel()
                                     # reset
                                     squareSelected = ()
                                     playerClicks = []
@@ -178,11 +312,13 @@ def main():
             # handle key presses
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  # if 'z' is pressed, undo move
+                    searchWorker.cancel()
                     currState.undo_move()
                     moveMade = True
                     animate = False
                     gameOver = False
                 if e.key == p.K_r:  # if 'r' is pressed, reset board
+                    searchWorker.cancel()
                     currState = ChessEngine.GameState()
                     validMoves = currState.get_all_valid_moves()
                     squareSelected = ()
@@ -190,28 +326,56 @@ def main():
                     moveMade = False
                     animate = False
                     gameOver = False
+                if e.key == p.K_p:  # if 'p' is pressed, switch pondering on or off
+                    ponder = not ponder
+                    if not ponder and searchWorker.pondering:
+                        searchWorker.cancel()
 
         if not gameOver and not humanTurn:
-            AIMove = ChessAI.find_best_move_nega_max_alpha_beta(currState, validMoves)
-            if AIMove is None:
-                AIMove = ChessAI.find_random_move(validMoves)
-            currState.make_move(AIMove)
-            moveMade = True
-            animate = True
+            if not searchWorker.is_working_on(currState):
+                searchWorker.start(currState, ChessAI.MOVE_TIME)
+            AIMove = searchWorker.take_result(currState)
+            if AIMove is not None:
+                for move in validMoves:
+                    if move == AIMove:
+                        currState.make_move(move)
+                        moveMade = True
+                        animate = True
+                        humanTurn = (currState.whiteToMove and humanIsWhite) or (not currState.whiteToMove and humanIsBlack)
+                        if ponder and humanTurn and searchWorker.ponderMove is not None:
+                            searchWorker.start(currState, ponderMove=searchWorker.ponderMove)
+                        break
 
         if moveMade:
             if animate:
-                animate_move(currState.moveLog[-1], screen, currState.board, clock)
+                boardRenderer.animate_move(currState.moveLog[-1], currState, clock)
             validMoves = currState.get_all_valid_moves()
             moveMade = False
 
-        draw_game_state(screen, currState, validMoves, squareSelected, moveLogFont)
-        if currState.checkmate or currState.stalemate or currState.repetition or currState.fiftyMovesDone:
+        if searchWorker.progress != shownProgress:
+            shownProgress = searchWorker.progress
+            if shownProgress is None:
+                p.display.set_caption("Chess")
+            else:
+                depth, score, bestMove = shownProgress
+                p.display.set_caption("Chess - depth " + str(depth) + ", score " + "%+.2f" % score + ", best " + str(bestMove))
+
+        # only what changed since the last frame is drawn and sent to the display
+        endText = get_game_end_text(currState)
+        if endText is not None:
             gameOver = True
-            text = "Draw by stalemate!" if currState.stalemate else "Draw by repetition!" if currState.repetition else "Draw by 50-move rule!" if currState.fiftyMovesDone\
-                else "0-1 : Black wins by checkmate!" if currState.whiteToMove else "1-0 : White wins by checkmate!"
-            draw_game_end_text(screen, text)
-        p.display.flip()
+        if shownEndText is not None and endText != shownEndText:
+            boardRenderer.invalidate()  # wipe the old result off the board
+        dirtyRects = boardRenderer.render(currState, validMoves, squareSelected)
+        moveLogRect = moveLogPanel.draw(screen, currState.moveLog)
+        if moveLogRect is not None:
+            dirtyRects.append(moveLogRect)
+        if endText != shownEndText:
+            shownEndText = endText
+            if endText is not None:
+                dirtyRects.append(draw_game_end_text(screen, endText))
+        if len(dirtyRects) != 0:
+            p.display.update(dirtyRects)
         clock.tick(MAX_FPS)
 
 
@@ -0,0 +1,118 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import AnalysisServer
+import ChessAI
+import ChessEngine
+
+MATE_IN_ONE = "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def test_analyse_position_with_tiny_move_time():
+    result = AnalysisServer.analyse_position(START, ChessAI.MAX_SEARCH_DEPTH, 0.00001)
+    currState = ChessEngine.GameState(START)
+    assert result["bestmove"] in [move.get_chess_notation() for move in currState.get_all_valid_moves()]
+    assert result["pv"][0] == result["bestmove"]
+
+
+def test_analyse_position():
+    result = AnalysisServer.analyse_position(MATE_IN_ONE, 3, None)
+    assert result["bestmove"] == "a1a8"
+    assert result["score"] == {"mate": 1}
+    assert result["pv"] == ["a1a8"]
+    assert result["nodes"] > 0
+
+
+@pytest.mark.parametrize("fen, score", [("R5k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1", {"mate": 0}),
+                                        ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", {"cp": 0})])
+def test_analyse_position_without_moves(fen, score):
+    result = AnalysisServer.analyse_position(fen, 3, None)
+    assert result["bestmove"] is None and result["score"] == score
+
+
+def test_normalise_fen():
+    assert AnalysisServer.normalise_fen(START.replace(" 1", " 40")) == START.rsplit(" ", 1)[0]
+    for fen in [None, "", "8/8/8/8/8/8/8/8 w - - 0 1", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",
+                "rnbqkbnr/ppppXppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                "P3k3/8/8/8/8/8/8/4K3 w - - 0 1", "4k3/8/8/8/8/8/8/3pK3 w - - 0 1"]:  # pawns on the back ranks
+        with pytest.raises(ValueError):
+            AnalysisServer.normalise_fen(fen)
+
+
+def test_parse_request():
+    normalised = AnalysisServer.normalise_fen(START)
+    assert AnalysisServer.parse_request({"fen": START, "depth": 4}) == [(START, (normalised, 4, None))]
+    jobs = AnalysisServer.parse_request({"positions": [{"fen": START}, {"fen": MATE_IN_ONE, "movetime": 0.5}],
+                                         "depth": 6})
+    assert [job for _, job in jobs] == [(normalised, 6, None),
+                                        (AnalysisServer.normalise_fen(MATE_IN_ONE), 6, 0.5)]
+    assert AnalysisServer.parse_request({"fen": START}) == [(START, (normalised, ChessAI.MAX_SEARCH_DEPTH,
+                                                                     ChessAI.MOVE_TIME))]
+    assert AnalysisServer.parse_request({"fen": START, "depth": 99, "movetime": 999})[0][1][1:] == \
+        (ChessAI.MAX_SEARCH_DEPTH, AnalysisServer.MAX_MOVE_TIME)
+
+
+@pytest.mark.parametrize("request_", [None, [], {}, {"positions": []}, {"positions": ["fen"]},
+                                      {"fen": START, "depth": 0}, {"fen": START, "depth": 2.5},
+                                      {"fen": START, "depth": True}, {"fen": START, "movetime": True},
+                                      {"fen": START, "movetime": 0}, {"fen": START, "movetime": "1"},
+                                      {"positions": [{"fen": START}] * (AnalysisServer.MAX_BATCH_SIZE + 1)}])
+def test_parse_request_errors(request_):
+    with pytest.raises(ValueError):
+        AnalysisServer.parse_request(request_)
+
+
+@pytest.fixture(scope="module")
+def server():
+    service = AnalysisServer.AnalysisService(1, 3)
+    httpServer = AnalysisServer.create_server(service, port=0)
+    thread = threading.Thread(target=httpServer.serve_forever, daemon=True)
+    thread.start()
+    yield httpServer
+    httpServer.shutdown()
+    httpServer.server_close()
+    service.shutdown()
+
+
+def request(server, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=60)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else "not json")
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Type"), response.getheader("Retry-After"), \
+            response.read().decode()
+    finally:
+        connection.close()
+
+
+def test_analyse_stream(server):
+    status, contentType, _, body = request(server, "POST", "/analyse", {
+        "positions": [{"fen": MATE_IN_ONE}, {"fen": START, "movetime": 0.2}, {"fen": MATE_IN_ONE.replace(" 1", " 9")}],
+        "depth": 3})
+    assert status == 200 and contentType == "application/x-ndjson"
+    lines = sorted((json.loads(line) for line in body.splitlines()), key=lambda line: line["index"])
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert [line["fen"] for line in lines] == [MATE_IN_ONE, START, MATE_IN_ONE.replace(" 1", " 9")]
+    assert lines[0]["bestmove"] == lines[2]["bestmove"] == "a1a8"
+    assert not lines[0]["cached"] and lines[2]["cached"]  # the same position twice is searched once
+    # a repeated request is answered from the cache
+    _, _, _, body = request(server, "POST", "/analyse", {"fen": MATE_IN_ONE, "depth": 3})
+    assert json.loads(body)["cached"]
+    status, _, _, body = request(server, "GET", "/status")
+    assert status == 200 and json.loads(body)["pending"] == 0 and json.loads(body)["searches"] == 2
+
+
+def test_errors(server):
+    status, _, _, body = request(server, "POST", "/analyse")
+    assert status == 400 and "error" in json.loads(body)
+    assert request(server, "POST", "/analyse", {"fen": "not a fen"})[0] == 400
+    assert request(server, "POST", "/analyse", {"fen": "4k2P/8/8/8/8/8/8/4K3 w - - 0 1"})[0] == 400
+    assert request(server, "GET", "/analyse")[0] == 404
+    assert request(server, "POST", "/status", {})[0] == 404
+    # more positions than the queue takes
+    status, _, retryAfter, _ = request(server, "POST", "/analyse", {"positions": [{"fen": START}] * 4, "depth": 1})
+    assert status == 503 and retryAfter == "1"
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+import Bitbases
+import ChessEngine
+from Constants import BITBASE_DIRECTORY
+
+# white: king f6, queen g6 / black: king h8 - and the same position with the colours swapped and the board mirrored
+QUEEN_INDEX = Bitbases.position_index(0, 2 * 8 + 5, 0 * 8 + 7, 2 * 8 + 6)
+
+
+@pytest.fixture
+def fake_bitbases(tmp_path, monkeypatch):
+    # a KQK table in which only QUEEN_INDEX is won, and no KRK or KPK table
+    bits = bytearray(Bitbases.POSITION_COUNT // 8)
+    bits[QUEEN_INDEX >> 3] |= 1 << (QUEEN_INDEX & 7)
+    (tmp_path / "KQK.bb").write_bytes(bits)
+    monkeypatch.setattr(Bitbases, "bitbases", None)
+    loaded = Bitbases.load_bitbases(str(tmp_path))
+    yield
+    for bitbase in loaded.values():
+        bitbase.close()
+
+
+@pytest.mark.parametrize("fen, result", [
+    ("7k/8/5KQ1/8/8/8/8/8 w - - 0 1", 1),
+    ("7k/8/5KQ1/8/8/8/8/8 b - - 0 1", 0),  # weak side to move - not in the table
+    ("8/8/8/8/8/5kq1/8/7K b - - 0 1", -1),  # black strong - probed mirrored
+    ("8/8/8/8/8/5kq1/8/7K w - - 0 1", 0),
+    ("7k/8/5KQ1/8/8/8/8/8 w - - 0 1".replace("Q", "B"), 0),  # a lone minor piece can not win
+    ("7k/8/5KR1/8/8/8/8/8 w - - 0 1", None),  # no KRK table
+    ("7k/8/5KQ1/8/8/8/8/7p w - - 0 1", None),  # not three pieces
+])
+def test_probe(fake_bitbases, fen, result):
+    assert Bitbases.probe(ChessEngine.GameState(fen)) == result
+
+
+def test_bitbase_directory_next_to_code():
+    assert os.path.dirname(BITBASE_DIRECTORY) == os.path.dirname(os.path.abspath(Bitbases.__file__))
+
+
+@pytest.mark.skipif(not os.path.isfile(os.path.join(BITBASE_DIRECTORY, "KPK.bb")),
+                    reason="bitbases not generated (python Bitbases.py)")
+@pytest.mark.parametrize("fen, result", [
+    ("8/8/8/8/8/2k5/8/4K2Q w - - 0 1", 1),
+    ("8/8/8/8/8/2k5/8/4K2Q b - - 0 1", 1),
+    ("8/8/8/4k3/8/8/4P3/4K3 b - - 0 1", 0),  # the king in front of the pawn holds the draw
+    ("8/8/8/8/8/4k3/4P3/4K3 w - - 0 1", 0),
+    ("4k3/8/4K3/4P3/8/8/8/8 w - - 0 1", 1),  # the king in front of its pawn with the opposition wins
+])
+def test_generated_bitbases(fen, result, monkeypatch):
+    monkeypatch.setattr(Bitbases, "bitbases", None)
+    assert Bitbases.probe(ChessEngine.GameState(fen)) == result
@@ -0,0 +1,55 @@
+import pytest
+
+import ChessEngine
+from EpdSuite import find_notated_move, get_san, parse_epd, read_epd, solve_position
+from Perft import BACKENDS
+
+MATE_IN_ONE = "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - -"
+
+
+def test_parse_epd():
+    assert parse_epd('2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";') == \
+        ("WAC.001", "2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1", ["Qg6"], [])
+    assert parse_epd(MATE_IN_ONE + ' am Kf1 Kh1; bm Ra8#; hmvc 12; fmvn 40; c0 "a; b";') == \
+        (MATE_IN_ONE, MATE_IN_ONE + " 12 40", ["Ra8#"], ["Kf1", "Kh1"])
+    for line in ["", "# comment", MATE_IN_ONE, MATE_IN_ONE + ' id "no bm";']:
+        assert parse_epd(line) is None
+
+
+def test_read_epd(tmp_path):
+    path = tmp_path / "suite.epd"
+    path.write_text("# mates\n\n" + MATE_IN_ONE + ' bm Ra8#; id "m1";\n' + MATE_IN_ONE + ' id "x";\n')
+    assert [entry[0] for entry in read_epd(str(path))] == ["m1"]
+
+
+@pytest.mark.parametrize("fen, notations", [
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", {"e1g1": "O-O", "e1c1": "O-O-O", "a1a8": "Rxa8"}),
+    ("4k3/P7/8/3p4/4P3/8/8/4K3 w - - 0 1", {"a7a8q": "a8=Q", "a7a8n": "a8=N", "e4d5": "exd5", "e4e5": "e5"}),
+    ("4k3/8/8/8/8/8/8/1N1K1N2 w - - 0 1", {"b1d2": "Nbd2", "f1d2": "Nfd2", "b1c3": "Nc3"}),
+    ("4k3/8/8/R7/8/8/8/R3K3 w - - 0 1", {"a1a3": "R1a3", "a5a3": "R5a3"}),
+    ("6k1/8/8/8/8/Q7/8/Q1Q4K w - - 0 1", {"a1b2": "Qa1b2", "a3b2": "Q3b2", "c1b2": "Qcb2"}),
+])
+def test_san(fen, notations):
+    validMoves = ChessEngine.GameState(fen).get_all_valid_moves()
+    for uci, san in notations.items():
+        move = next(move for move in validMoves if move.get_chess_notation() == uci)
+        assert get_san(move, validMoves) == san
+        assert find_notated_move(san, validMoves) == move
+        assert find_notated_move(uci, validMoves) == move
+
+
+def test_find_notated_move_annotations():
+    validMoves = ChessEngine.GameState("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1").get_all_valid_moves()
+    assert find_notated_move("0-0!", validMoves).get_chess_notation() == "e1g1"
+    assert find_notated_move("Rxa8+", validMoves).get_chess_notation() == "a1a8"
+    assert find_notated_move("Nf3", validMoves) is None
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_solve_position(backend):
+    epdId, solved, played, solvedAt, stats, depth = solve_position(parse_epd(MATE_IN_ONE + ' bm Ra8#; id "m1";'),
+                                                                   1.0, 3, backend)
+    assert (epdId, solved, played) == ("m1", True, "Ra8")
+    assert solvedAt is not None and depth >= 1 and stats.nodes > 0
+    _, solved, played, solvedAt, _, _ = solve_position(parse_epd(MATE_IN_ONE + ' am Ra8; id "m1";'), 1.0, 3, backend)
+    assert (solved, played, solvedAt) == (False, "Ra8", None)
@@ -0,0 +1,47 @@
+import pytest
+
+import ChessEngine
+from BitboardEngine import BitboardGameState
+from Constants import START_FEN
+from Perft import PERFT_POSITIONS
+
+BACKENDS = [ChessEngine.GameState, BitboardGameState]
+
+
+@pytest.mark.parametrize("fen", [START_FEN] + [fen for _, fen, _ in PERFT_POSITIONS])
+def test_fen_round_trip(fen):
+    assert ChessEngine.GameState(fen).get_fen() == fen
+
+
+def test_fen_after_moves_loads_the_same_position():
+    currState = ChessEngine.GameState()
+    for notation in ["e2e4", "c7c5", "g1f3", "d7d6", "e1e2", "c5c4", "d2d4"]:
+        move = next(move for move in currState.get_all_valid_moves() if move.get_chess_notation() == notation)
+        currState.make_move(move)
+    loaded = ChessEngine.GameState(currState.get_fen())
+    assert loaded.get_fen() == currState.get_fen() == "rnbqkbnr/pp2pppp/3p4/8/2pPP3/5N2/PPP1KPPP/RNBQ1B1R b kq d3 0 4"
+    assert loaded.zobristKey == currState.zobristKey
+    assert loaded.castlingRights == currState.castlingRights
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_castling_rights_need_king_and_rook_at_home(backend):
+    currState = backend("4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1")
+    assert currState.castlingRights == 0
+    assert not any(move.isCastleMove for move in currState.get_all_valid_moves())
+    assert backend("r3k2r/8/8/8/8/8/8/R3K3 w KQkq - 0 1").get_fen() == "r3k2r/8/8/8/8/8/8/R3K3 w Qkq - 0 1"
+    assert backend("r3k2r/8/8/8/8/8/8/R4K1R w KQkq - 0 1").get_fen() == "r3k2r/8/8/8/8/8/8/R4K1R w kq - 0 1"
+
+
+@pytest.mark.parametrize("fen, expected", [
+    ("rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3", "d6"),
+    ("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1", "e3"),
+    ("rnbqkbnr/pppppppp/8/4P3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3", "-"),  # no pawn on d5
+    ("rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR b KQkq d6 0 3", "-"),  # wrong side to move
+    ("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e6 0 1", "-"),  # wrong rank
+])
+def test_en_passant_square_is_validated(fen, expected):
+    currState = ChessEngine.GameState(fen)
+    assert currState.get_fen().split()[3] == expected
+    enPassantCaptures = [move for move in currState.get_all_valid_moves() if move.isEnPassant]
+    assert len(enPassantCaptures) == (1 if fen.startswith("rnbqkbnr/ppp1pppp") and expected != "-" else 0)
@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+import ChessEngine
+from BitboardEngine import BitboardGameState
+from Perft import PERFT_POSITIONS
+
+BACKENDS = [ChessEngine.GameState, BitboardGameState]
+
+
+def play(currState, notations):
+    for notation in notations.split():
+        move = next(move for move in currState.get_all_valid_moves() if move.get_chess_notation() == notation)
+        currState.make_move(move)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_threefold_repetition_by_knight_shuffles(backend):
+    currState = backend()
+    play(currState, "g1f3 g8f6 f3g1 f6g8")
+    assert currState.get_repetition_count() == 2 and not currState.repetition
+    play(currState, "g1f3 g8f6 f3g1")
+    assert not currState.repetition
+    play(currState, "f6g8")
+    assert currState.get_repetition_count() == 3 and currState.repetition
+    currState.undo_move()
+    assert not currState.repetition
+    play(currState, "f6g8")
+    assert currState.repetition
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_repetition_needs_the_same_castling_rights(backend):
+    currState = backend("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    play(currState, "e1f1 e8f8 f1e1 f8e8")  # same pieces on the same squares, but no castling rights left
+    play(currState, "e1f1 e8f8 f1e1 f8e8")
+    assert currState.get_repetition_count() == 2 and not currState.repetition
+
+
+# (fen, move, fen after the move) - castling, en passant and promotions, with and without a capture
+MOVES = [
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1", "r3k2r/8/8/8/8/8/8/R4RK1 b kq - 1 1"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1c1", "r3k2r/8/8/8/8/8/8/2KR3R b kq - 1 1"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8g8", "r4rk1/8/8/8/8/8/8/R3K2R w KQ - 1 2"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8", "2kr3r/8/8/8/8/8/8/R3K2R w KQ - 1 2"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "a1a8", "R3k2r/8/8/8/8/8/8/4K2R b Kk - 0 1"),
+    ("rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3", "e5d6",
+     "rnbqkbnr/ppp1pppp/3P4/8/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 3"),
+    ("rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 2", "e4d3",
+     "rnbqkbnr/pppp1ppp/8/8/8/3p4/PPP1PPPP/RNBQKBNR w KQkq - 0 3"),
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", "e2e4",
+     "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"),
+    ("r3k3/1P6/8/8/8/8/8/4K3 w q - 0 1", "b7b8q", "rQ2k3/8/8/8/8/8/8/4K3 b q - 0 1"),
+    ("r3k3/1P6/8/8/8/8/8/4K3 w q - 0 1", "b7a8n", "N3k3/8/8/8/8/8/8/4K3 b - - 0 1"),
+    ("4k3/8/8/8/8/8/6p1/4K2R b K - 0 1", "g2h1q", "4k3/8/8/8/8/8/8/4K2q w - - 0 2"),
+]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fen, notation, fenAfter", MOVES)
+def test_undo_move_restores_the_position(backend, fen, notation, fenAfter):
+    currState = backend(fen)
+    before = (currState.get_fen(), currState.castlingRights, currState.enPassantPossible, currState.zobristKey,
+              [row[:] for row in currState.board])
+    play(currState, notation)
+    assert currState.get_fen() == fenAfter
+    assert currState.zobristKey == currState.compute_zobrist_key() == backend(fenAfter).zobristKey
+    currState.undo_move()
+    assert (currState.get_fen(), currState.castlingRights, currState.enPassantPossible, currState.zobristKey,
+            currState.board) == before
+    assert currState.moveLog == []
+
+
+def assert_incremental_state(currState):
+    assert currState.zobristKey == currState.compute_zobrist_key()
+    assert (currState.mgScore, currState.egScore, currState.phase) == currState.compute_evaluation()
+
+
+PLAYOUT_FENS = [fen for _, fen, _ in PERFT_POSITIONS] + [
+    "rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3",
+    "rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 2"]
+
+
+'''
+    Random playouts that take back a move now and then - after every make_move and undo_move the incrementally
+    updated zobrist key and evaluation must equal the ones computed from scratch, and every undo must give back the
+    position before the move
+'''
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("seed", range(4))
+def test_random_playouts_keep_incremental_state(backend, seed):
+    rng = random.Random(seed)
+    seen = {"capture": 0, "castle": 0, "en passant": 0, "promotion": 0}
+    for fen in PLAYOUT_FENS:
+        currState = backend(fen)
+        fens = []
+        for _ in range(60):
+            validMoves = currState.get_all_valid_moves()
+            if len(fens) != 0 and (len(validMoves) == 0 or rng.random() < 0.25):
+                currState.undo_move()
+                assert currState.get_fen() == fens.pop()
+                assert_incremental_state(currState)
+                continue
+            if len(validMoves) == 0:
+                break
+            # special moves are rare in random play - always play one when there is any
+            specialMoves = [move for move in validMoves if move.isCastleMove or move.isEnPassant or
+                            move.isPawnPromotion]
+            move = rng.choice(specialMoves if len(specialMoves) != 0 else validMoves)
+            seen["capture"] += move.pieceCaptured != "--"
+            seen["castle"] += move.isCastleMove
+            seen["en passant"] += move.isEnPassant
+            seen["promotion"] += move.isPawnPromotion
+            fens.append(currState.get_fen())
+            currState.make_move(move)
+            assert_incremental_state(currState)
+        while len(fens) != 0:
+            currState.undo_move()
+            assert currState.get_fen() == fens.pop()
+            assert_incremental_state(currState)
+        assert currState.get_fen() == backend(fen).get_fen()
+    assert all(count > 0 for count in seen.values()), seen
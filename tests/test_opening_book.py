@@ -0,0 +1,60 @@
+import os
+import random
+
+import pytest
+
+import ChessEngine
+from Constants import BOOK_PATH
+from OpeningBook import OpeningBook, build_book, polyglot_key
+
+# keys from the Polyglot format description - the en passant file counts after f7f5 (a white pawn on e5 can capture)
+# and after c2c4 (a black pawn on b4), but not after e2e4
+POLYGLOT_KEYS = [
+    ("", 0x463b96181691fc9c),
+    ("e2e4", 0x823c9b50fd114196),
+    ("e2e4 d7d5", 0x0756b94461c50fb0),
+    ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560),
+]
+
+
+def play(moves):
+    currState = ChessEngine.GameState()
+    for notation in moves.split():
+        currState.make_move(next(move for move in currState.get_all_valid_moves()
+                                 if move.get_chess_notation() == notation))
+    return currState
+
+
+@pytest.mark.parametrize("moves, key", POLYGLOT_KEYS)
+def test_polyglot_key(moves, key):
+    assert polyglot_key(play(moves)) == key
+    assert polyglot_key(ChessEngine.GameState(play(moves).get_fen())) == key
+
+
+def test_build_and_look_up(tmp_path):
+    path = str(tmp_path / "book.bin")
+    games = [["e2e4", "e7e5", "g1f3"], ["e2e4", "c7c5"], ["e2e4", "e7e5", "f1c4"], ["d2d4", "d7d5"],
+             ["e2e4", "e7e5", "g1f3"]]
+    assert build_book(games, path) == 7
+    book = OpeningBook(path)
+    try:
+        currState = ChessEngine.GameState()
+        assert book.find_move(currState, currState.get_all_valid_moves(), weighted=False).get_chess_notation() == "e2e4"
+        currState = play("e2e4 e7e5")
+        assert book.find_move(currState, currState.get_all_valid_moves(), weighted=False).get_chess_notation() == "g1f3"
+        rng = random.Random(1)
+        assert {book.find_move(currState, currState.get_all_valid_moves(), rng=rng).get_chess_notation()
+                for _ in range(50)} == {"g1f3", "f1c4"}
+        currState = play("g1f3")
+        assert book.find_move(currState, currState.get_all_valid_moves()) is None
+    finally:
+        book.close()
+
+
+def test_book_path_next_to_code():
+    assert os.path.dirname(BOOK_PATH) == os.path.dirname(os.path.abspath(ChessEngine.__file__))
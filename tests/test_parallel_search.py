@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+import ChessAI
+import ChessEngine
+
+# positions with a single best move at depth 3
+POSITIONS = [
+    "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1",  # back rank mate
+    "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",  # scholar's mate
+    "4k3/8/8/3q4/8/8/3R4/3RK3 w - - 0 1",  # the queen hangs
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def search_pool():
+    yield
+    ChessAI.shutdown_search_pool()
+
+
+@pytest.mark.parametrize("fen", POSITIONS)
+def test_matches_serial_search(fen):
+    currState = ChessEngine.GameState(fen)
+    ChessAI.transpositionTable.clear()
+    serialMove, serialStats = ChessAI.find_best_move_nega_max_alpha_beta(currState, currState.get_all_valid_moves(), 3)
+    ChessAI.transpositionTable.clear()
+    move, stats = ChessAI.find_best_move_parallel(currState, currState.get_all_valid_moves(), moveTime=None,
+                                                  maxDepth=3, workers=2)
+    assert move == serialMove
+    assert stats.iterations[-1][1] == serialStats.iterations[-1][1]
+    assert currState.get_fen() == ChessEngine.GameState(fen).get_fen()
+
+
+def test_move_time():
+    currState = ChessEngine.GameState(POSITIONS[3])
+    validMoves = currState.get_all_valid_moves()
+    ChessAI.get_search_pool(2)  # started beforehand - starting the processes is not part of the search
+    startTime = time.perf_counter()
+    move, _ = ChessAI.find_best_move_parallel(currState, validMoves, moveTime=0.3, workers=2)
+    assert time.perf_counter() - startTime < 2
+    assert move in validMoves
+
+
+def test_stop_event():
+    currState = ChessEngine.GameState(POSITIONS[3])
+    validMoves = currState.get_all_valid_moves()
+    stopEvent = threading.Event()
+    threading.Timer(0.3, stopEvent.set).start()
+    startTime = time.perf_counter()
+    move, _ = ChessAI.find_best_move_parallel(currState, validMoves, moveTime=None, stopEvent=stopEvent, workers=2)
+    assert time.perf_counter() - startTime < 2
+    assert move in validMoves
+    assert currState.get_fen() == ChessEngine.GameState(POSITIONS[3]).get_fen()
@@ -0,0 +1,38 @@
+import pytest
+
+import ChessEngine
+from Perft import BACKENDS, PERFT_POSITIONS, perft
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+@pytest.mark.parametrize("name, fen, expectedCounts", PERFT_POSITIONS, ids=[name for name, _, _ in PERFT_POSITIONS])
+def test_perft(backend, name, fen, expectedCounts):
+    currState = BACKENDS[backend](fen)
+    for depth in (1, 2, 3):
+        assert perft(currState, depth) == expectedCounts[depth - 1]
+    assert currState.get_fen() == BACKENDS[backend](fen).get_fen()  # every move was taken back
+
+
+# the staged move picker yields exactly the legal moves, each once, and sets checkmate/stalemate like
+# get_all_valid_moves
+def staged_moves_match(currState, depth):
+    validMoves = currState.get_all_valid_moves()
+    checkmate, stalemate = currState.checkmate, currState.stalemate
+    hashMove = validMoves[-1] if len(validMoves) != 0 else None
+    stagedMoves = list(currState.get_staged_moves(hashMove))
+    assert sorted(move.moveID for move in stagedMoves) == sorted(move.moveID for move in validMoves)
+    assert (currState.checkmate, currState.stalemate) == (checkmate, stalemate)
+    if depth > 1:
+        for move in validMoves:
+            currState.make_move(move)
+            staged_moves_match(currState, depth - 1)
+            currState.undo_move()
+
+
+STAGED_MOVE_POSITIONS = [(name, fen) for name, fen, _ in PERFT_POSITIONS] + \
+                        [("checkmate", "R5k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1"), ("stalemate", "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")]
+
+
+@pytest.mark.parametrize("name, fen", STAGED_MOVE_POSITIONS, ids=[name for name, _ in STAGED_MOVE_POSITIONS])
+def test_staged_moves(name, fen):
+    staged_moves_match(ChessEngine.GameState(fen), 2)
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+import ChessAI
+import ChessEngine
+from Perft import PERFT_POSITIONS
+from SearchStats import SearchProfiler
+
+
+@pytest.mark.parametrize("name, fen, expectedCounts", PERFT_POSITIONS, ids=[name for name, _, _ in PERFT_POSITIONS])
+def test_tiny_move_time_returns_legal_move(name, fen, expectedCounts):
+    currState = ChessEngine.GameState(fen)
+    validMoves = currState.get_all_valid_moves()
+    move, _ = ChessAI.find_best_move_iterative_deepening(currState, validMoves, moveTime=1e-9)
+    assert move in validMoves
+    assert currState.get_fen() == ChessEngine.GameState(fen).get_fen()  # the interrupted search was taken back
+
+
+def test_stopped_search_returns_legal_move():
+    currState = ChessEngine.GameState()
+    validMoves = currState.get_all_valid_moves()
+    stopEvent = threading.Event()
+    stopEvent.set()
+    move, _ = ChessAI.find_best_move_iterative_deepening(currState, validMoves, moveTime=None, stopEvent=stopEvent)
+    assert move in validMoves
+
+
+def test_no_legal_moves_returns_none():
+    currState = ChessEngine.GameState("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")  # stalemate
+    move, _ = ChessAI.find_best_move_iterative_deepening(currState, currState.get_all_valid_moves(), moveTime=1)
+    assert move is None
+
+
+def test_finds_mate_in_one():
+    currState = ChessEngine.GameState("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    move, _ = ChessAI.find_best_move_iterative_deepening(currState, currState.get_all_valid_moves(), moveTime=None,
+                                                         maxDepth=2)
+    assert move.get_chess_notation() == "a1a8"
+
+
+def test_search_returns_its_stats():
+    currState = ChessEngine.GameState()
+    move, stats = ChessAI.find_best_move_iterative_deepening(currState, currState.get_all_valid_moves(), moveTime=None,
+                                                             maxDepth=3)
+    assert [depth for depth, _, _, _, _ in stats.iterations] == [1, 2, 3]
+    assert stats.iterations[-1][2] == move
+    assert stats.nodes >= stats.iterations[-1][3] > 0
+    nodes = stats.nodes
+    _, otherStats = ChessAI.find_best_move_iterative_deepening(currState, currState.get_all_valid_moves(),
+                                                               moveTime=None, maxDepth=1)
+    assert otherStats is not stats and stats.nodes == nodes  # a later search leaves the stats of this one alone
+
+
+@pytest.mark.parametrize("search", [ChessAI.find_best_move_min_max, ChessAI.find_best_move_nega_max])
+def test_simple_searches_return_their_stats(search):
+    currState = ChessEngine.GameState("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    move, stats = search(currState, currState.get_all_valid_moves())
+    assert stats.iterations[-1][2] == move
+    assert stats.nodes > 0
+
+
+def test_profiler_accounts_for_the_search_time():
+    currState = ChessEngine.GameState("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    ChessAI.searchHook = SearchProfiler()
+    try:
+        startTime = time.perf_counter()
+        _, stats = ChessAI.find_best_move_iterative_deepening(currState, currState.get_all_valid_moves(),
+                                                              moveTime=None, maxDepth=3)
+        wallTime = time.perf_counter() - startTime
+    finally:
+        ChessAI.searchHook = None
+    assert "get_staged_moves" not in currState.__dict__  # the profiler unwrapped the methods
+    measured = sum(seconds for category, seconds in stats.timings.items() if category != "search")
+    assert stats.timings["move generation"] > 0 and stats.timings["evaluation"] > 0
+    assert measured <= stats.elapsed <= wallTime
+    assert sum(stats.timings.values()) == pytest.approx(wallTime, rel=0.1)
+
+
+@pytest.mark.parametrize("fen, depth, notation, movesToMate", [
+    ("k7/8/1K6/8/8/8/8/7R w - - 0 1", 3, "h1h8", 1),  # mates in 2 and 3 too - the shortest one is played
+    ("k7/8/2K5/8/8/8/8/7R w - - 0 1", 4, None, 2),
+    ("k7/8/1K6/8/8/8/8/7R b - - 0 1", 3, "a8b8", -1),  # mated after the only move
+])
+def test_mate_scores_count_the_plies_to_the_mate(fen, depth, notation, movesToMate):
+    for _ in range(3):  # the root moves are shuffled
+        ChessAI.transpositionTable.clear()
+        currState = ChessEngine.GameState(fen)
+        move, stats = ChessAI.find_best_move_nega_max_alpha_beta(currState, currState.get_all_valid_moves(), depth)
+        score = stats.iterations[-1][1]
+        assert notation is None or move.get_chess_notation() == notation
+        assert score == (ChessAI.CHECKMATE_SCORE - 2 * movesToMate + 1 if movesToMate > 0
+                         else -ChessAI.CHECKMATE_SCORE + 2 * -movesToMate)
+        assert ChessAI.moves_to_mate(score) == movesToMate
@@ -0,0 +1,69 @@
+import struct
+
+import pytest
+
+import ChessEngine
+from SelfPlay import (MATE_SCORE_CP, RECORD_FORMAT, RECORD_SIZE, SHARD_NAME, PositionDataset, decode_board,
+                      pack_record, position_fields, run_self_play, score_to_cp, shard_paths)
+
+FENS = ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w Kq - 0 1",
+        "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 7 30"]
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_record_round_trip(fen):
+    currState = ChessEngine.GameState(fen)
+    record = pack_record(position_fields(currState, -123), -1)
+    assert len(record) == RECORD_SIZE
+    occupancy, pieces, flags, enPassantCol, score, result, fiftyMoveCount, _ = struct.unpack(RECORD_FORMAT, record)
+    assert decode_board(occupancy, pieces) == currState.board
+    assert (flags & 1) == currState.whiteToMove and flags >> 1 == currState.castlingRights
+    assert enPassantCol == (currState.enPassantPossible[1] + 1 if currState.enPassantPossible != () else 0)
+    assert (score, result, fiftyMoveCount) == (-123, -1, currState.fiftyMoveCount)
+
+
+def test_score_to_cp():
+    assert score_to_cp(1.5, True) == 150 and score_to_cp(1.5, False) == -150
+    assert score_to_cp(-1000, True) == -MATE_SCORE_CP
+
+
+def test_position_dataset(tmp_path):
+    records = [pack_record(position_fields(ChessEngine.GameState(fen), i), 1) for i, fen in enumerate(FENS)]
+    path = tmp_path / "shard.bin"
+    path.write_bytes(b"".join(records) + b"\0" * (RECORD_SIZE // 2))  # a record cut short is ignored
+    dataset = PositionDataset(str(path))
+    try:
+        assert len(dataset) == len(FENS)
+        assert [dataset[i][4] for i in range(len(FENS))] == list(range(len(FENS)))
+        assert [fields[4] for fields in dataset] == list(range(len(FENS)))
+        assert decode_board(*dataset[2][:2]) == ChessEngine.GameState(FENS[2]).board
+        with pytest.raises(IndexError):
+            dataset[len(FENS)]
+        with pytest.raises(IndexError):
+            dataset[-1]
+    finally:
+        dataset.close()
+    emptyPath = tmp_path / "empty.bin"
+    emptyPath.write_bytes(b"")
+    emptyDataset = PositionDataset(str(emptyPath))
+    assert len(emptyDataset) == 0 and list(emptyDataset) == []
+    emptyDataset.close()
+
+
+def test_resume_generates_missing_shards(tmp_path):
+    existingShard = pack_record(position_fields(ChessEngine.GameState(FENS[0]), 0), 0)
+    (tmp_path / (SHARD_NAME % 0)).write_bytes(existingShard)
+    (tmp_path / ((SHARD_NAME % 1) + ".tmp")).write_bytes(b"partial")
+    (tmp_path / ((SHARD_NAME % 7) + ".tmp")).write_bytes(b"partial")
+    positionCount = run_self_play(str(tmp_path), games=2, gamesPerShard=1, depth=1, randomPlies=12)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [SHARD_NAME % 0, SHARD_NAME % 1]
+    assert (tmp_path / (SHARD_NAME % 0)).read_bytes() == existingShard  # complete shards are kept
+    assert len(shard_paths(str(tmp_path))) == 2
+    newShard = PositionDataset(str(tmp_path / (SHARD_NAME % 1)))
+    try:
+        assert len(newShard) == positionCount > 0
+        assert all(fields[5] in (-1, 0, 1) for fields in newShard)
+    finally:
+        newShard.close()
@@ -0,0 +1,67 @@
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, DEPTH, SCORE, BOUND, MOVE, \
+    MATE_THRESHOLD
+
+
+# a table with a single bucket, so every key competes for the same two slots
+def single_bucket_table():
+    table = TranspositionTable(0)
+    assert table.numBuckets == 1
+    return table
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    table.store(12345, 4, 0.5, LOWER_BOUND, "e2e4")
+    entry = table.probe(12345)
+    assert (entry[DEPTH], entry[SCORE], entry[BOUND], entry[MOVE]) == (4, 0.5, LOWER_BOUND, "e2e4")
+    assert table.probe(12345 + table.numBuckets) is None  # same bucket, other key
+
+
+def test_depth_preferred_slot_keeps_deepest_entry():
+    table = single_bucket_table()
+    table.store(1, 6, 1.0, EXACT, None)
+    table.store(2, 3, 2.0, EXACT, None)  # shallower - goes to the always-replace slot
+    assert table.probe(1)[DEPTH] == 6 and table.probe(2)[DEPTH] == 3
+    table.store(3, 2, 3.0, EXACT, None)  # replaces the always-replace slot
+    assert table.probe(1) is not None and table.probe(2) is None and table.probe(3) is not None
+    table.store(4, 7, 4.0, EXACT, None)  # deeper - takes the depth-preferred slot
+    assert table.probe(4) is not None and table.probe(1) is None
+
+
+def test_same_key_is_replaced_whatever_its_depth():
+    table = single_bucket_table()
+    table.store(1, 6, 1.0, EXACT, None)
+    table.store(1, 2, -1.0, UPPER_BOUND, None)
+    assert (table.probe(1)[DEPTH], table.probe(1)[BOUND]) == (2, UPPER_BOUND)
+
+
+def test_entries_of_older_searches_are_replaced():
+    table = single_bucket_table()
+    table.store(1, 6, 1.0, EXACT, None)
+    table.new_search()
+    table.store(2, 1, 2.0, EXACT, None)
+    assert table.probe(2)[DEPTH] == 1 and table.probe(1) is None
+
+
+def test_clear_and_hashfull():
+    table = TranspositionTable(1)
+    assert table.hashfull() == 0
+    for key in range(table.numBuckets):
+        table.store(key, 1, 0.0, EXACT, None)
+    assert table.hashfull() == 1000
+    table.new_search()
+    assert table.hashfull() == 0  # only entries of the current search count
+    table.clear()
+    assert table.probe(0) is None
+
+
+def test_mate_scores_are_stored_relative_to_the_position():
+    table = TranspositionTable(1)
+    mateScore = MATE_THRESHOLD + 50  # a mate found 3 plies below the root is 50 + 3 plies from this position
+    table.store(1, 4, mateScore, EXACT, None, 3)
+    table.store(2, 4, -mateScore, EXACT, None, 3)
+    table.store(3, 4, 1.5, EXACT, None, 3)
+    assert table.probe(1, 3)[SCORE] == mateScore and table.probe(1, 5)[SCORE] == mateScore - 2
+    assert table.probe(2, 3)[SCORE] == -mateScore and table.probe(2, 1)[SCORE] == -mateScore - 2
+    assert table.probe(3, 5)[SCORE] == 1.5
+    assert table.probe(1, 5)[DEPTH] == 4 and table.probe(1)[SCORE] == mateScore + 3
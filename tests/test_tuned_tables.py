@@ -0,0 +1,29 @@
+import copy
+import json
+import os
+
+import PieceSquareTables
+from Constants import TUNED_TABLES_PATH
+
+
+def test_tuned_tables_path_next_to_code():
+    assert os.path.dirname(TUNED_TABLES_PATH) == os.path.dirname(os.path.abspath(PieceSquareTables.__file__))
+
+
+def test_load_tuned_tables(tmp_path, monkeypatch):
+    tables = {"mgPieceValue": dict(PieceSquareTables.MG_PIECE_VALUE, N=350),
+              "egPieceValue": dict(PieceSquareTables.EG_PIECE_VALUE),
+              "mgPst": copy.deepcopy(PieceSquareTables.MG_PST), "egPst": copy.deepcopy(PieceSquareTables.EG_PST)}
+    path = tmp_path / "tuned_tables.json"
+    path.write_text(json.dumps(tables))
+    for name in ("MG_PIECE_VALUE", "EG_PIECE_VALUE", "MG_PST", "EG_PST"):  # restored by monkeypatch afterwards
+        monkeypatch.setattr(PieceSquareTables, name, copy.deepcopy(getattr(PieceSquareTables, name)))
+    knightScore = PieceSquareTables.MG_SQUARE_SCORES["wN"][0]
+    try:
+        assert not PieceSquareTables.load_tuned_tables(str(tmp_path / "missing.json"))
+        assert PieceSquareTables.load_tuned_tables(str(path))
+        assert PieceSquareTables.MG_SQUARE_SCORES["wN"][0] == knightScore + 30
+    finally:
+        monkeypatch.undo()
+        PieceSquareTables.rebuild_square_scores()
+    assert PieceSquareTables.MG_SQUARE_SCORES["wN"][0] == knightScore
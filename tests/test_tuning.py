@@ -0,0 +1,58 @@
+import random
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import ChessEngine
+import Tuning
+from Perft import PERFT_POSITIONS
+from PieceSquareTables import TOTAL_PHASE
+from SelfPlay import RECORD_FORMAT, decode_board, pack_record, position_fields
+
+
+# the perft positions and positions reached from them by random moves, with captures, promotions and endgames
+def sample_states():
+    rng = random.Random(7)
+    states = []
+    for _, fen, _ in PERFT_POSITIONS:
+        currState = ChessEngine.GameState(fen)
+        for _ in range(40):
+            states.append(ChessEngine.GameState(currState.get_fen()))
+            validMoves = currState.get_all_valid_moves()
+            if len(validMoves) == 0:
+                break
+            currState.make_move(rng.choice(validMoves))
+    return states
+
+
+def write_shards(directory, states, shardCount):
+    records = [pack_record(position_fields(currState, 0), 0) for currState in states]
+    for i in range(shardCount):
+        (directory / ("shard_%05d.bin" % i)).write_bytes(b"".join(records[i::shardCount]))
+    return [state for i in range(shardCount) for state in states[i::shardCount]]  # in the order they are loaded
+
+
+def test_decode_squares_matches_decode_board(tmp_path):
+    states = write_shards(tmp_path, sample_states(), 1)
+    squares = Tuning.decode_squares(Tuning.load_records(str(tmp_path))[0])
+    for currState, pieceCodes in zip(states, squares):
+        record = pack_record(position_fields(currState, 0), 0)
+        occupancy, pieces = struct.unpack(RECORD_FORMAT, record)[:2]
+        board = decode_board(occupancy, pieces)
+        assert [Tuning.CODE_PIECES.get(code, "--") for code in pieceCodes] == [piece for row in board for piece in row]
+
+
+def test_evaluate_matches_tapered_score(tmp_path, monkeypatch):
+    monkeypatch.setattr(Tuning, "CHUNK_SIZE", 16)  # several chunks per shard
+    states = write_shards(tmp_path, sample_states(), 3)
+    shards = Tuning.load_records(str(tmp_path))
+    assert len(shards) == 3
+    batch = Tuning.FeatureBatch(shards)
+    assert batch.size == len(states)
+    scores = Tuning.evaluate(Tuning.current_weights(), batch)
+    for currState, score in zip(states, scores):
+        mgScore, egScore, phase = currState.compute_evaluation()
+        phase = min(phase, TOTAL_PHASE)
+        assert score == pytest.approx((mgScore * phase + egScore * (TOTAL_PHASE - phase)) / TOTAL_PHASE, abs=1e-3)
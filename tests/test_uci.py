@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+import ChessAI
+import ChessEngine
+from UCI import UciEngine
+
+MATE_IN_ONE = "6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1"
+
+
+# output stream of the engine - collects the lines written from the main and the search thread
+class Output:
+    def __init__(self):
+        self.text = ""
+        self.condition = threading.Condition()
+
+    def write(self, text):
+        with self.condition:
+            self.text += text
+            self.condition.notify_all()
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        with self.condition:
+            return self.text.splitlines()
+
+    # the first line starting with prefix, waiting up to timeout seconds for it - None if it does not come
+    def wait_for(self, prefix, timeout=30):
+        with self.condition:
+            self.condition.wait_for(lambda: any(line.startswith(prefix) for line in self.text.splitlines()), timeout)
+            return next((line for line in self.text.splitlines() if line.startswith(prefix)), None)
+
+
+@pytest.fixture
+def engine():
+    output = Output()
+    uciEngine = UciEngine(output)
+    uciEngine.handle("setoption name OwnBook value false")
+    yield uciEngine, output
+    uciEngine.handle("quit")
+
+
+def legal_moves(uciEngine):
+    return [move.get_chess_notation() for move in uciEngine.currState.get_all_valid_moves()]
+
+
+def test_handshake(engine):
+    uciEngine, output = engine
+    uciEngine.handle("uci")
+    uciEngine.handle("isready")
+    lines = output.lines()
+    assert lines[0].startswith("id name ")
+    assert "uciok" in lines and lines[-1] == "readyok"
+    assert any(line.startswith("option name Hash type spin") for line in lines)
+
+
+def test_position(engine):
+    uciEngine, output = engine
+    uciEngine.handle("position startpos moves e2e4 e7e5 g1f3")
+    assert uciEngine.currState.get_fen() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+    uciEngine.handle("position fen " + MATE_IN_ONE + " moves a1a2")
+    assert uciEngine.currState.get_fen() == ChessEngine.GameState("6k1/5ppp/8/8/8/8/R4PPP/6K1 b - - 1 1").get_fen()
+    uciEngine.handle("position startpos moves e2e5")
+    assert output.lines()[-1] == "info string illegal move e2e5"
+
+
+def test_go_depth(engine):
+    uciEngine, output = engine
+    uciEngine.handle("position fen " + MATE_IN_ONE)
+    uciEngine.handle("go depth 3")
+    assert output.wait_for("bestmove") == "bestmove a1a8"
+    assert output.wait_for("info depth 1 score mate 1") is not None
+
+
+def test_go_movetime_zero_still_moves(engine):
+    uciEngine, output = engine
+    uciEngine.handle("position startpos")
+    uciEngine.handle("go movetime 0")
+    bestMove = output.wait_for("bestmove")
+    assert bestMove is not None and bestMove.split()[1] in legal_moves(uciEngine)
+
+
+def test_go_without_legal_moves(engine):
+    uciEngine, output = engine
+    uciEngine.handle("position fen 7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    uciEngine.handle("go depth 2")
+    assert output.wait_for("bestmove") == "bestmove 0000"
+
+
+def test_go_infinite_waits_for_stop(engine):
+    uciEngine, output = engine
+    uciEngine.handle("position fen " + MATE_IN_ONE)
+    uciEngine.handle("go infinite")
+    assert output.wait_for("info depth 1") is not None
+    uciEngine.handle("isready")
+    assert output.wait_for("readyok") is not None  # answered during the search
+    assert output.wait_for("bestmove", timeout=0.5) is None  # the mate ends the search, but not before stop
+    uciEngine.handle("stop")
+    assert output.wait_for("bestmove") == "bestmove a1a8"
+
+
+def test_ponder_hit(engine):
+    uciEngine, output = engine
+    uciEngine.handle("position startpos moves e2e4")
+    uciEngine.handle("go ponder movetime 200")
+    assert output.wait_for("info depth 1") is not None
+    assert output.wait_for("bestmove", timeout=0.3) is None  # pondering has no time limit
+    uciEngine.handle("ponderhit")
+    bestMove = output.wait_for("bestmove")
+    assert bestMove is not None and bestMove.split()[1] in legal_moves(uciEngine)
+
+
+def test_threads(engine):
+    uciEngine, output = engine
+    uciEngine.handle("setoption name Threads value 2")
+    uciEngine.handle("position fen " + MATE_IN_ONE)
+    try:
+        uciEngine.handle("go depth 3")
+        assert output.wait_for("bestmove") == "bestmove a1a8"
+        assert ChessAI.searchPoolWorkers == 2
+    finally:
+        uciEngine.handle("stop")
+        ChessAI.shutdown_search_pool()